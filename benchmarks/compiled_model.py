@@ -0,0 +1,67 @@
+"""
+Build time versus solve time of the cvxpy models on the bundled specs.
+
+For every size, the model built by SolveILP.create_constraints is compared with a CompiledModel,
+once when it is compiled and once when the same compiled problem is re-solved. The re-solve loads
+the numbers again and changes the time limit, as a --runtime sweep would.
+
+    python -m benchmarks.compiled_model --solver SCIPY --runtime 5
+"""
+import argparse
+import os
+import time
+import cvxpy as cp
+from src.solve import SolveILP
+from src.compiled import CompiledModel, solver_options
+
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--sizes', type=int, nargs='+', default=[5, 10, 30, 50, 100], help='Sizes of the bundled specs to compare.')
+parser.add_argument('--solver', type=str, default='MOSEK', help='The cvxpy solver, MOSEK or SCIPY.')
+parser.add_argument('--runtime', type=float, default=5, help='Time limit of every solve.')
+
+
+def timed_solve(model, solver, run_time):
+    """
+        Returns the compile time, the remaining solve time and the objective (nan if nothing was found).
+    """
+    start = time.time()
+    try:
+        model.solve(solver=solver, **solver_options(solver, run_time))
+    except cp.error.SolverError:
+        pass
+    total = time.time() - start
+    compile_time = model.compilation_time or 0
+    objective = model.value if model.value is not None and abs(model.value) < float('inf') else float('nan')
+
+    return compile_time, total - compile_time, objective
+
+
+def main(args):
+    spec_files_dir = os.path.join(os.getcwd(), 'spec_files')
+    print(f'{"blocks":>6} {"model":>9} {"build [s]":>10} {"compile [s]":>12} {"solve [s]":>10} {"objective":>10}')
+    for n in args.sizes:
+        file = os.path.join(spec_files_dir, f'{n}_block.ilp')
+
+        start = time.time()
+        problem = SolveILP(file, n)
+        problem.create_constraints()
+        model = cp.Problem(problem.objective, problem.constraints)
+        build = time.time() - start
+        compile_time, solve_time, objective = timed_solve(model, args.solver, args.runtime)
+        print(f'{n:>6} {"cvxpy":>9} {build:>10.3f} {compile_time:>12.3f} {solve_time:>10.3f} {objective:>10.4f}')
+
+        start = time.time()
+        compiled = CompiledModel(SolveILP(file, n).formulation)
+        build = time.time() - start
+        for label, run_time in [('compiled', args.runtime), ('re-solve', 2 * args.runtime)]:
+            if label == 're-solve':
+                start = time.time()
+                compiled.load(SolveILP(file, n).formulation)
+                build = time.time() - start
+            compile_time, solve_time, objective = timed_solve(compiled.problem, args.solver, run_time)
+            print(f'{n:>6} {label:>9} {build:>10.3f} {compile_time:>12.3f} {solve_time:>10.3f} {objective:>10.4f}')
+
+
+if __name__ == '__main__':
+    main(parser.parse_args())
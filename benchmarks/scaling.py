@@ -0,0 +1,138 @@
+"""
+How model build time, solve time and memory scale with the number of modules.
+
+Every (size, seed) case runs in a fresh process on a synthetic spec and times each phase:
+parsing the spec (GenerateProblem), building the formulation (SolveILP), the cvxpy constraints
+(SolveILP.create_constraints), the solve (SolveILP.solve) and the partition into superblocks
+(Augment.break_problem). Peak RSS is read after every phase, so it grows monotonically. One JSON
+line per case is appended to --output, tagged with the git commit, for comparisons across commits.
+
+    python -m benchmarks.scaling --sizes 10 30 100 300 --runtime 5
+    python -m benchmarks.scaling --sizes 500 1000 --write_specs spec_files/synthetic
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+import numpy as np
+from src.generate import GenerateProblem
+from src.solve import SolveILP
+from src.augment import Augment
+from src.synthetic import synthetic_problem, distributions
+
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--sizes', type=int, nargs='+', default=[10, 30, 100, 300], help='Numbers of modules.')
+parser.add_argument('--seeds', type=int, nargs='+', default=[0], help='Seeds of the synthetic specs.')
+parser.add_argument('--distribution', type=str, default='uniform', choices=distributions)
+parser.add_argument('--soft_fraction', type=float, default=0.2)
+parser.add_argument('--runtime', type=float, default=5, help='Time limit of the solve.')
+parser.add_argument('--backend', type=str, default='scipy', choices=['cvxpy', 'compiled', 'scipy'], help='Backend of the solve. scipy needs no license and is deterministic.')
+parser.add_argument('--sub_block_size', type=int, default=10, help='Superblock size of the partition phase.')
+parser.add_argument('--output', type=str, default=os.path.join('results', 'scaling.jsonl'))
+parser.add_argument('--write_specs', type=str, default=None, help='Only write the synthetic specs to this directory.')
+
+
+def peak_rss():
+    """
+    Peak resident set size of this process in MB (ru_maxrss is in KB on Linux).
+    """
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_case(case):
+    """
+    Times the phases of one case. Runs in a fresh process, so the peak RSS is its own.
+    """
+    size, seed, distribution, soft_fraction, runtime, backend, sub_block_size = case
+    record = {'size': size, 'seed': seed, 'distribution': distribution, 'soft_fraction': soft_fraction,
+              'runtime': runtime, 'backend': backend}
+    phases = {}
+
+    def phase(name, start):
+        phases[name] = {'time': time.time() - start, 'peak_rss': peak_rss()}
+
+    with tempfile.TemporaryDirectory() as directory:
+        spec = os.path.join(directory, f'{size}_block.ilp')
+        synthetic_problem(size, soft_fraction=soft_fraction, distribution=distribution, seed=seed).write_spec(spec)
+        phase('baseline', time.time())
+        start = time.time()
+        problem = GenerateProblem(spec, size)
+        phase('parse', start)
+
+    start = time.time()
+    solver = SolveILP(problem)
+    formulation = solver.formulation   # Built on first use
+    phase('formulation', start)
+    model_size = formulation.size()
+    record.update(num_hard_modules=problem.num_hard_modules, num_soft_modules=problem.num_soft_modules,
+                  num_variables=model_size['variables'], num_binaries=model_size['integers'], num_constraints=model_size['constraints'],
+                  nonzeros=model_size['nonzeros'])
+
+    start = time.time()
+    solver.create_constraints()
+    phase('create_constraints', start)
+
+    start = time.time()
+    try:
+        bound, X, Y, Z, W, H = solver.solve(run_time=runtime, backend=backend)
+        widths, heights = solver.module_dimensions(Z, W, H)
+        chip_width, chip_height = solver.bounding_box(X, Y, Z, W, H)
+        record.update(objective=float(bound), utilization=float(np.sum(widths * heights) / (chip_width * chip_height)),
+                      status=solver.status, mip_gap=solver.mip_gap)
+    except Exception as error:   # Keeps the timings of a case whose solve fails
+        record['error'] = f'{type(error).__name__}: {str(error).strip()}'
+    phase('solve', start)
+
+    start = time.time()
+    Augment.from_problem(problem).break_problem(sub_block_size=sub_block_size)
+    phase('break_problem', start)
+    record['phases'] = phases
+
+    return record
+
+
+def main(args):
+    cases = [(size, seed, args.distribution, args.soft_fraction, args.runtime, args.backend, args.sub_block_size)
+             for size in args.sizes for seed in args.seeds]
+    if args.write_specs is not None:
+        os.makedirs(args.write_specs, exist_ok=True)
+        for size, seed, distribution, soft_fraction, *_ in cases:
+            path = os.path.join(args.write_specs, f'{size}_block_{distribution}_{seed}.ilp')
+            synthetic_problem(size, soft_fraction=soft_fraction, distribution=distribution, seed=seed).write_spec(path)
+            print(path)
+        return
+
+    revision = commit()
+    os.makedirs(os.path.dirname(args.output) or '.', exist_ok=True)
+    names = ['parse', 'formulation', 'create_constraints', 'solve', 'break_problem']
+    print(f'{"size":>6} {"seed":>4} {"rows":>8} {"nnz":>9} ' + ' '.join(f'{name + " [s]":>22}' for name in names) + f' {"peak [MB]":>10} {"util":>6}')
+    with open(args.output, 'a') as f:
+        for case in cases:
+            # A fresh process per case, so that one case's memory does not hide the next one's
+            with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn')) as executor:
+                record = executor.submit(run_case, case).result()
+            record['commit'] = revision
+            f.write(json.dumps(record) + '\n')
+            f.flush()
+            phases = record['phases']
+            utilization = f"{record['utilization'] * 100:5.1f}%" if 'utilization' in record else 'error'
+            print(f"{record['size']:>6} {record['seed']:>4} {record['num_constraints']:>8} {record['nonzeros']:>9} "
+                  + ' '.join(f"{phases[name]['time']:>22.3f}" for name in names)
+                  + f" {phases['break_problem']['peak_rss']:>10.1f} {utilization:>6}")
+
+
+if __name__ == '__main__':
+    main(parser.parse_args())
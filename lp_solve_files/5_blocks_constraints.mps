@@ -0,0 +1,397 @@
+NAME floorplan_5
+ROWS
+ N obj
+ L hard_hard_1
+ L hard_hard_2
+ L hard_hard_3
+ L hard_hard_4
+ L hard_hard_5
+ L hard_hard_6
+ L hard_hard_7
+ L hard_hard_8
+ L hard_hard_9
+ L hard_hard_10
+ L hard_hard_11
+ L hard_hard_12
+ L hard_hard_13
+ L hard_hard_14
+ L hard_hard_15
+ L hard_hard_16
+ L hard_hard_17
+ L hard_hard_18
+ L hard_hard_19
+ L hard_hard_20
+ L hard_hard_21
+ L hard_hard_22
+ L hard_hard_23
+ L hard_hard_24
+ L hard_soft_1
+ L hard_soft_2
+ L hard_soft_3
+ L hard_soft_4
+ L hard_soft_5
+ L hard_soft_6
+ L hard_soft_7
+ L hard_soft_8
+ L hard_soft_9
+ L hard_soft_10
+ L hard_soft_11
+ L hard_soft_12
+ L hard_soft_13
+ L hard_soft_14
+ L hard_soft_15
+ L hard_soft_16
+ L chip_width_1
+ L chip_width_2
+ L chip_width_3
+ L chip_width_4
+ L chip_width_5
+ L chip_height_1
+ L chip_height_2
+ L chip_height_3
+ L chip_height_4
+ L chip_height_5
+ L identical_order_1
+ L identical_relation_1
+ L anchor_1
+ L anchor_2
+COLUMNS
+ x_1 hard_hard_1 1
+ x_1 hard_hard_2 1
+ x_1 hard_hard_3 1
+ x_1 hard_hard_7 -1
+ x_1 hard_hard_8 -1
+ x_1 hard_hard_9 -1
+ x_1 hard_soft_1 1
+ x_1 hard_soft_5 -1
+ x_1 chip_width_1 1
+ x_2 hard_hard_1 -1
+ x_2 hard_hard_4 1
+ x_2 hard_hard_5 1
+ x_2 hard_hard_7 1
+ x_2 hard_hard_10 -1
+ x_2 hard_hard_11 -1
+ x_2 hard_soft_2 1
+ x_2 hard_soft_6 -1
+ x_2 chip_width_2 1
+ x_2 identical_order_1 1
+ x_3 hard_hard_2 -1
+ x_3 hard_hard_4 -1
+ x_3 hard_hard_6 1
+ x_3 hard_hard_8 1
+ x_3 hard_hard_10 1
+ x_3 hard_hard_12 -1
+ x_3 hard_soft_3 1
+ x_3 hard_soft_7 -1
+ x_3 chip_width_3 1
+ x_4 hard_hard_3 -1
+ x_4 hard_hard_5 -1
+ x_4 hard_hard_6 -1
+ x_4 hard_hard_9 1
+ x_4 hard_hard_11 1
+ x_4 hard_hard_12 1
+ x_4 hard_soft_4 1
+ x_4 hard_soft_8 -1
+ x_4 chip_width_4 1
+ x_4 identical_order_1 -1
+ x_5 hard_soft_1 -1
+ x_5 hard_soft_2 -1
+ x_5 hard_soft_3 -1
+ x_5 hard_soft_4 -1
+ x_5 hard_soft_5 1
+ x_5 hard_soft_6 1
+ x_5 hard_soft_7 1
+ x_5 hard_soft_8 1
+ x_5 chip_width_5 1
+ x_5 anchor_1 2
+ y_1 hard_hard_13 1
+ y_1 hard_hard_14 1
+ y_1 hard_hard_15 1
+ y_1 hard_hard_19 -1
+ y_1 hard_hard_20 -1
+ y_1 hard_hard_21 -1
+ y_1 hard_soft_9 1
+ y_1 hard_soft_13 -1
+ y_1 chip_height_1 1
+ y_2 hard_hard_13 -1
+ y_2 hard_hard_16 1
+ y_2 hard_hard_17 1
+ y_2 hard_hard_19 1
+ y_2 hard_hard_22 -1
+ y_2 hard_hard_23 -1
+ y_2 hard_soft_10 1
+ y_2 hard_soft_14 -1
+ y_2 chip_height_2 1
+ y_3 hard_hard_14 -1
+ y_3 hard_hard_16 -1
+ y_3 hard_hard_18 1
+ y_3 hard_hard_20 1
+ y_3 hard_hard_22 1
+ y_3 hard_hard_24 -1
+ y_3 hard_soft_11 1
+ y_3 hard_soft_15 -1
+ y_3 chip_height_3 1
+ y_4 hard_hard_15 -1
+ y_4 hard_hard_17 -1
+ y_4 hard_hard_18 -1
+ y_4 hard_hard_21 1
+ y_4 hard_hard_23 1
+ y_4 hard_hard_24 1
+ y_4 hard_soft_12 1
+ y_4 hard_soft_16 -1
+ y_4 chip_height_4 1
+ y_5 hard_soft_9 -1
+ y_5 hard_soft_10 -1
+ y_5 hard_soft_11 -1
+ y_5 hard_soft_12 -1
+ y_5 hard_soft_13 1
+ y_5 hard_soft_14 1
+ y_5 hard_soft_15 1
+ y_5 hard_soft_16 1
+ y_5 chip_height_5 1
+ y_5 anchor_2 2
+ w_5 hard_soft_5 1
+ w_5 hard_soft_6 1
+ w_5 hard_soft_7 1
+ w_5 hard_soft_8 1
+ w_5 hard_soft_13 -0.4999999999999999
+ w_5 hard_soft_14 -0.4999999999999999
+ w_5 hard_soft_15 -0.4999999999999999
+ w_5 hard_soft_16 -0.4999999999999999
+ w_5 chip_width_5 1
+ w_5 chip_height_5 -0.4999999999999999
+ w_5 anchor_1 1
+ w_5 anchor_2 -0.4999999999999999
+ Y obj 1
+ Y chip_width_1 -1
+ Y chip_width_2 -1
+ Y chip_width_3 -1
+ Y chip_width_4 -1
+ Y chip_width_5 -1
+ Y chip_height_1 -1
+ Y chip_height_2 -1
+ Y chip_height_3 -1
+ Y chip_height_4 -1
+ Y chip_height_5 -1
+ Y anchor_1 -1
+ Y anchor_2 -1
+ MARKER 'MARKER' 'INTORG'
+ x_1_2 hard_hard_1 -7
+ x_1_2 hard_hard_7 7
+ x_1_2 hard_hard_13 -7
+ x_1_2 hard_hard_19 7
+ x_1_3 hard_hard_2 -7
+ x_1_3 hard_hard_8 7
+ x_1_3 hard_hard_14 -7
+ x_1_3 hard_hard_20 7
+ x_1_4 hard_hard_3 -7
+ x_1_4 hard_hard_9 7
+ x_1_4 hard_hard_15 -7
+ x_1_4 hard_hard_21 7
+ x_1_5 hard_soft_1 -7
+ x_1_5 hard_soft_5 7
+ x_1_5 hard_soft_9 -7
+ x_1_5 hard_soft_13 7
+ x_2_3 hard_hard_4 -7
+ x_2_3 hard_hard_10 7
+ x_2_3 hard_hard_16 -7
+ x_2_3 hard_hard_22 7
+ x_2_4 hard_hard_5 -7
+ x_2_4 hard_hard_11 7
+ x_2_4 hard_hard_17 -7
+ x_2_4 hard_hard_23 7
+ x_2_4 identical_relation_1 1
+ x_2_5 hard_soft_2 -7
+ x_2_5 hard_soft_6 7
+ x_2_5 hard_soft_10 -7
+ x_2_5 hard_soft_14 7
+ x_3_4 hard_hard_6 -7
+ x_3_4 hard_hard_12 7
+ x_3_4 hard_hard_18 -7
+ x_3_4 hard_hard_24 7
+ x_3_5 hard_soft_3 -7
+ x_3_5 hard_soft_7 7
+ x_3_5 hard_soft_11 -7
+ x_3_5 hard_soft_15 7
+ x_4_5 hard_soft_4 -7
+ x_4_5 hard_soft_8 7
+ x_4_5 hard_soft_12 -7
+ x_4_5 hard_soft_16 7
+ y_1_2 hard_hard_1 -7
+ y_1_2 hard_hard_7 -7
+ y_1_2 hard_hard_13 7
+ y_1_2 hard_hard_19 7
+ y_1_3 hard_hard_2 -7
+ y_1_3 hard_hard_8 -7
+ y_1_3 hard_hard_14 7
+ y_1_3 hard_hard_20 7
+ y_1_4 hard_hard_3 -7
+ y_1_4 hard_hard_9 -7
+ y_1_4 hard_hard_15 7
+ y_1_4 hard_hard_21 7
+ y_1_5 hard_soft_1 -7
+ y_1_5 hard_soft_5 -7
+ y_1_5 hard_soft_9 7
+ y_1_5 hard_soft_13 7
+ y_2_3 hard_hard_4 -7
+ y_2_3 hard_hard_10 -7
+ y_2_3 hard_hard_16 7
+ y_2_3 hard_hard_22 7
+ y_2_4 hard_hard_5 -7
+ y_2_4 hard_hard_11 -7
+ y_2_4 hard_hard_17 7
+ y_2_4 hard_hard_23 7
+ y_2_4 identical_relation_1 -1
+ y_2_5 hard_soft_2 -7
+ y_2_5 hard_soft_6 -7
+ y_2_5 hard_soft_10 7
+ y_2_5 hard_soft_14 7
+ y_3_4 hard_hard_6 -7
+ y_3_4 hard_hard_12 -7
+ y_3_4 hard_hard_18 7
+ y_3_4 hard_hard_24 7
+ y_3_5 hard_soft_3 -7
+ y_3_5 hard_soft_7 -7
+ y_3_5 hard_soft_11 7
+ y_3_5 hard_soft_15 7
+ y_4_5 hard_soft_4 -7
+ y_4_5 hard_soft_8 -7
+ y_4_5 hard_soft_12 7
+ y_4_5 hard_soft_16 7
+ z_1 hard_hard_1 2
+ z_1 hard_hard_2 2
+ z_1 hard_hard_3 2
+ z_1 hard_hard_13 -2
+ z_1 hard_hard_14 -2
+ z_1 hard_hard_15 -2
+ z_1 hard_soft_1 2
+ z_1 hard_soft_9 -2
+ z_1 chip_width_1 2
+ z_1 chip_height_1 -2
+ z_2 hard_hard_4 -4
+ z_2 hard_hard_5 -4
+ z_2 hard_hard_7 -4
+ z_2 hard_hard_16 4
+ z_2 hard_hard_17 4
+ z_2 hard_hard_19 4
+ z_2 hard_soft_2 -4
+ z_2 hard_soft_10 4
+ z_2 chip_width_2 -4
+ z_2 chip_height_2 4
+ z_3 obj 0
+ z_4 hard_hard_9 4
+ z_4 hard_hard_11 4
+ z_4 hard_hard_12 4
+ z_4 hard_hard_21 -4
+ z_4 hard_hard_23 -4
+ z_4 hard_hard_24 -4
+ z_4 hard_soft_4 4
+ z_4 hard_soft_12 -4
+ z_4 chip_width_4 4
+ z_4 chip_height_4 -4
+ MARKER 'MARKER' 'INTEND'
+RHS
+ RHS hard_hard_1 -1
+ RHS hard_hard_2 -1
+ RHS hard_hard_3 -1
+ RHS hard_hard_4 -5
+ RHS hard_hard_5 -5
+ RHS hard_hard_6 -3
+ RHS hard_hard_7 2
+ RHS hard_hard_8 4
+ RHS hard_hard_9 6
+ RHS hard_hard_10 4
+ RHS hard_hard_11 6
+ RHS hard_hard_12 6
+ RHS hard_hard_13 4
+ RHS hard_hard_14 4
+ RHS hard_hard_15 4
+ RHS hard_hard_16 6
+ RHS hard_hard_17 6
+ RHS hard_hard_18 4
+ RHS hard_hard_19 13
+ RHS hard_hard_20 11
+ RHS hard_hard_21 9
+ RHS hard_hard_22 11
+ RHS hard_hard_23 9
+ RHS hard_hard_24 9
+ RHS hard_soft_1 -1
+ RHS hard_soft_2 -5
+ RHS hard_soft_3 -3
+ RHS hard_soft_4 -1
+ RHS hard_soft_5 7
+ RHS hard_soft_6 7
+ RHS hard_soft_7 7
+ RHS hard_soft_8 7
+ RHS hard_soft_9 4
+ RHS hard_soft_10 6
+ RHS hard_soft_11 4
+ RHS hard_soft_12 2
+ RHS hard_soft_13 8.34314575050762
+ RHS hard_soft_14 8.34314575050762
+ RHS hard_soft_15 8.34314575050762
+ RHS hard_soft_16 8.34314575050762
+ RHS chip_width_1 -1
+ RHS chip_width_2 -5
+ RHS chip_width_3 -3
+ RHS chip_width_4 -1
+ RHS chip_height_1 -3
+ RHS chip_height_2 -1
+ RHS chip_height_3 -3
+ RHS chip_height_4 -5
+ RHS chip_height_5 -5.65685424949238
+ RHS anchor_2 -5.65685424949238
+BOUNDS
+ LO BND w_5 2.8284271247461903
+ UP BND w_5 5.656854249492381
+ LO BND Y 5.830951894845301
+ UP BND Y 7
+ LO BND x_1_2 0
+ UP BND x_1_2 1
+ LO BND x_1_3 0
+ UP BND x_1_3 1
+ LO BND x_1_4 0
+ UP BND x_1_4 1
+ LO BND x_1_5 0
+ UP BND x_1_5 1
+ LO BND x_2_3 0
+ UP BND x_2_3 1
+ LO BND x_2_4 0
+ UP BND x_2_4 1
+ LO BND x_2_5 0
+ UP BND x_2_5 1
+ LO BND x_3_4 0
+ UP BND x_3_4 1
+ LO BND x_3_5 0
+ UP BND x_3_5 1
+ LO BND x_4_5 0
+ UP BND x_4_5 1
+ LO BND y_1_2 0
+ UP BND y_1_2 1
+ LO BND y_1_3 0
+ UP BND y_1_3 1
+ LO BND y_1_4 0
+ UP BND y_1_4 1
+ LO BND y_1_5 0
+ UP BND y_1_5 1
+ LO BND y_2_3 0
+ UP BND y_2_3 1
+ LO BND y_2_4 0
+ UP BND y_2_4 1
+ LO BND y_2_5 0
+ UP BND y_2_5 1
+ LO BND y_3_4 0
+ UP BND y_3_4 1
+ LO BND y_3_5 0
+ UP BND y_3_5 1
+ LO BND y_4_5 0
+ UP BND y_4_5 1
+ LO BND z_1 0
+ UP BND z_1 1
+ LO BND z_2 0
+ UP BND z_2 1
+ LO BND z_3 0
+ UP BND z_3 1
+ LO BND z_4 0
+ UP BND z_4 1
+ENDATA
@@ -3,14 +3,25 @@ import numpy as np
 import matplotlib.pyplot as plt
 from src.solve import SolveILP
 from src.augment import Augment
+from src.schedule import SuperblockScheduler
+from src.hierarchy import HierarchicalFloorplan
 import os
+import json
 import shutil
+from src.timing import PhaseTimer
+from src.render import FloorplanRenderer
+from src.result_cache import ResultCache
+from src.legality import check_placement
+from src.heuristic import predicted_utilization
+from src.generate import GenerateProblem
+from src.placement import Placement
+from src.incremental import ModuleDiff, IncrementalFloorplan
 
 
 def boolean_string(s):
     if s not in {'False', 'True'}:
         raise ValueError('Not a valid boolean string')
-    
+
     return s == 'True'
 
 
@@ -20,46 +31,156 @@ parser.add_argument('-u', '--underestimation', type=boolean_string, default=True
 parser.add_argument('-sa', '--successive_augmentation', type=boolean_string, default=False)
 parser.add_argument('--runtime', type=int, default=10, help='The time the solver is given to solve a subproblem.')
 parser.add_argument('-vis', '--visualize_superblock', type=boolean_string, default=True)
-parser.add_argument('-lp', '--lp_solve', type=boolean_string, default=True, help='Create an lp formatted file for use with the LPSolve tool.')
-parser.add_argument('-size', '--sub_block_size', type=int, default=10, help='Size of the superblock')
-args = parser.parse_args()
-
-cwd = os.getcwd()
-spec_files_dir = os.path.join(cwd, 'spec_files')
-sa_files_dir = os.path.join(spec_files_dir, 'successive_augmentation', str(args.num_blocks))
-
-file = f'{args.num_blocks}_block.ilp'
-
-utilizations = []
-if args.successive_augmentation:
-    if os.path.exists(sa_files_dir):
-        shutil.rmtree(sa_files_dir)
-    os.makedirs(sa_files_dir, exist_ok=True)
-    if args.num_blocks < 10:
-        raise ValueError('Successive augmentation does not support system with fewer than 10 blocks.')
-    aug = Augment(file)
-    aug.break_problem(sub_block_size=args.sub_block_size) # This breaks the large problem into several smaller subproblems
-    num_augmentations = len(os.listdir(sa_files_dir))
-    bounds = []
-    for i in range(1, num_augmentations+1):
-        src_file_path = os.path.join(sa_files_dir, f'{args.num_blocks}_{i}.ilp') # Takes a super-block
-        problem = SolveILP(src_file_path, args.num_blocks, underestimation=args.underestimation) # Solves for the super-block
-        problem.create_constraints()
-        bound, X, Y, Z, W, H = problem.solve(run_time=args.runtime)
-        bounds.append(bound)
-        problem.visualize(bound, X, Y, Z, W, H, idx=i, sa=args.successive_augmentation, show_layout=args.visualize_superblock)
-        utilizations.append(problem.utilization)
-    problem.save_augmented_dimensions(args.num_blocks, bounds) # Creates a new source file from the optimized super-blocks
-
-    # Solve for the entire problem using super-blocks
-    src_file_path = os.path.join(sa_files_dir, f'{args.num_blocks}_blocks_sa.ilp')
-else:
-    src_file_path = os.path.join(spec_files_dir, file)
-problem = SolveILP(src_file_path, args.num_blocks, underestimation=args.underestimation)
-problem.create_constraints()
-bound, X, Y, Z, W, H = problem.solve(run_time=args.runtime)
-problem.visualize(bound, X, Y, Z, W, H, glob=True, sa=args.successive_augmentation, utilizations=utilizations)
-problem.save_final_dimensions(bound, args.num_blocks, args.successive_augmentation)
-
-if args.lp_solve:
-    problem.problem.create_ilp_file()
\ No newline at end of file
+parser.add_argument('--plot', type=str, default='show', choices=['show', 'file', 'none'], help='Show the floorplans in a window, write them to results in the background, or only compute the utilization.')
+parser.add_argument('--plot_formats', type=str, nargs='+', default=['png'], help='Image formats written with --plot file (png, svg, pdf, ...).')
+parser.add_argument('-lp', '--lp_solve', type=boolean_string, default=True, help='Write the model to lp_solve_files for use with an external solver.')
+parser.add_argument('--lp_format', type=str, default='lp_solve', choices=['lp_solve', 'cplex', 'mps'], help='Format of the model file written with -lp.')
+parser.add_argument('-size', '--sub_block_size', type=int, default=10, help='Size of the superblock, and the largest problem solved at any level of successive augmentation')
+parser.add_argument('--backend', type=str, default='cvxpy', choices=['cvxpy', 'compiled', 'scipy'], help='cvxpy with MOSEK, cvxpy with MOSEK on a model compiled once per structure, or scipy.optimize.milp (HiGHS) without a license.')
+parser.add_argument('--workers', type=int, default=1, help='Number of superblocks solved in parallel.')
+parser.add_argument('--threads', type=int, default=None, help='Total solver threads shared by the parallel superblock solves.')
+parser.add_argument('--partition', type=str, default='sequential', choices=['sequential', 'area', 'aspect'], help='How modules are grouped into superblocks.')
+parser.add_argument('--shape', type=str, default='square', choices=['square', 'rectangle'], help='Minimize a square bound, or the half perimeter of a rectangular chip.')
+parser.add_argument('--aspect_limit', type=float, default=None, help='Largest allowed ratio between the sides of a rectangular chip.')
+parser.add_argument('--warm_start', type=boolean_string, default=False, help='Start every solve from a shelf-packing placement.')
+parser.add_argument('--tighten', type=boolean_string, default=True, help='Derive the chip bounds, and from them the big-M of every non-overlap row, from a heuristic placement instead of the sum of all module dimensions.')
+parser.add_argument('--symmetry', type=boolean_string, default=True, help='Break the symmetry of identical modules and of mirrored placements.')
+parser.add_argument('--segments', type=int, default=None, help='Model soft module heights with this many lines of a piecewise-linear approximation instead of a single line.')
+parser.add_argument('--adaptive_segments', type=int, default=0, help='Re-solve this many times, each time adding a segment where every soft module landed.')
+parser.add_argument('--refine_tolerance', type=float, default=None, help='Add cuts and re-solve until every soft module height is within this relative error of area / w.')
+parser.add_argument('--refine_budget', type=float, default=None, help='Seconds for all refinement solves together.')
+parser.add_argument('--target_gap', type=float, default=None, help='Stop every solve once its relative MIP gap is at most this.')
+parser.add_argument('--stall_time', type=float, default=None, help='Stop every solve when its incumbent has not improved for this many seconds (scipy backend).')
+parser.add_argument('--share_time', type=boolean_string, default=False, help='Hand the time that easy superblocks leave unused to the superblocks solved after them.')
+parser.add_argument('--progress', type=boolean_string, default=False, help='Print every incumbent of a direct solve as it is found.')
+parser.add_argument('--cache', type=boolean_string, default=False, help='Reuse solved problems from results/cache and store new ones there.')
+parser.add_argument('--cache_size', type=int, default=1024, help='Largest number of results kept in the cache.')
+parser.add_argument('--placement_view', type=str, default='json', choices=['json', 'csv', 'none'], help='Readable view written next to results/<n>_sa_<sa>_placement.npz.')
+parser.add_argument('--compact', type=boolean_string, default=False, help='Give soft modules their exact heights (area / w) and compact every solved floorplan.')
+parser.add_argument('--previous', type=str, default=None, help='Re-floorplan incrementally from this placement (*.npz, *.json or *.csv) of the spec of --num_blocks.')
+parser.add_argument('--diff', type=str, default=None, help='JSON file of the modules removed, resized and added since the --previous placement.')
+parser.add_argument('--neighborhood', type=float, default=0.5, help='With --previous, free the modules within this many median module sides of a change.')
+parser.add_argument('--stats', type=str, default=None, help='Append the phase timings and solver statistics of the run to this JSON-lines file.')
+parser.add_argument('--dump_superblocks', type=boolean_string, default=False, help='Also write the superblocks to spec_files/successive_augmentation for debugging.')
+
+
+def write_stats(path, records):
+    """
+    Appends one JSON line per record.
+    """
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(path, 'a') as f:
+        for record in records:
+            f.write(json.dumps(record) + '\n')
+
+
+def print_incumbent(incumbent):
+    gap = 'unknown' if incumbent['gap'] is None else f"{incumbent['gap'] * 100:.2f} percent"
+    print(f"{incumbent['elapsed']:8.2f} s: objective {incumbent['objective']:.4f}, gap {gap}")
+
+
+def main(args):
+    cwd = os.getcwd()
+    spec_files_dir = os.path.join(cwd, 'spec_files')
+    sa_files_dir = os.path.join(spec_files_dir, 'successive_augmentation', str(args.num_blocks))
+
+    file = f'{args.num_blocks}_block.ilp'
+
+    options = {'shape': args.shape, 'aspect_limit': args.aspect_limit, 'warm_start': args.warm_start, 'tighten': args.tighten, 'symmetry': args.symmetry,
+               'adaptive_segments': args.adaptive_segments, 'refine_tolerance': args.refine_tolerance, 'refine_budget': args.refine_budget,
+               'target_gap': args.target_gap, 'stall_time': args.stall_time, 'compact': args.compact, 'cache': ResultCache(max_entries=args.cache_size) if args.cache else None}
+    timer = PhaseTimer()   # Phases outside of the solves (parse for successive augmentation, plot)
+    renderer = FloorplanRenderer(os.path.join(cwd, 'results'), formats=args.plot_formats) if args.plot == 'file' else None
+    run = {'num_blocks': args.num_blocks, 'backend': args.backend, 'runtime': args.runtime, 'successive_augmentation': args.successive_augmentation}
+    incremental = None
+    if args.successive_augmentation and args.previous is not None:
+        raise ValueError('Incremental re-floorplanning (--previous) solves the full problem and does not support successive augmentation.')
+    if args.successive_augmentation:
+        if args.num_blocks < 10:
+            raise ValueError('Successive augmentation does not support system with fewer than 10 blocks.')
+        if args.dump_superblocks and os.path.exists(sa_files_dir):
+            shutil.rmtree(sa_files_dir)
+        with timer.phase('parse'):
+            aug = Augment(file, underestimation=args.underestimation, segments=args.segments)
+        scheduler = SuperblockScheduler(workers=args.workers, threads=args.threads, share_time=args.share_time)
+        hierarchy = HierarchicalFloorplan(aug.problem, max_size=args.sub_block_size, strategy=args.partition, options=options, scheduler=scheduler)
+        chip, (X, Y, widths, heights, rotated) = hierarchy.solve(run_time=args.runtime, backend=args.backend, dump=args.dump_superblocks) # Groups and solves super-blocks level by level
+        if hierarchy.levels:
+            level = hierarchy.levels[0]
+            for i, (sub_problem, result) in enumerate(zip(level['problems'], level['results']), start=1):
+                bound, sub_X, sub_Y, Z, W, H = result
+                sub_block = SolveILP(sub_problem, **options)
+                with timer.phase('plot'):
+                    sub_block.visualize(bound, sub_X, sub_Y, Z, W, H, idx=i, sa=args.successive_augmentation, show_layout=args.visualize_superblock,
+                                        plot=args.plot if args.visualize_superblock else 'none', renderer=renderer, name=f'{args.num_blocks}_sa_True_superblock_{i}')
+                predicted = predicted_utilization(sub_problem, shape=args.shape, aspect_limit=args.aspect_limit)
+                predicted = 'none' if predicted is None else f'{predicted * 100:.2f} percent'
+                print(f'Superblock {i}: utilization {sub_block.utilization * 100:.2f} percent, shelf packing {predicted}')
+            if args.dump_superblocks:
+                sub_block.save_augmented_dimensions(args.num_blocks, level['chips']) # Writes the super-block source file for inspection
+
+        # The full placement of the original modules
+        problem = SolveILP(aug.problem, **options)
+        num_hard_modules = problem.num_hard_modules
+        Z, W, H = rotated[:num_hard_modules].astype(float), widths[num_hard_modules:], heights[num_hard_modules:]
+        bound = chip if args.shape == 'square' else None
+        top_problem = SolveILP(hierarchy.top_problem, **options)
+        records = [dict(run, scope='superblock', **stats) for stats in hierarchy.superblock_stats()]
+        records.append(dict(run, scope='top', **hierarchy.top_stats))
+        stats = hierarchy.solve_stats()
+    elif args.previous is not None:
+        with timer.phase('parse'):
+            previous = GenerateProblem(os.path.join(spec_files_dir, file), args.num_blocks, underestimation=args.underestimation, segments=args.segments)
+            diff = ModuleDiff.from_json(args.diff) if args.diff is not None else ModuleDiff()
+        incremental = IncrementalFloorplan(previous, Placement.load(args.previous), diff, neighborhood=args.neighborhood, options=options)
+        counts = incremental.stats()
+        print(f"Incremental: {counts['free_modules']} of {counts['modules']} modules and {counts['free_pairs']} of {counts['pairs']} pairs free")
+        problem = incremental.solver
+    else:
+        problem = SolveILP(os.path.join(spec_files_dir, file), args.num_blocks, underestimation=args.underestimation, segments=args.segments, **options)
+    if not args.successive_augmentation:
+        if args.backend == 'cvxpy':
+            problem.create_constraints()
+        bound, X, Y, Z, W, H = problem.solve(run_time=args.runtime, backend=args.backend, on_incumbent=print_incumbent if args.progress else None)
+        if problem.refinement is not None:
+            print(f"Refinement: {problem.refinement['solves']} solves, largest soft height error {problem.refinement['error'] * 100:.2f} percent, {problem.refinement['height_rows']} height rows")
+        chip = problem.bounding_box(X, Y, Z, W, H) if args.shape == 'rectangle' else bound
+        widths, heights = problem.module_dimensions(Z, W, H)
+        rotated = np.zeros(problem.num_total_modules, dtype=bool)
+        rotated[:problem.num_hard_modules] = np.round(Z) >= 1
+        top_problem = problem
+        records, stats = [], problem.solve_stats()
+    # An incremental run gets its own files, as it usually reads its previous placement from the direct ones
+    name = f'{args.num_blocks}_incremental' if incremental is not None else f'{args.num_blocks}_sa_{args.successive_augmentation}'
+    with timer.phase('plot'):
+        problem.visualize(bound, X, Y, Z, W, H, glob=True, sa=args.successive_augmentation, plot=args.plot, renderer=renderer,
+                          name=f'{name}_floorplan')
+    problem.save_final_dimensions(chip, args.num_blocks, args.successive_augmentation, name=name)
+    chip_width, chip_height = chip if np.ndim(chip) else (chip, chip)
+    actual_widths, actual_heights = problem.problem.actual_dimensions(widths, heights, rotated)   # The model heights of soft modules may be below area / w
+    legality = check_placement(X, Y, actual_widths, actual_heights, chip_width, chip_height)
+    if not legality['legal']:
+        print(f"Warning: {len(legality['overlaps'])} overlapping module pairs and {len(legality['out_of_bounds'])} modules outside the chip "
+              f"with the actual soft module heights (--compact True removes them)")
+    metadata = dict(run, legal=legality['legal'], shape=args.shape, underestimation=args.underestimation, sub_block_size=args.sub_block_size if args.successive_augmentation else None,
+                    **{key: stats[key] for key in ('status', 'mip_gap', 'best_bound', 'nodes')})
+    if incremental is not None:
+        metadata.update(previous=args.previous, diff=args.diff, neighborhood=args.neighborhood, **incremental.stats())
+    problem.save_final_placement(X, Y, widths, heights, rotated, chip, args.num_blocks, args.successive_augmentation, metadata=metadata,
+                                 view=None if args.placement_view == 'none' else args.placement_view, name=name)
+
+    if args.lp_solve:
+        top_problem.create_ilp_file(args.lp_format)
+
+    if renderer is not None:
+        with timer.phase('plot'):
+            for path in renderer.close():
+                print(f'Wrote {path}')
+
+    if args.stats is not None:
+        timer.merge(stats['phases'])
+        records.append(dict(run, scope='total', **dict(stats, phases=timer.as_dict()), utilization=float(problem.utilization)))
+        write_stats(args.stats, records)
+
+if __name__ == '__main__':
+    main(parser.parse_args())
@@ -0,0 +1,51 @@
+import queue
+import threading
+
+
+class IncumbentStream:
+    """
+    Runs SolveILP.solve in a background thread and yields its incumbents (dicts of objective, bound,
+    gap, elapsed seconds and solution vector) while it runs. The result of the solve is in self.result
+    once the iteration ends.
+
+        stream = IncumbentStream(solver, run_time=60, backend='scipy')
+        for incumbent in stream:
+            print(incumbent['elapsed'], incumbent['objective'], incumbent['gap'])
+        bound, X, Y, Z, W, H = stream.result
+    """
+
+    def __init__(self, solver, run_time, **kwargs):
+        """
+        args:
+            solver: The SolveILP to be solved, with target_gap and stall_time set to stop early
+            run_time: Time limit of the solve in seconds
+            kwargs: Further keyword arguments of SolveILP.solve (backend, solver, threads, ...)
+        """
+        self.solver = solver
+        self.run_time = run_time
+        self.kwargs = kwargs
+        self.result = None
+
+    def __iter__(self):
+        incumbents = queue.Queue()
+        done = object()
+        error = []
+
+        def run():
+            try:
+                self.result = self.solver.solve(self.run_time, on_incumbent=incumbents.put, **self.kwargs)
+            except Exception as e:   # Raised again in the iterating thread
+                error.append(e)
+            finally:
+                incumbents.put(done)
+
+        thread = threading.Thread(target=run, daemon=True)
+        thread.start()
+        while True:
+            incumbent = incumbents.get()
+            if incumbent is done:
+                break
+            yield incumbent
+        thread.join()
+        if error:
+            raise error[0]
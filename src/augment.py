@@ -1,5 +1,6 @@
 import numpy as np
 import os
+from src.generate import GenerateProblem
 
 
 cwd = os.getcwd()
@@ -9,136 +10,154 @@ sa_files_dir = os.path.join(spec_files_dir, 'successive_augmentation')
 
 class Augment:
 
-    def __init__(self, file, underestimation=True):
-        self.hard_exists = False
-        self.soft_exists = False
+    def __init__(self, file, underestimation=True, segments=None, cache=False):
+        """
+            args:
+                file - name of the *.ilp file in spec_files, starting with the number of blocks
+                cache - whether or not to keep the parsed file in the *.npz cache of read_spec
+        """
         self.underestimation = underestimation
+        self.segments = segments
 
         num_blocks = file.split('_')[0]
-        spec_file = os.path.join(spec_files_dir, file)
-        lines = []
-        with open(spec_file) as f:
-            for line in f:
-                lines.append(line)
-        self.lines = lines
+        self.num_blocks = int(num_blocks)
         self.sa_files_dir = os.path.join(sa_files_dir, num_blocks)
-        os.makedirs(self.sa_files_dir, exist_ok=True)
         self.sa_file_prefix = os.path.join(self.sa_files_dir, f'{num_blocks}')
-        self.num_hard_modules, self.num_soft_modules = self.total_modules()
-
-
-    def total_modules(self):
-        for line in self.lines:
-            if line[0:4] == 'hard':
-                self.hard_exists = True
-                num_hard_modules = line.replace('hard - ', '')
-                num_hard_modules = int(num_hard_modules.replace('\n', ''))
-            elif line[0:4] == 'soft':
-                self.soft_exists = True
-                num_soft_modules = line.replace('soft - ', '')
-                num_soft_modules = int(num_soft_modules.replace('\n', ''))
-            elif self.hard_exists and not self.soft_exists:
-                num_soft_modules = 0
-            elif not self.hard_exists and self.soft_exists:
-                num_hard_modules = 0
-            elif not self.hard_exists and not self.soft_exists:
-
-                raise FileNotFoundError('Empty File!')
-
-        return num_hard_modules, num_soft_modules
-
-    def hard_module_dimension(self):
-        if self.hard_exists:
-            hard_module_width = []
-            hard_module_height = []
-            for line_count in range(len(self.lines)):
-                if self.lines[line_count][0:4] == 'hard':
-                    break
-            for i in range (line_count+1, line_count+1+self.num_hard_modules):
-                comma_ind = self.lines[i].index(',')
-                width = self.lines[i][:comma_ind]
-                height = self.lines[i][comma_ind+1:]
-                hard_module_width.append(float(width))
-                hard_module_height.append(float(height))
-
-            hard_module_width = np.array(hard_module_width)
-            hard_module_height = np.array(hard_module_height)
+        self.problem = GenerateProblem(os.path.join(spec_files_dir, file), self.num_blocks, underestimation=underestimation, segments=segments, cache=cache)
+        self.hard_exists, self.soft_exists = self.problem.hard_exists, self.problem.soft_exists
+        self.num_hard_modules, self.num_soft_modules = self.problem.num_hard_modules, self.problem.num_soft_modules
+
+    @classmethod
+    def from_problem(cls, problem):
+        """
+            Partitions the modules of an already built GenerateProblem, e.g. the superblocks of a lower level.
+        """
+        aug = cls.__new__(cls)
+        aug.problem = problem
+        aug.underestimation = problem.underestimation
+        aug.segments = problem.segments
+        aug.num_blocks = problem.num_blocks
+        aug.hard_exists, aug.soft_exists = problem.hard_exists, problem.soft_exists
+        aug.num_hard_modules, aug.num_soft_modules = problem.num_hard_modules, problem.num_soft_modules
+        aug.sa_files_dir = os.path.join(sa_files_dir, str(problem.num_blocks))
+        aug.sa_file_prefix = os.path.join(aug.sa_files_dir, f'{problem.num_blocks}')
+
+        return aug
+
+
+    def module_areas(self):
+        """
+            Area of every module, hard modules first, in file order.
+        """
+        problem = self.problem
+        hard_area = problem.hard_module_width * problem.hard_module_height if problem.hard_exists else np.zeros(0)
+        soft_area = problem.area if problem.soft_exists else np.zeros(0)
+
+        return np.concatenate((hard_area, soft_area))
+
+    def module_aspects(self):
+        """
+            Aspect ratio of every module folded to >= 1, since hard modules may rotate. A soft
+            module takes the geometric mean of its allowed range.
+        """
+        problem = self.problem
+        hard_aspect = problem.hard_module_width / problem.hard_module_height if problem.hard_exists else np.zeros(0)
+        soft_aspect = np.sqrt(problem.min_aspect * problem.max_aspect) if problem.soft_exists else np.zeros(0)
+        aspect = np.concatenate((hard_aspect, soft_aspect))
+
+        return np.maximum(aspect, 1 / aspect)
+
+    def sequential_partition(self, sub_block_size):
+        """
+            Consecutive modules in file order.
+        """
+        num_total_modules = self.problem.num_total_modules
+
+        return [np.arange(start, min(start + sub_block_size, num_total_modules)) for start in range(0, num_total_modules, sub_block_size)]
+
+    def area_partition(self, sub_block_size):
+        """
+            Balanced-area bins: the largest remaining module goes to the bin with the least area that still has room.
+        """
+        area = self.module_areas()
+        num_subblocks = int(np.ceil(len(area) / sub_block_size))
+        bins = [[] for _ in range(num_subblocks)]
+        bin_area = np.zeros(num_subblocks)
+        for module in np.argsort(-area, kind='stable'):
+            open_bins = np.flatnonzero([len(b) < sub_block_size for b in bins])
+            target = open_bins[np.argmin(bin_area[open_bins])]
+            bins[target].append(module)
+            bin_area[target] += area[module]
+
+        return [np.sort(b) for b in bins]
+
+    def aspect_partition(self, sub_block_size):
+        """
+            Clusters modules of similar aspect ratio (then similar area) into the same superblock.
+        """
+        order = np.lexsort((-self.module_areas(), self.module_aspects()))
+
+        return [np.sort(order[start:start + sub_block_size]) for start in range(0, len(order), sub_block_size)]
+
+    def break_problem(self, sub_block_size=10, dump=False, strategy='sequential'):
+        """
+            Splits the modules into superblocks of at most sub_block_size modules.
+            args:
+                sub_block_size - maximum number of modules in a superblock
+                dump - also write every superblock to <sa_files_dir>/<n>_<i>.ilp (for debugging)
+                strategy - 'sequential' (file order), 'area' (balanced-area bins), 'aspect' (aspect-ratio clusters),
+                           or a callable (augment, sub_block_size) -> list of module index arrays
+            returns:
+                A GenerateProblem per superblock. self.groups holds, per superblock, the indices of its
+                modules in the order of the superblock (hard modules first).
+        """
+        partitioners = {'sequential': Augment.sequential_partition,
+                        'area': Augment.area_partition,
+                        'aspect': Augment.aspect_partition}
+        if callable(strategy):
+            partitioner = strategy
+        elif strategy in partitioners:
+            partitioner = partitioners[strategy]
         else:
-            hard_module_width, hard_module_height = 0, 0
-
-        return hard_module_width, hard_module_height
-
-    def soft_module_properties(self):
-        if self.soft_exists:
-            area, min_aspect, max_aspect = [], [], []
-
-            for line_count in range(len(self.lines)):
-                if self.lines[line_count][0:4] == 'soft':
-                    break
-            for i in range(line_count+1, line_count+1+self.num_soft_modules):
-                first_comma_ind = self.lines[i].index(',')
-                module_area = (self.lines[i][:first_comma_ind])
-                line_after_comma = self.lines[i][first_comma_ind+1:]
-                second_comma_ind = line_after_comma.index(',')
-                area.append(float(module_area))
-                module_min_aspect = line_after_comma[:second_comma_ind]
-                module_max_aspect = line_after_comma[second_comma_ind+1:]
-                min_aspect.append(float(module_min_aspect))
-                max_aspect.append(float(module_max_aspect))
-
-            area = np.array(area)
-            min_aspect = np.array(min_aspect)
-            max_aspect = np.array(max_aspect)
-        else:
-            area, min_aspect, max_aspect = 0, 0, 0
-
-        return area, min_aspect, max_aspect
-
-    def break_problem(self, sub_block_size=10):
-        num_hard_modules, num_soft_modules = self.total_modules()
-        num_total_modules = num_hard_modules + num_soft_modules
-        hard_module_width, hard_module_height = self.hard_module_dimension()
-        area, min_aspect, max_aspect = self.soft_module_properties()
-
-        if num_total_modules > sub_block_size:
-            num_subblocks = int(np.ceil(num_total_modules / sub_block_size))
-            soft_count = 0
-            for i in range(num_subblocks):
-                modules_in_subblock = min(sub_block_size, num_total_modules - i * sub_block_size)
-                hard_left = num_hard_modules - sub_block_size*i
-                if hard_left >= modules_in_subblock: # Submodule has all hard modules
-                    g = open(f'{self.sa_file_prefix}_{i+1}.ilp', 'w')
-                    g.write(f'hard - {modules_in_subblock}\n')
-                    g.close()
-                    g = open(f'{self.sa_file_prefix}_{i+1}.ilp', 'a')
-                    for j in range(modules_in_subblock):
-                        g.write(f'{hard_module_width[i*modules_in_subblock+j]},{hard_module_height[i*modules_in_subblock+j]}\n')
-                    g.close()
-                elif modules_in_subblock > hard_left > 0: # Submodule has a mixture of hard and soft modules
-                    g = open(f'{self.sa_file_prefix}_{i+1}.ilp', 'w')
-                    g.write(f'hard - {hard_left}\n')
-                    g.close()
-                    g = open(f'{self.sa_file_prefix}_{i+1}.ilp', 'a')
-                    for j in range(hard_left):
-                        g.write(f'{hard_module_width[i*modules_in_subblock+j]},{hard_module_height[i*modules_in_subblock+j]}\n')
-                    # if hard_left + num_soft_modules >= modules_in_subblock:
-                    if num_soft_modules > 0:
-                        g.write(f'\nsoft - {modules_in_subblock - hard_left}\n')
-                        for j in range(modules_in_subblock - hard_left):
-                            g.write(f'{area[j]},{min_aspect[j]},{max_aspect[j]}\n')
-                        g.close()
-                        area = area[j:]
-                        min_aspect = min_aspect[j:]
-                        max_aspect = max_aspect[j:]
-                    soft_left = num_soft_modules - (modules_in_subblock - hard_left)
-                elif hard_left <= 0:
-                    soft_left = num_soft_modules - modules_in_subblock * soft_count
-                    g = open(f'{self.sa_file_prefix}_{i+1}.ilp', 'w')
-                    g.write(f'soft - {modules_in_subblock}\n')
-                    g.close()
-                    g = open(f'{self.sa_file_prefix}_{i+1}.ilp', 'a')
-                    if soft_left > 0:
-                        for j in range(modules_in_subblock):
-                            g.write(f'{area[soft_count*modules_in_subblock+j]},{min_aspect[soft_count*modules_in_subblock+j]},{max_aspect[soft_count*modules_in_subblock+j]}\n')
-                        g.close()
-                        soft_count += 1
\ No newline at end of file
+            raise ValueError(f'Unknown partitioning strategy {strategy}. Expected one of {list(partitioners)} or a callable.')
+
+        num_hard_modules = self.problem.num_hard_modules
+        hard_module_width, hard_module_height = self.problem.hard_module_width, self.problem.hard_module_height
+        area, min_aspect, max_aspect = self.problem.area, self.problem.min_aspect, self.problem.max_aspect
+
+        problems = []
+        self.groups = []
+        for modules in partitioner(self, sub_block_size):
+            modules = np.asarray(modules, dtype=int)
+            hard = modules[modules < num_hard_modules]
+            soft = modules[modules >= num_hard_modules] - num_hard_modules
+            self.groups.append(np.concatenate((hard, soft + num_hard_modules)))
+            problem = GenerateProblem.from_modules(self.num_blocks,
+                                                   hard_module_width=hard_module_width[hard] if len(hard) else (),
+                                                   hard_module_height=hard_module_height[hard] if len(hard) else (),
+                                                   area=area[soft] if len(soft) else (),
+                                                   min_aspect=min_aspect[soft] if len(soft) else (),
+                                                   max_aspect=max_aspect[soft] if len(soft) else (),
+                                                   underestimation=self.underestimation, segments=self.segments)
+            problems.append(problem)
+
+        if dump:
+            os.makedirs(self.sa_files_dir, exist_ok=True)
+            for i, problem in enumerate(problems):
+                problem.write_spec(f'{self.sa_file_prefix}_{i+1}.ilp')
+
+        return problems
+
+    def combine(self, bounds):
+        """
+            Builds the top-level problem, in which every solved superblock is a rotatable hard module.
+            args:
+                bounds - the list of bounds for every superblock (square superblocks), or of
+                         (width, height) bounding rectangles (rectangular superblocks)
+        """
+        bounds = np.asarray(bounds, dtype=float)
+        if bounds.ndim == 1:
+            bounds = np.stack((bounds, bounds), axis=1)
+
+        return GenerateProblem.from_modules(self.num_blocks, hard_module_width=bounds[:, 0], hard_module_height=bounds[:, 1],
+                                            underestimation=self.underestimation)
@@ -0,0 +1,51 @@
+import numpy as np
+
+
+def drop(position, lengths, cross, cross_lengths, tol=1e-6):
+    """
+    One compaction pass along an axis. Modules are dropped towards 0 in the order of their current
+    position, each onto the highest module already dropped that shares more than tol of its span on the
+    cross axis. This is the longest path through the constraint graph of those pairs, computed with a
+    skyline over the module edges of the cross axis instead of the graph itself.
+    args:
+        position, lengths - coordinates and dimensions along the axis of the pass
+        cross, cross_lengths - coordinates and dimensions along the other axis
+    returns:
+        The new coordinates along the axis
+    """
+    n = len(position)
+    edges = np.unique(np.concatenate((cross, cross + cross_lengths)))
+    first = np.searchsorted(edges, cross + tol, side='right') - 1   # Skyline segments covered by each module
+    last = np.searchsorted(edges, cross + cross_lengths - tol, side='left')
+    skyline = np.zeros(len(edges))
+    coordinate = np.zeros(n)
+    for i in np.lexsort((np.arange(n), position)).tolist():
+        a, b = first[i], last[i]
+        if b > a:
+            coordinate[i] = skyline[a:b].max()
+            skyline[a:b] = coordinate[i] + lengths[i]
+
+    return coordinate
+
+
+def compact(x, y, widths, heights, passes=2, tol=1e-6):
+    """
+    Constraint-graph compaction. Modules that share a stretch of x keep their order in y and are pushed
+    down onto each other; then the same in x, and so on. The first pass in y also separates modules
+    that were given larger heights than they were placed with, as long as the placement was legal with
+    the old heights.
+    args:
+        x, y - the placement
+        widths, heights - the dimensions to compact with
+        passes - number of x/y passes after the first y pass
+    returns:
+        The new x and y
+    """
+    x, y = np.asarray(x, dtype=float), np.asarray(y, dtype=float)
+    widths, heights = np.asarray(widths, dtype=float), np.asarray(heights, dtype=float)
+    y = drop(y, heights, x, widths, tol)
+    for _ in range(passes):
+        x = drop(x, widths, y, heights, tol)
+        y = drop(y, heights, x, widths, tol)
+
+    return x, y
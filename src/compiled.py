@@ -0,0 +1,208 @@
+from collections import OrderedDict
+import numpy as np
+import cvxpy as cp
+
+try:
+    import mosek
+except ImportError: # MOSEK is optional when solving with another cvxpy solver
+    mosek = None
+
+
+class CompiledModel:
+    """
+    A cvxpy problem built once for the structure of a Formulation, with the numbers of the model
+    (module dimensions, big-M, soft module lines, chip bounds) held in cvxpy Parameters. Loading
+    another formulation of the same structure only assigns parameter values, and cvxpy re-solves
+    the problem without canonicalizing it again.
+
+    The rows are written per role rather than per nonzero: the width of module k is
+    width_const[k] + width_coef[k] * v[width_col[k]] (likewise its height), and every pair family
+    has one M for its width rows and one for its height rows, as Formulation.big_m gives every pair
+    the chip bound of the direction. cvxpy compiles this form in time linear in the model size, where
+    a parameter for every nonzero of A does not scale.
+    """
+
+    def __init__(self, formulation):
+        """
+        args:
+            formulation: The model to compile (Formulation)
+        """
+        self.structure = self.structure_of(formulation)
+        structure = self.structure
+        integers = np.flatnonzero(structure['integrality'])
+        self.v = cp.Variable(structure['num_variables'], integer=[(k,) for k in integers]) if len(integers) else cp.Variable(structure['num_variables'])
+        v = self.v
+        n = len(structure['width_col'])
+        offsets = formulation.offsets
+        x, y = v[offsets['x']:offsets['x'] + n], v[offsets['y']:offsets['y'] + n]
+        X, Y = v[structure['chip_width_col']], v[offsets['Y']]
+
+        self.width_coef, self.width_const = cp.Parameter(n), cp.Parameter(n)
+        self.height_coef, self.height_const = cp.Parameter(n), cp.Parameter(n)
+        width = self.width_const + cp.multiply(self.width_coef, v[structure['width_col']])
+        height = self.height_const + cp.multiply(self.height_coef, v[structure['height_col']])
+
+        constraints = []
+        self.big_m = []
+        for name, I, J in structure['pairs']:
+            M_x, M_y = cp.Parameter(nonneg=True), cp.Parameter(nonneg=True)
+            xij = v[formulation.pair_column('x_ij', I, J)]
+            yij = v[formulation.pair_column('y_ij', I, J)]
+            constraints += [x[I] + width[I] - x[J] <= M_x * (xij + yij),
+                            x[J] + width[J] - x[I] <= M_x * (1 - xij + yij),
+                            y[I] + height[I] - y[J] <= M_y * (1 + xij - yij),
+                            y[J] + height[J] - y[I] <= M_y * (2 - xij - yij)]
+            self.big_m.append((M_x, M_y))
+
+        m = structure['height_lines']
+        if m is not None:
+            self.height_gradients, self.height_intercepts = cp.Parameter(len(m)), cp.Parameter(len(m))
+            w, h = offsets['w'], offsets['h']
+            constraints.append(cp.multiply(self.height_gradients, v[w + m]) + self.height_intercepts <= v[h + m])
+        constraints += [x + width <= X, y + height <= Y]
+        if structure['aspect']:
+            self.aspect_limit = cp.Parameter(nonneg=True)
+            constraints += [Y <= self.aspect_limit * X, X <= self.aspect_limit * Y]
+        (I, J), (P, Q) = structure['ordered_pairs']
+        if len(I) > 0:
+            constraints += [x[I] <= x[J], v[formulation.pair_column('x_ij', P, Q)] <= v[formulation.pair_column('y_ij', P, Q)]]
+        k = structure['anchor']
+        if k is not None:
+            constraints += [2 * x[k] + width[k] <= X, 2 * y[k] + height[k] <= Y]
+        if structure['area']:
+            self.min_half_perimeter = cp.Parameter(nonneg=True)
+            constraints.append(X + Y >= self.min_half_perimeter)
+
+        lower, upper = structure['lower'], structure['upper']
+        self.lb, self.ub = cp.Parameter(len(lower)), cp.Parameter(len(upper))
+        constraints += [self.lb <= v[lower], v[upper] <= self.ub]
+        self.problem = cp.Problem(cp.Minimize(structure['objective'] @ v), constraints)
+        self.load(formulation, check=False)
+
+    @staticmethod
+    def structure_of(formulation):
+        """
+        Everything about a formulation that the compiled problem depends on, apart from parameter values.
+        """
+        lb, ub = formulation.bounds()
+        symmetry = formulation.symmetry
+        empty = np.zeros(0, dtype=int)
+
+        return {'num_variables': formulation.num_variables, 'integrality': formulation.integrality(), 'objective': formulation.objective(),
+                'chip_width_col': formulation.column('X' if formulation.shape == 'rectangle' else 'Y'),
+                'width_col': formulation.module_width_terms()[0], 'height_col': formulation.module_height_terms()[0],
+                'pairs': formulation.pair_families(),
+                'height_lines': formulation.height_lines()[0] if formulation.piecewise else None,
+                'aspect': formulation.shape == 'rectangle' and formulation.aspect_limit is not None,
+                'area': formulation.shape == 'rectangle' and formulation.tightened,
+                'ordered_pairs': symmetry.ordered_pairs() if symmetry is not None else ((empty, empty), (empty, empty)),
+                'anchor': symmetry.anchor if symmetry is not None else None,
+                'lower': np.flatnonzero(np.isfinite(lb)), 'upper': np.flatnonzero(np.isfinite(ub))}
+
+    def matches(self, formulation, structure=None):
+        """
+        Whether the formulation (or its structure, when given) can be loaded into this model.
+        """
+        structure = self.structure_of(formulation) if structure is None else structure
+
+        return same_structure(structure, self.structure)
+
+    def load(self, formulation, check=True):
+        """
+        Assigns the numbers of a formulation with the same structure to the parameters.
+        """
+        if check and not self.matches(formulation):
+            raise ValueError('The formulation has a different structure. Compile it into a new CompiledModel.')
+        _, self.width_coef.value, self.width_const.value = formulation.module_width_terms()
+        _, self.height_coef.value, self.height_const.value = formulation.module_height_terms()
+        for (M_x, M_y), (name, I, J) in zip(self.big_m, self.structure['pairs']):
+            M_x.value, M_y.value = [np.max(M) for M in formulation.big_m(I, J)]   # Equal for every pair
+        if self.structure['height_lines'] is not None:
+            m, k = formulation.height_lines()
+            problem = formulation.problem
+            self.height_gradients.value = problem.height_gradients[m, k]
+            self.height_intercepts.value = problem.height_intercepts[m, k]
+        if self.structure['aspect']:
+            self.aspect_limit.value = formulation.aspect_limit
+        if self.structure['area']:
+            self.min_half_perimeter.value = 2 * np.sqrt(formulation.tightening.area)
+        lb, ub = formulation.bounds()
+        self.lb.value, self.ub.value = lb[self.structure['lower']], ub[self.structure['upper']]
+
+    def solve(self, run_time, solver='MOSEK', verbose=False, threads=None, x0=None, target_gap=None):
+        """
+        args:
+            run_time: Time limit of the solver in seconds
+            threads: Number of threads MOSEK may use (solver default when None)
+            x0: A solution vector to start from (None for a cold start)
+            target_gap: Relative MIP gap at which MOSEK or SCIPY stops (solver default when None)
+        returns:
+            The objective value and the solution vector, or (None, None) if the solver found no solution
+        """
+        if x0 is not None:
+            self.v.value = x0
+        self.problem.solve(solver=solver, verbose=verbose, **solver_options(solver, run_time, threads=threads, target_gap=target_gap,
+                                                                            warm_start=x0 is not None))
+
+        return self.problem.value, self.v.value
+
+
+def solver_options(solver, run_time, threads=None, target_gap=None, warm_start=False):
+    """
+    The keyword arguments of cvxpy's Problem.solve that pass the time limit, thread count and target gap
+    on to the solver. Only MOSEK and SCIPY (HiGHS) are mapped; any other solver would run without a time
+    limit, so it is refused.
+    """
+    if solver == 'MOSEK':
+        if mosek is None:
+            raise ImportError('MOSEK is not installed. Install it or solve with backend=\'scipy\'.')
+        mosek_params = {mosek.dparam.optimizer_max_time: run_time}
+        if threads is not None:
+            mosek_params[mosek.iparam.num_threads] = threads
+        if target_gap is not None:
+            mosek_params[mosek.dparam.mio_tol_rel_gap] = target_gap
+        return {'warm_start': warm_start, 'mosek_params': mosek_params}
+    if solver == 'SCIPY':   # scipy.optimize.milp has no warm start and no thread count
+        scipy_options = {'time_limit': run_time}
+        if target_gap is not None:
+            scipy_options['mip_rel_gap'] = target_gap
+        return {'scipy_options': scipy_options}
+
+    raise ValueError(f'Cannot pass a time limit to the cvxpy solver {solver}. Expected \'MOSEK\' or \'SCIPY\'.')
+
+
+def same_structure(a, b):
+    """
+    Whether two structures (as from CompiledModel.structure_of) are equal, comparing arrays by value.
+    """
+    if isinstance(a, np.ndarray) or isinstance(b, np.ndarray):
+        return isinstance(a, np.ndarray) and isinstance(b, np.ndarray) and np.array_equal(a, b)
+    if isinstance(a, dict):
+        return isinstance(b, dict) and a.keys() == b.keys() and all(same_structure(a[key], b[key]) for key in a)
+    if isinstance(a, (list, tuple)):
+        return isinstance(b, (list, tuple)) and len(a) == len(b) and all(same_structure(p, q) for p, q in zip(a, b))
+
+    return a == b
+
+
+compiled_models = OrderedDict()   # The most recently used compiled models of this process
+max_compiled_models = 8
+
+
+def compile_formulation(formulation):
+    """
+    A CompiledModel loaded with the formulation. Models are cached per structure, so superblocks and
+    re-solves of the same structure share one compiled problem.
+    """
+    structure = CompiledModel.structure_of(formulation)
+    for key, model in compiled_models.items():
+        if model.matches(formulation, structure):
+            compiled_models.move_to_end(key)
+            model.load(formulation, check=False)
+            return model
+    model = CompiledModel(formulation)
+    compiled_models[id(model)] = model
+    if len(compiled_models) > max_compiled_models:
+        compiled_models.popitem(last=False)
+
+    return model
@@ -0,0 +1,388 @@
+import numpy as np
+import scipy.sparse as sp
+from src.generate import pair_index, pair_position
+
+
+class Formulation:
+    """
+    Sparse matrix form of the big-M floorplanning model of a GenerateProblem.
+
+    Every variable of the model is a column of one stacked vector v, laid out as
+        x (n), y (n), w (soft), [h (soft)], [X (1)], Y (1), x_ij (pairs), y_ij (pairs), z (hard)
+    where the relative-position binaries exist only for the n(n-1)/2 pairs i < j,
+    ordered as in pair_index. Each constraint
+    family is emitted as a single block A @ v <= b.
+
+    The soft module heights h are columns only for a piecewise height model
+    (GenerateProblem.piecewise), where h is at least every line of the model. Otherwise
+    the height is the single affine line gradient * w + intercept.
+
+    A square chip minimizes Y, which bounds both chip width and height. A rectangular
+    chip has its own width column X and minimizes the half perimeter X + Y.
+    """
+
+    def __init__(self, problem, shape='square', aspect_limit=None, tightening=None, symmetry=None, fixed=None):
+        """
+        args:
+            problem: The parsed specification (GenerateProblem)
+            shape: 'square' or 'rectangle'
+            aspect_limit: For a rectangle, the largest allowed ratio between chip width and height (None for any)
+            tightening: A BoundTightening of the problem, whose chip bounds (and big-M) replace
+                        the global GenerateProblem.upper_bound (None to keep it)
+            symmetry: A SymmetryBreaking of the problem, whose identical modules are ordered and whose
+                      anchor module is kept in the lower-left quadrant (None for no symmetry breaking)
+            fixed: (pairs, x_ij, y_ij), the positions (see pair_position) of pairs whose relation is fixed and the
+                   values of their binaries, e.g. the pairs an incremental re-solve keeps (None for none)
+        """
+        if shape not in ('square', 'rectangle'):
+            raise ValueError(f'Unknown chip shape {shape}. Expected \'square\' or \'rectangle\'.')
+        self.problem = problem
+        self.shape = shape
+        self.aspect_limit = aspect_limit
+        self.num_hard_modules, self.num_soft_modules = problem.num_hard_modules, problem.num_soft_modules
+        self.num_total_modules = problem.num_total_modules
+        self.tightening = tightening
+        self.symmetry = symmetry
+        self.fixed = fixed
+        self.tightened = tightening is not None
+        if self.tightened:
+            self.width_bound, self.height_bound = tightening.width_upper, tightening.height_upper
+        else:
+            self.width_bound, self.height_bound = problem.bound, problem.bound
+        self.bound = max(self.width_bound, self.height_bound)
+
+        n = self.num_total_modules
+        self.num_pairs = n * (n - 1) // 2
+        self.piecewise = problem.soft_exists and problem.piecewise()
+        sizes = [('x', n), ('y', n), ('w', self.num_soft_modules), ('h', self.num_soft_modules if self.piecewise else 0),
+                 ('X', 1 if shape == 'rectangle' else 0), ('Y', 1),
+                 ('x_ij', self.num_pairs), ('y_ij', self.num_pairs), ('z', self.num_hard_modules)]
+        self.offsets = {}
+        offset = 0
+        for name, size in sizes:
+            self.offsets[name] = offset
+            offset += size
+        self.num_variables = offset
+
+    def column(self, name, index=0):
+        return self.offsets[name] + index
+
+    def pair_column(self, name, i, j):
+        return self.offsets[name] + pair_position(i, j, self.num_total_modules)
+
+    def values(self, v):
+        """
+        Splits a solution vector into its named blocks (x, y, w, h, X, Y, x_ij, y_ij, z).
+        """
+        names = list(self.offsets)
+        ends = [self.offsets[name] for name in names[1:]] + [self.num_variables]
+
+        return {name: v[self.offsets[name]:end] for name, end in zip(names, ends)}
+
+    def vector(self, values):
+        """
+        Joins named blocks (as from values, possibly of another layout of the same problem) into a
+        solution vector. Blocks this layout has no columns for are dropped, missing ones are zero.
+        """
+        v = np.zeros(self.num_variables)
+        sizes = {name: len(block) for name, block in self.values(v).items()}
+        for name, block in values.items():
+            if sizes.get(name) and len(block) == sizes[name]:
+                v[self.offsets[name]:self.offsets[name] + sizes[name]] = block
+
+        return v
+
+    def module_width_terms(self):
+        """
+        The width of module k is coef[k] * v[col[k]] + const[k]: a hard module
+        takes its height when rotated (z = 1), a soft module takes w.
+        """
+        nh, ns = self.num_hard_modules, self.num_soft_modules
+        col = np.zeros(self.num_total_modules, dtype=int)
+        coef = np.zeros(self.num_total_modules)
+        const = np.zeros(self.num_total_modules)
+        if self.problem.hard_exists:
+            col[:nh] = self.column('z') + np.arange(nh)
+            coef[:nh] = self.problem.hard_module_height - self.problem.hard_module_width
+            const[:nh] = self.problem.hard_module_width
+        if self.problem.soft_exists:
+            col[nh:] = self.column('w') + np.arange(ns)
+            coef[nh:] = 1
+
+        return col, coef, const
+
+    def module_height_terms(self):
+        nh, ns = self.num_hard_modules, self.num_soft_modules
+        col = np.zeros(self.num_total_modules, dtype=int)
+        coef = np.zeros(self.num_total_modules)
+        const = np.zeros(self.num_total_modules)
+        if self.problem.hard_exists:
+            col[:nh] = self.column('z') + np.arange(nh)
+            coef[:nh] = self.problem.hard_module_width - self.problem.hard_module_height
+            const[:nh] = self.problem.hard_module_height
+        if self.piecewise:
+            col[nh:] = self.column('h') + np.arange(ns)
+            coef[nh:] = 1
+        elif self.problem.soft_exists:
+            col[nh:] = self.column('w') + np.arange(ns)
+            coef[nh:] = self.problem.gradient
+            const[nh:] = self.problem.intercept
+
+        return col, coef, const
+
+    def big_m(self, I, J):
+        """
+        The M of the width rows and of the height rows of every pair (I[k], J[k]).
+        """
+        if self.tightened:
+            return self.tightening.big_m(I, J)
+
+        return np.full(len(I), self.bound), np.full(len(I), self.bound)
+
+    def pair_families(self):
+        """
+        The (name, I, J) of the hard-hard, hard-soft and soft-soft pairs i < j, where there are any.
+        """
+        nh, n = self.num_hard_modules, self.num_total_modules
+        hard = np.arange(nh)
+        soft = np.arange(nh, n)
+        families = []
+        for name, first, second, exists in [('hard-hard', hard, hard, self.problem.hard_exists),
+                                            ('hard-soft', hard, soft, self.problem.hard_exists and self.problem.soft_exists),
+                                            ('soft-soft', soft, soft, self.problem.soft_exists)]:
+            if not exists:
+                continue
+            I, J = np.meshgrid(first, second, indexing='ij')
+            upper = J > I
+            if upper.any():
+                families.append((name, I[upper], J[upper]))
+
+        return families
+
+    def nonoverlap(self, I, J):
+        """
+        The four big-M rows of every pair (I[k], J[k]), stacked row family by row family.
+            (x_ij, y_ij) = (0, 0): i left of j     (1, 0): i right of j
+            (x_ij, y_ij) = (0, 1): i below j       (1, 1): i above j
+        """
+        p = len(I)
+        M_x, M_y = self.big_m(I, J)
+        w_col, w_coef, w_const = self.module_width_terms()
+        h_col, h_coef, h_const = self.module_height_terms()
+        x, y = self.column('x'), self.column('y')
+        xij = self.pair_column('x_ij', I, J)
+        yij = self.pair_column('y_ij', I, J)
+        ones = np.ones(p)
+
+        # (columns, coefficients) of each row family, and its right hand side
+        families = [
+            ([x + I, x + J, w_col[I], xij, yij], [ones, -ones, w_coef[I], -M_x, -M_x], -w_const[I]),
+            ([x + I, x + J, w_col[J], xij, yij], [-ones, ones, w_coef[J], M_x, -M_x], M_x - w_const[J]),
+            ([y + I, y + J, h_col[I], xij, yij], [ones, -ones, h_coef[I], -M_y, M_y], M_y - h_const[I]),
+            ([y + I, y + J, h_col[J], xij, yij], [-ones, ones, h_coef[J], M_y, M_y], 2 * M_y - h_const[J]),
+        ]
+        rows, cols, vals, b = [], [], [], []
+        for f, (family_cols, family_vals, rhs) in enumerate(families):
+            for c, val in zip(family_cols, family_vals):
+                rows.append(f * p + np.arange(p))
+                cols.append(c)
+                vals.append(val)
+            b.append(rhs)
+
+        return self._assemble(rows, cols, vals, 4 * p), np.concatenate(b)
+
+    def chip_size(self):
+        """
+        Every module must end before the chip width (X, or Y for a square) and the chip height Y.
+        """
+        n = self.num_total_modules
+        k = np.arange(n)
+        X = np.full(n, self.column('X' if self.shape == 'rectangle' else 'Y'))
+        Y = np.full(n, self.column('Y'))
+        w_col, w_coef, w_const = self.module_width_terms()
+        h_col, h_coef, h_const = self.module_height_terms()
+
+        width = self._assemble([k, k, k], [self.column('x') + k, w_col, X], [np.ones(n), w_coef, -np.ones(n)], n)
+        height = self._assemble([k, k, k], [self.column('y') + k, h_col, Y], [np.ones(n), h_coef, -np.ones(n)], n)
+
+        return (width, -w_const), (height, -h_const)
+
+    def constraint_families(self):
+        """
+        Returns a list of (name, A, b) blocks, each meaning A @ v <= b.
+        """
+        families = []
+        for name, I, J in self.pair_families():
+            A, b = self.nonoverlap(I, J)
+            families.append((name, A, b))
+
+        if self.piecewise:
+            families.append(('soft height', *self.soft_height()))
+        (A, b), (A_h, b_h) = self.chip_size()
+        families.append(('chip width', A, b))
+        families.append(('chip height', A_h, b_h))
+        if self.shape == 'rectangle' and self.aspect_limit is not None:
+            a = self.aspect_limit
+            A = self._assemble([np.array([0, 0]), np.array([1, 1])],
+                               [np.array([self.column('Y'), self.column('X')]), np.array([self.column('X'), self.column('Y')])],
+                               [np.array([1, -a]), np.array([1, -a])], 2)
+            families.append(('chip aspect', A, np.zeros(2)))
+        if self.symmetry is not None:
+            families += self.symmetry_breaking()
+        if self.shape == 'rectangle' and self.tightened:   # X + Y >= 2 sqrt(area), since X * Y >= area
+            A = self._assemble([np.array([0, 0])], [np.array([self.column('X'), self.column('Y')])], [-np.ones(2)], 1)
+            families.append(('chip area', A, np.array([-2 * np.sqrt(self.tightening.area)])))
+
+        return families
+
+    def height_lines(self):
+        """
+        The (soft module, line) indices of every line of the piecewise height model.
+        """
+        problem = self.problem
+
+        return np.nonzero(np.arange(problem.height_gradients.shape[1]) < problem.num_height_lines[:, np.newaxis])
+
+    def soft_height(self):
+        """
+        gradient * w - h <= -intercept for every line of the piecewise height model.
+        """
+        problem = self.problem
+        m, k = self.height_lines()
+        r = np.arange(len(m))
+        A = self._assemble([r, r], [self.column('w') + m, self.column('h') + m],
+                           [problem.height_gradients[m, k], -np.ones(len(m))], len(m))
+
+        return A, -problem.height_intercepts[m, k]
+
+    def symmetry_breaking(self):
+        """
+        Identical modules ordered by x, never "i right of j", and the anchor centered in the lower-left quadrant.
+        """
+        families = []
+        (I, J), (P, Q) = self.symmetry.ordered_pairs()
+        if len(I) > 0:
+            p, q = len(I), len(P)
+            x = self.column('x')
+            order = self._assemble([np.arange(p), np.arange(p)], [x + I, x + J], [np.ones(p), -np.ones(p)], p)
+            relation = self._assemble([np.arange(q), np.arange(q)], [self.pair_column('x_ij', P, Q), self.pair_column('y_ij', P, Q)],
+                                      [np.ones(q), -np.ones(q)], q)
+            families.append(('identical order', order, np.zeros(p)))
+            families.append(('identical relation', relation, np.zeros(q)))
+
+        k = self.symmetry.anchor
+        if k is not None:
+            w_col, w_coef, w_const = self.module_width_terms()
+            h_col, h_coef, h_const = self.module_height_terms()
+            X = self.column('X' if self.shape == 'rectangle' else 'Y')
+            # 2 x_k + width_k <= chip width and 2 y_k + height_k <= chip height
+            A = self._assemble([np.zeros(3, dtype=int), np.ones(3, dtype=int)],
+                               [np.array([self.column('x', k), w_col[k], X]), np.array([self.column('y', k), h_col[k], self.column('Y')])],
+                               [np.array([2, w_coef[k], -1]), np.array([2, h_coef[k], -1])], 2)
+            families.append(('anchor', A, np.array([-w_const[k], -h_const[k]])))
+
+        return families
+
+    def bounds(self):
+        """
+        Lower and upper bounds of every column (-inf/inf where unbounded).
+        """
+        n = self.num_total_modules
+        lb = np.full(self.num_variables, -np.inf)
+        ub = np.full(self.num_variables, np.inf)
+        lb[self.column('x'):self.column('x') + n] = 0
+        lb[self.column('y'):self.column('y') + n] = 0
+        if self.problem.soft_exists:
+            w = slice(self.column('w'), self.column('w') + self.num_soft_modules)
+            lb[w] = self.problem.soft_module_width_range[:, 0]
+            ub[w] = self.problem.soft_module_width_range[:, 1]
+        if self.piecewise:
+            h = slice(self.column('h'), self.column('h') + self.num_soft_modules)
+            lb[h] = self.problem.soft_module_height(self.problem.soft_module_width_range[:, 1])
+        if self.shape == 'rectangle':   # Keeps the big-M valid in both directions
+            ub[self.column('X')] = self.width_bound
+        if self.shape == 'rectangle' or self.tightened:
+            ub[self.column('Y')] = self.height_bound
+        lb[self.column('x_ij'):] = 0
+        ub[self.column('x_ij'):] = 1
+        if self.tightened:
+            if self.shape == 'rectangle':
+                lb[self.column('X')] = self.tightening.width_lower
+            lb[self.column('Y')] = self.tightening.height_lower
+            I, J = pair_index(self.num_total_modules)
+            stacked, side_by_side = self.tightening.fixed_relations(I, J)
+            y_ij = self.column('y_ij')
+            lb[y_ij:y_ij + self.num_pairs][stacked] = 1
+            ub[y_ij:y_ij + self.num_pairs][side_by_side] = 0
+        if self.fixed is not None:
+            pairs, x_ij, y_ij = self.fixed
+            lb[self.column('x_ij') + pairs] = ub[self.column('x_ij') + pairs] = x_ij
+            lb[self.column('y_ij') + pairs] = ub[self.column('y_ij') + pairs] = y_ij
+
+        return lb, ub
+
+    def size(self):
+        """
+        Number of variables, integer variables, constraint rows and nonzeros of the model.
+        """
+        families = self.constraint_families()
+
+        return {'variables': self.num_variables, 'integers': int(np.sum(self.integrality())),
+                'constraints': sum(A.shape[0] for _, A, _ in families), 'nonzeros': sum(A.nnz for _, A, _ in families)}
+
+    def integrality(self):
+        """
+        1 for integer columns, 0 for continuous ones.
+        """
+        integrality = np.zeros(self.num_variables, dtype=int)
+        integrality[self.column('x_ij'):] = 1
+
+        return integrality
+
+    def objective(self):
+        c = np.zeros(self.num_variables)
+        c[self.column('Y')] = 1
+        if self.shape == 'rectangle':
+            c[self.column('X')] = 1
+
+        return c
+
+    def solution_vector(self, x, y, w, z, x_ij, y_ij, chip_width, chip_height):
+        """
+        A full solution vector in the column layout, e.g. to warm start a solver.
+        """
+        v = np.zeros(self.num_variables)
+        n = self.num_total_modules
+        v[self.column('x'):self.column('x') + n] = x
+        v[self.column('y'):self.column('y') + n] = y
+        if self.problem.soft_exists:
+            v[self.column('w'):self.column('w') + self.num_soft_modules] = w
+        if self.piecewise:
+            v[self.column('h'):self.column('h') + self.num_soft_modules] = self.problem.soft_module_height(w)
+        if self.shape == 'rectangle':
+            v[self.column('X')] = chip_width
+            v[self.column('Y')] = chip_height
+        else:
+            v[self.column('Y')] = max(chip_width, chip_height)
+        v[self.column('x_ij'):self.column('x_ij') + self.num_pairs] = x_ij
+        v[self.column('y_ij'):self.column('y_ij') + self.num_pairs] = y_ij
+        if self.problem.hard_exists:
+            v[self.column('z'):self.column('z') + self.num_hard_modules] = z
+
+        return v
+
+    def violation(self, v):
+        """
+        The largest amount by which a solution vector breaks a constraint row or a bound (0 when feasible).
+        """
+        lb, ub = self.bounds()
+        rows = [np.max(A @ v - b, initial=0) for _, A, b in self.constraint_families()]
+
+        return max(max(rows, default=0), np.max(lb - v, initial=0), np.max(v - ub, initial=0))
+
+    def _assemble(self, rows, cols, vals, num_rows):
+        A = sp.coo_matrix((np.concatenate(vals), (np.concatenate(rows), np.concatenate(cols))),
+                          shape=(num_rows, self.num_variables)).tocsr()
+        A.eliminate_zeros()
+
+        return A
@@ -1,111 +1,111 @@
 import numpy as np
 import os
 from typing import List
+from src.spec import read_spec
 
 
 cwd = os.getcwd()
 spec_files_dir = os.path.join(cwd, 'spec_files') # Contains the initial specifications
-lp_solve_files_dir = os.path.join(cwd, 'lp_solve_files') # Contains the sources files for LPSolve tool
+lp_solve_files_dir = os.path.join(cwd, 'lp_solve_files') # Contains the model files written by ModelWriter
 os.makedirs(lp_solve_files_dir, exist_ok=True)
 
 
+def pair_index(num_modules):
+    """
+    The module pairs (i, j), i < j, in the order of the compact relative-position binaries.
+    Only these n(n-1)/2 pairs carry an x_ij/y_ij variable.
+    """
+    return np.triu_indices(num_modules, k=1)
+
+
+def pair_position(i, j, num_modules):
+    """
+    Position of the pair (i, j), i < j, in the compact binaries. Works elementwise on arrays.
+    """
+    return i * (2 * num_modules - i - 1) // 2 + (j - i - 1)
+
+
 class GenerateProblem:
 
-    def __init__(self, file, num_blocks, underestimation=True):
+    def __init__(self, file, num_blocks, underestimation=True, segments=None, cache=False):
         """
         args:
             file: The provided *.ilp file (str)
             num_blocks: Number of blocks to be optimized (int)
             underestimation: Whether or not we are considering underestimation (bool)
+            segments: Number of lines of the piecewise-linear soft module heights (None for the single line of linear_approximation)
+            cache: Whether or not to keep the parsed file in the *.npz cache of read_spec (bool)
         """
-        self.hard_exists = False
-        self.soft_exists = False
         self.underestimation = underestimation
-
+        self.segments = segments
         self.num_blocks = num_blocks
-        spec_file = os.path.join(spec_files_dir, file)
-        lines = []
-        with open(file) as f:
-            for line in f:
-                lines.append(line)
-        self.lines = lines
-        
-        self.num_hard_modules, self.num_soft_modules = self.total_modules()
-        self.num_total_modules = self.num_hard_modules + self.num_soft_modules
-        self.hard_module_width, self.hard_module_height = self.hard_module_dimension()
-        self.area, self.min_aspect, self.max_aspect = self.soft_module_properties()
-        self.soft_module_width_range, self.soft_module_height_range = self.soft_module_dimension_range()
-        self.gradient, self.intercept = self.linear_approximation()
-        self.bound = self.upper_bound()
-        self.output = os.path.join(lp_solve_files_dir, f'{self.num_total_modules}_blocks_constraints.lp')
-
-
-    def total_modules(self):
-        for line in self.lines:
-            if line[0:4] == 'hard':
-                self.hard_exists = True
-                num_hard_modules = line.replace('hard - ', '')
-                num_hard_modules = int(num_hard_modules.replace('\n', ''))
-            elif line[0:4] == 'soft':
-                self.soft_exists = True
-                num_soft_modules = line.replace('soft - ', '')
-                num_soft_modules = int(num_soft_modules.replace('\n', ''))
-            elif self.hard_exists and not self.soft_exists:
-                num_soft_modules = 0
-            elif not self.hard_exists and self.soft_exists:
-                num_hard_modules = 0
-            elif not self.hard_exists and not self.soft_exists:
-
-                raise FileNotFoundError('Empty File!')
-
-        return num_hard_modules, num_soft_modules
-
-    def hard_module_dimension(self):
-        if self.hard_exists:
-            hard_module_width = []
-            hard_module_height = []
-            for line_count in range(len(self.lines)):
-                if self.lines[line_count][0:4] == 'hard':
-                    break
-            for i in range (line_count+1, line_count+1+self.num_hard_modules):
-                comma_ind = self.lines[i].index(',')
-                width = self.lines[i][:comma_ind]
-                height = self.lines[i][comma_ind+1:]
-                hard_module_width.append(float(width))
-                hard_module_height.append(float(height))
-
-            hard_module_width = np.array(hard_module_width)
-            hard_module_height = np.array(hard_module_height)
-        else:
-            hard_module_width, hard_module_height = 0, 0
+        hard, soft = read_spec(file, cache=cache)
+        self.set_modules(hard[:, 0], hard[:, 1], soft[:, 0], soft[:, 1], soft[:, 2])
 
-        return hard_module_width, hard_module_height
+    @classmethod
+    def from_modules(cls, num_blocks, hard_module_width=(), hard_module_height=(), area=(), min_aspect=(), max_aspect=(), underestimation=True, segments=None):
+        """
+        Builds a problem straight from module arrays, without a *.ilp file.
+        args:
+            num_blocks: Number of blocks of the original design (int)
+            hard_module_width, hard_module_height: Dimensions of the hard modules
+            area, min_aspect, max_aspect: Properties of the soft modules
+            underestimation: Whether or not we are considering underestimation (bool)
+            segments: Number of lines of the piecewise-linear soft module heights (None for a single line)
+        """
+        problem = cls.__new__(cls)
+        problem.underestimation = underestimation
+        problem.segments = segments
+        problem.num_blocks = num_blocks
+        problem.set_modules(hard_module_width, hard_module_height, area, min_aspect, max_aspect)
 
-    def soft_module_properties(self):
+        return problem
+
+    def set_modules(self, hard_module_width, hard_module_height, area, min_aspect, max_aspect):
+        """
+        Stores the module arrays (0 in place of the arrays of a missing kind) and derives everything else from them.
+        """
+        self.num_hard_modules, self.num_soft_modules = len(hard_module_width), len(area)
+        self.hard_exists = self.num_hard_modules > 0
+        self.soft_exists = self.num_soft_modules > 0
+        if not self.hard_exists and not self.soft_exists:
+            raise ValueError('A problem needs at least one module.')
+        if self.hard_exists:
+            self.hard_module_width = np.asarray(hard_module_width, dtype=float)
+            self.hard_module_height = np.asarray(hard_module_height, dtype=float)
+        else:
+            self.hard_module_width, self.hard_module_height = 0, 0
         if self.soft_exists:
-            area, min_aspect, max_aspect = [], [], []
-
-            for line_count in range(len(self.lines)):
-                if self.lines[line_count][0:4] == 'soft':
-                    break
-            for i in range(line_count+1, line_count+1+self.num_soft_modules):
-                first_comma_ind = self.lines[i].index(',')
-                module_area = (self.lines[i][:first_comma_ind])
-                line_after_comma = self.lines[i][first_comma_ind+1:]
-                second_comma_ind = line_after_comma.index(',')
-                area.append(float(module_area))
-                module_min_aspect = line_after_comma[:second_comma_ind]
-                module_max_aspect = line_after_comma[second_comma_ind+1:]
-                min_aspect.append(float(module_min_aspect))
-                max_aspect.append(float(module_max_aspect))
-
-            area = np.array(area)
-            min_aspect = np.array(min_aspect)
-            max_aspect = np.array(max_aspect)
+            self.area = np.asarray(area, dtype=float)
+            self.min_aspect = np.asarray(min_aspect, dtype=float)
+            self.max_aspect = np.asarray(max_aspect, dtype=float)
         else:
-            area, min_aspect, max_aspect = 0, 0, 0
+            self.area, self.min_aspect, self.max_aspect = 0, 0, 0
+        self.derive_properties()
 
-        return area, min_aspect, max_aspect
+    def derive_properties(self):
+        self.num_total_modules = self.num_hard_modules + self.num_soft_modules
+        self.soft_module_width_range, self.soft_module_height_range = self.soft_module_dimension_range()
+        self.gradient, self.intercept = self.linear_approximation()
+        self.soft_breakpoints = self.initial_breakpoints()
+        self.height_gradients, self.height_intercepts, self.num_height_lines = self.height_lines()
+        self.bound = self.upper_bound()
+
+    def write_spec(self, path):
+        """
+        Writes the modules back in the *.ilp format.
+        """
+        with open(path, 'w') as f:
+            if self.hard_exists:
+                f.write(f'hard - {self.num_hard_modules}\n')
+                for width, height in zip(self.hard_module_width, self.hard_module_height):
+                    f.write(f'{width},{height}\n')
+            if self.soft_exists:
+                if self.hard_exists:
+                    f.write('\n')
+                f.write(f'soft - {self.num_soft_modules}\n')
+                for area, min_aspect, max_aspect in zip(self.area, self.min_aspect, self.max_aspect):
+                    f.write(f'{area},{min_aspect},{max_aspect}\n')
 
     def soft_module_dimension_range(self):
         if self.soft_exists:
@@ -146,8 +146,79 @@ class GenerateProblem:
 
             return 0, 0
 
+    def initial_breakpoints(self):
+        """
+        The widths at which the piecewise height model meets area / w: the tangent points
+        (underestimation) or the chord ends (overestimation) of every soft module. They are
+        spaced geometrically, which follows the curvature of the hyperbola. A single segment
+        reproduces linear_approximation.
+        """
+        if self.segments is None or not self.soft_exists:
+            return None
+        if self.segments < 1:
+            raise ValueError('The soft module height needs at least one segment.')
+        if self.underestimation:
+            fractions = np.linspace(1, 0, self.segments)
+        else:
+            fractions = np.linspace(0, 1, self.segments + 1)
+        min_w, max_w = self.soft_module_width_range[:, 0], self.soft_module_width_range[:, 1]
+
+        return [np.unique(low * (high / low) ** fractions) for low, high in zip(min_w, max_w)]
+
+    def height_lines(self):
+        """
+        The modeled height of soft module m is the maximum over k < num_lines[m] of
+        gradients[m, k] * w + intercepts[m, k]. The height is convex, so it can be modeled without
+        binaries. Rows beyond num_lines[m] repeat the last line.
+        """
+        if self.soft_breakpoints is None:
+            return np.atleast_1d(self.gradient)[:, np.newaxis], np.atleast_1d(self.intercept)[:, np.newaxis], np.ones(np.size(self.gradient), dtype=int)
+        lines = []
+        for area, points in zip(self.area, self.soft_breakpoints):
+            if self.underestimation:    # Tangents of area / w
+                gradient, intercept = -area / points ** 2, 2 * area / points
+            elif len(points) == 1:
+                gradient, intercept = np.zeros(1), area / points
+            else:                       # Chords of area / w between consecutive breakpoints
+                heights = area / points
+                gradient = np.diff(heights) / np.diff(points)
+                intercept = heights[:-1] - gradient * points[:-1]
+            lines.append((gradient, intercept))
+        num_lines = np.array([len(gradient) for gradient, _ in lines])
+        k = np.max(num_lines)
+        gradients = np.array([np.pad(gradient, (0, k - len(gradient)), mode='edge') for gradient, _ in lines])
+        intercepts = np.array([np.pad(intercept, (0, k - len(intercept)), mode='edge') for _, intercept in lines])
+
+        return gradients, intercepts, num_lines
+
+    def add_breakpoints(self, W, modules=None):
+        """
+        Makes the piecewise height model exact at the given soft module widths (adaptive segments,
+        cutting planes). A problem with the single line of linear_approximation becomes a
+        one-segment piecewise model first.
+        args:
+            W: A width for every soft module
+            modules: Boolean mask of the soft modules that get a breakpoint (None for all)
+        """
+        if self.soft_breakpoints is None:
+            self.segments = 1
+            self.soft_breakpoints = self.initial_breakpoints()
+        W = np.clip(W, self.soft_module_width_range[:, 0], self.soft_module_width_range[:, 1])
+        if modules is None:
+            modules = np.ones(self.num_soft_modules, dtype=bool)
+        self.soft_breakpoints = [np.unique(np.append(points, w)) if refine else points
+                                 for points, w, refine in zip(self.soft_breakpoints, W, modules)]
+        self.height_gradients, self.height_intercepts, self.num_height_lines = self.height_lines()
+        self.bound = self.upper_bound()
+
+    def piecewise(self):
+        return self.soft_breakpoints is not None
+
     def soft_module_height(self, w):
-        if self.soft_exists:
+        if self.soft_exists and self.piecewise():
+
+            return np.max(self.height_gradients * np.asarray(w)[:, np.newaxis] + self.height_intercepts, axis=1)
+        elif self.soft_exists:
 
             return w * self.gradient + self.intercept
         else:
@@ -162,151 +233,66 @@ class GenerateProblem:
 
             return 0
 
+    def soft_height_error(self, W):
+        """
+        Relative error of the modeled soft module heights against area / w.
+        """
+        actual = self.actual_soft_height(W)
+
+        return np.abs(self.soft_module_height(W) - actual) / actual
+
+    def module_dimensions(self, Z, W, H):
+        """
+        Placed width and height of every module, hard modules rotated where Z rounds to 1.
+        args:
+            Z: Rotations of the hard modules; W, H: widths and heights of the soft modules
+        """
+        widths, heights = [], []
+        if self.hard_exists:
+            rotated = np.round(Z) >= 1
+            widths.append(np.where(rotated, self.hard_module_height, self.hard_module_width))
+            heights.append(np.where(rotated, self.hard_module_width, self.hard_module_height))
+        if self.soft_exists:
+            widths.append(W)
+            heights.append(H)
+
+        return np.concatenate(widths), np.concatenate(heights)
+
+    def bounding_box(self, X, Y, Z, W, H):
+        """
+        Width and height of the rectangle actually covered by a placement.
+        """
+        widths, heights = self.module_dimensions(Z, W, H)
+
+        return np.max(X + widths), np.max(Y + heights)
+
+    def actual_dimensions(self, widths, heights, rotated):
+        """
+        Placed width and height of every module with the soft modules at their actual size, area over
+        their own width. A rotated soft module (transposed with its superblock) has its own width along y.
+        args:
+            widths, heights: Placed dimensions of every module; rotated: whether every module is placed rotated
+        """
+        widths, heights = np.array(widths, dtype=float), np.array(heights, dtype=float)
+        if self.soft_exists:
+            nh = self.num_hard_modules
+            transposed = np.asarray(rotated)[nh:]
+            widths[nh:] = np.where(transposed, self.actual_soft_height(heights[nh:]), widths[nh:])
+            heights[nh:] = np.where(transposed, heights[nh:], self.actual_soft_height(widths[nh:]))
+
+        return widths, heights
+
     def upper_bound(self):
         W_hard = np.maximum(self.hard_module_width, self.hard_module_height).sum()
         H_hard = W_hard
         W_soft = self.soft_module_width_range[:, 1].sum()
-        H_soft = self.soft_module_height_range[:, 1].sum()
+        if self.soft_exists:
+            w_range = self.soft_module_width_range
+            H_soft = np.maximum(self.soft_module_height(w_range[:, 0]), self.soft_module_height(w_range[:, 1])).sum()
+        else:
+            H_soft = 0
 
         W = W_hard + W_soft
         H = H_hard + H_soft
 
         return np.max([W, H])
-
-    def objective(self):
-        g = open(self.output, 'w')
-        g.write('/* Objective Function */\nmin: Y;\n\n\n')
-        g.close()
-
-    def hard_hard_nonoverlap(self):
-        if self.hard_exists:
-            width, height = self.hard_module_width, self.hard_module_height
-            bound = self.bound
-            g = open(self.output, 'a')
-            g.write('/* Non-overlap constraints hard-hard */\n')
-            for i in range(1, self.num_hard_modules+1):
-                for j in range(1, self.num_hard_modules+1):
-                    if j <= i:
-                        continue
-                    else:
-                        g.write(f'x{i} + {height[i-1]} z{i} + {width[i-1]} - {width[i-1]} z{i} <= x{j} + {np.round(bound)} x{i}{j} + {np.round(bound)} y{i}{j};\n')
-                        g.write(f'x{i} - {height[j-1]} z{j} - {width[j-1]} + {width[j-1]} z{j} >= x{j} - {np.round(bound)*1} + {np.round(bound)} x{i}{j} - {np.round(bound)} y{i}{j};\n')
-                        g.write(f'y{i} + {width[i-1]} z{i} + {height[i-1]} - {height[i-1]} z{i} <= y{j} + {np.round(bound)*1} + {np.round(bound)} x{i}{j} - {np.round(bound)} y{i}{j};\n')
-                        g.write(f'y{i} - {width[j-1]} z{j} - {height[j-1]} + {height[j-1]} z{j} >= y{j} - {np.round(bound)*2} + {np.round(bound)} x{i}{j} + {np.round(bound)} y{i}{j};\n\n\n')
-            g.close()
-
-    def hard_soft_nonoverlap(self):
-        self.total_modules()
-        if self.hard_exists and self.soft_exists:
-            width_hard, height_hard = self.hard_module_width, self.hard_module_height
-            gradient, intercept, bound = self.gradient, self.intercept, self.bound
-            bound = self.upper_bound()
-            g = open(self.output, 'a')
-            g.write('/* Non-overlap constraints hard-soft */\n')
-            for i in range(1, self.num_hard_modules+1):
-                for j in range(self.num_hard_modules+1, self.num_hard_modules+1+self.num_soft_modules):
-                    if j <= i:
-                        continue
-                    else:
-                        g.write(f'x{i} + {height_hard[i-1]} z{i} + {width_hard[i-1]} - {width_hard[i-1]} z{i} <= x{j} + {np.round(bound)} x{i}{j} + {np.round(bound)} y{i}{j};\n')
-                        g.write(f'x{i} - w{j} >= x{j} - {np.round(bound)*1} + {np.round(bound)} x{i}{j} - {np.round(bound)} y{i}{j};\n')
-                        g.write(f'y{i} + {width_hard[i-1]} z{i} + {height_hard[i-1]} - {height_hard[i-1]} z{i} <= y{j} + {np.round(bound)*1} + {np.round(bound)} x{i}{j} - {np.round(bound)} y{i}{j};\n')
-                        g.write(f'y{i} + {-1*gradient[j-self.num_hard_modules-1]} w{j} - {intercept[j-self.num_hard_modules-1]} >= y{j} - {np.round(bound)*2} + {np.round(bound)} x{i}{j} + {np.round(bound)} y{i}{j};\n\n\n')
-            g.close()
-
-    def soft_soft_nonoverlap(self):
-        self.total_modules()
-        if self.soft_exists:
-            gradient, intercept, bound = self.gradient, self.intercept, self.bound
-            g = open(self.output, 'a')
-            g.write('/* Non-overlap constraints soft-soft */\n')
-            for i in range(self.num_hard_modules+1, self.num_hard_modules+1+self.num_soft_modules):
-                for j in range(self.num_hard_modules+1, self.num_hard_modules+1+self.num_soft_modules):
-                    if j <= i:
-                        continue
-                    else:
-                        g.write(f'x{i} + w{i} <= x{j} + {np.round(bound)} x{i}{j} + {np.round(bound)} y{i}{j};\n')
-                        g.write(f'x{i} - w{j} >= x{j} - {np.round(bound)*1} + {np.round(bound)} x{i}{j} - {np.round(bound)} y{i}{j};\n')
-                        g.write(f'y{i} - {-1*gradient[i-self.num_hard_modules-1]} w{i} + {intercept[i-self.num_hard_modules-1]} <= y{j} + {np.round(bound)} + {np.round(bound)} x{i}{j} - {np.round(bound)} y{i}{j};\n')
-                        g.write(f'y{i} + {-1*gradient[j-self.num_hard_modules-1]} w{j} - {intercept[j-self.num_hard_modules-1]} >= y{j} - {np.round(bound)*2} + {np.round(bound)} x{i}{j} + {np.round(bound)} y{i}{j};\n')
-            g.close()
-
-    def variable_type_constraint(self):
-        g = open(self.output, 'a')
-        g.write('/* variable type constraints */\n')
-        soft_module_widths = self.soft_module_dimension_range()[0]
-        for i in range(1, self.num_hard_modules+self.num_soft_modules+1):
-            g.write(f'x{i} >= 0;\n')
-            g.write(f'y{i} >= 0;\n')
-            g.write('x'+str(i)+' >= 0;\n')
-        for i in range(self.num_hard_modules+1, self.num_hard_modules+self.num_soft_modules+1):
-            g.write(f'w{i} >= {soft_module_widths[i-self.num_hard_modules-1, 0]};\n')
-            g.write(f'w{i} <= {soft_module_widths[i-self.num_hard_modules-1, 1]};\n')
-        g.write('\n\n')
-        g.close()
-
-    def chip_width_constraint(self):
-        width_hard, height_hard = self.hard_module_width, self.hard_module_height
-        g = open(self.output, 'a')
-        g.write('/* chip width constraints */\n')
-        for i in range(1, self.num_hard_modules+1):
-            g.write(f'x{i} + {width_hard[i-1]} - {width_hard[i-1]} z{i} + {height_hard[i-1]} z{i} <= Y;\n')
-        for i in range(self.num_hard_modules+1, self.num_hard_modules+1+self.num_soft_modules):
-            g.write(f'x{i} + w{i} <= Y;\n')
-        g.write('\n\n')
-        g.close()
-
-    def chip_height_constraint(self):
-        width_hard, height_hard = self.hard_module_width, self.hard_module_height
-        gradient, intercept = self.gradient, self.intercept
-        g = open(self.output, 'a')
-        g.write('/* chip height constraints */\n')
-        for i in range(1, self.num_hard_modules+1):
-            g.write(f'y{i} + {height_hard[i-1]} - {height_hard[i-1]} z{i} + {width_hard[i-1]} z{i} <= Y;\n')
-        for i in range(self.num_hard_modules+1, self.num_hard_modules+1+self.num_soft_modules):
-            g.write(f'y{i} - {-1*gradient[i-self.num_hard_modules-1]} w{i} + {intercept[i-self.num_hard_modules-1]} <= Y;\n')
-            
-        g.write('\n\n')
-        g.close()
-
-    def binary_constraints(self):
-        g = open(self.output, 'a')
-        g.write('/* variable type constraints */\n')
-        g.write('bin ')
-        for i in range(1, self.num_hard_modules+1+self.num_soft_modules):
-            for j in range(1, self.num_hard_modules+1+self.num_soft_modules):
-                if j <= i:
-                    continue
-                else:
-                    if i == self.num_hard_modules+self.num_soft_modules-1 and j == self.num_hard_modules+self.num_soft_modules:
-                        g.write(f'x{i}{j};\n')
-                    else:
-                        g.write(f'x{i}{j}, ')
-        g.write('bin ')
-
-        for i in range(1, self.num_hard_modules+1+self.num_soft_modules):
-            for j in range(1, self.num_hard_modules+1+self.num_soft_modules):
-                if j <= i:
-                    continue
-                else:
-                    if i == self.num_hard_modules+self.num_soft_modules-1 and j == self.num_hard_modules+self.num_soft_modules:
-                        g.write(f'y{i}{j};\n')
-                    else:
-                        g.write(f'y{i}{j}, ')
-        g.write('bin ')
-        for i in range(1, self.num_hard_modules+1):
-            if i == self.num_hard_modules:
-                g.write('z'+str(i)+';\n')
-            else:
-                g.write('z'+str(i)+', ')
-        g.close()
-
-    def create_ilp_file(self):
-        self.objective()
-        self.hard_hard_nonoverlap()
-        self.hard_soft_nonoverlap()
-        self.soft_soft_nonoverlap()
-        self.variable_type_constraint()
-        self.chip_width_constraint()
-        self.chip_height_constraint()
-        self.binary_constraints()
\ No newline at end of file
@@ -0,0 +1,143 @@
+import numpy as np
+from src.generate import pair_index
+
+
+def placement_relations(x, y, widths, heights, tol=1e-9):
+    """
+        The relative-position binaries (x_ij, y_ij) of every pair i < j of a placement, in pair_index order:
+        (0, 0) i left of j, (1, 0) i right of j, (0, 1) i below j, (1, 1) i above j.
+    """
+    I, J = pair_index(len(x))
+    x, y, w, h = np.asarray(x), np.asarray(y), np.asarray(widths), np.asarray(heights)
+    left = x[I] + w[I] <= x[J] + tol
+    right = ~left & (x[J] + w[J] <= x[I] + tol)
+    below = ~left & ~right & (y[I] + h[I] <= y[J] + tol)
+    above = ~left & ~right & ~below
+    x_ij = (right | above).astype(float)
+    y_ij = (below | above).astype(float)
+
+    return x_ij, y_ij
+
+
+def predicted_utilization(problem, shape='square', aspect_limit=None):
+    """
+        The utilization of the shelf placement of a problem, which the solver starts from or is bounded
+        by: the module area (soft modules at the shelf shapes) over the chip area, where a square chip
+        takes the longer side of the shelf placement. A baseline for the solved utilization, not a lower
+        bound, as the solver minimizes the chip side or half perimeter rather than the area.
+        returns:
+            The utilization, or None when no shelf placement meets the aspect limit
+    """
+    placer = ShelfPlacer(problem, shape=shape, aspect_limit=aspect_limit)
+    if not placer.place():
+        return None
+    if shape == 'rectangle':
+        chip_area = placer.chip_width * placer.chip_height
+    else:
+        chip_area = max(placer.chip_width, placer.chip_height) ** 2
+
+    return float(np.sum(placer.widths * placer.heights) / chip_area)
+
+
+class ShelfPlacer:
+    """
+        Fast constructive placement by shelf packing. Modules are sorted by height and laid left to
+        right on shelves of a fixed strip width; several strip widths are tried and the best chip is kept.
+        Soft modules take their most square shape, with the height of the model's linear approximation,
+        so the placement is feasible for the MILP and can seed it as a warm start.
+    """
+
+    def __init__(self, problem, shape='square', aspect_limit=None, num_strips=40):
+        """
+            args:
+                problem - the specification (GenerateProblem)
+                shape - 'square' or 'rectangle', the objective the chip is judged by
+                aspect_limit - for a rectangle, the largest allowed ratio between its sides (None for any)
+                num_strips - number of strip widths tried
+        """
+        self.problem = problem
+        self.shape = shape
+        self.aspect_limit = aspect_limit
+        self.num_strips = num_strips
+
+    def module_shapes(self):
+        """
+            The upright (width, height) of every module: hard modules stand on their short side,
+            soft modules take their most square width. Also returns the soft module widths.
+        """
+        problem = self.problem
+        widths, heights = [], []
+        if problem.hard_exists:
+            widths.append(np.minimum(problem.hard_module_width, problem.hard_module_height))
+            heights.append(np.maximum(problem.hard_module_width, problem.hard_module_height))
+        soft_w = None
+        if problem.soft_exists:
+            soft_w = np.clip(np.sqrt(problem.area), problem.soft_module_width_range[:, 0], problem.soft_module_width_range[:, 1])
+            widths.append(soft_w)
+            heights.append(problem.soft_module_height(soft_w))
+
+        return np.concatenate(widths), np.concatenate(heights), soft_w
+
+    def pack(self, strip, widths, heights):
+        """
+            Shelf packing of the given module widths and heights into a strip. Returns x, y and the chip size.
+        """
+        n = len(widths)
+        x, y = np.zeros(n), np.zeros(n)
+        cursor, shelf_y, shelf_height = 0.0, 0.0, 0.0
+        for k in np.argsort(-heights, kind='stable'):
+            if cursor > 0 and cursor + widths[k] > strip:
+                shelf_y += shelf_height
+                cursor, shelf_height = 0.0, 0.0
+            x[k], y[k] = cursor, shelf_y
+            cursor += widths[k]
+            shelf_height = max(shelf_height, heights[k])
+
+        return x, y, np.max(x + widths), np.max(y + heights)
+
+    def place(self):
+        """
+            returns:
+                True if a placement was found (then x, y, z, w, widths, heights, chip_width and chip_height are set)
+        """
+        problem = self.problem
+        nh = problem.num_hard_modules
+        upright_w, upright_h, soft_w = self.module_shapes()
+        is_hard = np.arange(problem.num_total_modules) < nh
+        flat_w = np.where(is_hard, upright_h, upright_w)
+        narrowest, widest = np.max(upright_w), np.sum(flat_w)
+        strips = np.concatenate((np.linspace(narrowest, widest, self.num_strips),
+                                 np.sqrt(np.sum(upright_w * upright_h)) * np.linspace(1, 2, self.num_strips)))
+
+        best = None
+        for strip in np.unique(strips[strips >= narrowest]):
+            # Hard modules lie flat when their long side fits the strip
+            flat = is_hard & (upright_h <= strip)
+            widths = np.where(flat, upright_h, upright_w)
+            heights = np.where(flat, upright_w, upright_h)
+            x, y, chip_width, chip_height = self.pack(strip, widths, heights)
+            if self.shape == 'rectangle':
+                if self.aspect_limit is not None and max(chip_width, chip_height) > self.aspect_limit * min(chip_width, chip_height):
+                    continue
+                cost = chip_width + chip_height
+            else:
+                cost = max(chip_width, chip_height)
+            if best is None or cost < best[0]:
+                best = (cost, x, y, widths, heights, chip_width, chip_height)
+        if best is None:
+            return False
+
+        _, self.x, self.y, self.widths, self.heights, self.chip_width, self.chip_height = best
+        if problem.hard_exists:
+            self.z = (self.widths[:nh] != problem.hard_module_width).astype(float)
+        else:
+            self.z = 0
+        self.w = soft_w if problem.soft_exists else 0
+
+        return True
+
+    def relations(self, tol=1e-9):
+        """
+            The relative-position binaries (x_ij, y_ij) of the placement (see placement_relations).
+        """
+        return placement_relations(self.x, self.y, self.widths, self.heights, tol=tol)
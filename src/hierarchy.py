@@ -0,0 +1,128 @@
+import numpy as np
+from src.augment import Augment
+from src.schedule import SuperblockScheduler
+from src.solve import SolveILP
+from src.timing import PhaseTimer
+
+
+class HierarchicalFloorplan:
+    """
+        Multi-level successive augmentation. Modules are grouped into superblocks of at most max_size
+        modules, and the solved superblocks are grouped again, until a level fits max_size. The levels
+        are solved bottom-up and the placement is then unrolled top-down into absolute coordinates of
+        the original modules.
+
+        A superblock placed rotated (z = 1) has its contents transposed (x and y swapped), which swaps
+        the width and height of every module inside it.
+    """
+
+    def __init__(self, problem, max_size=10, strategy='sequential', options=None, scheduler=None):
+        """
+            args:
+                problem - the full design (GenerateProblem)
+                max_size - largest number of modules solved in one problem, at every level
+                strategy - partitioning strategy of Augment.break_problem
+                options - keyword arguments for every SolveILP (e.g. shape)
+                scheduler - a SuperblockScheduler for the superblocks of each level
+        """
+        if max_size < 2:
+            raise ValueError('Superblocks need room for at least two modules.')
+        self.problem = problem
+        self.max_size = max_size
+        self.strategy = strategy
+        self.options = options or {}
+        self.scheduler = scheduler or SuperblockScheduler()
+        self.levels = []
+
+    def local_placement(self, problem, result):
+        """
+            The (x, y, width, height, rotated) arrays of a solved problem, and its chip (bound or (width, height)).
+        """
+        bound, X, Y, Z, W, H = result
+        widths, heights = problem.module_dimensions(Z, W, H)
+        rotated = np.zeros(problem.num_total_modules, dtype=bool)
+        if problem.hard_exists:
+            rotated[:problem.num_hard_modules] = np.round(Z) >= 1
+        if self.options.get('shape') == 'rectangle':
+            chip = problem.bounding_box(X, Y, Z, W, H)
+        else:
+            chip = bound
+
+        return (np.asarray(X), np.asarray(Y), widths, heights, rotated), chip
+
+    def solve(self, run_time=10, backend='cvxpy', dump=False):
+        """
+            args:
+                dump - write the first-level superblocks to spec_files/successive_augmentation (for debugging)
+            returns:
+                The chip (bound, or (width, height) for rectangles) and the absolute
+                (x, y, width, height, rotated) arrays of the original modules
+        """
+        self.levels = []
+        current = self.problem
+        while current.num_total_modules > self.max_size:
+            aug = Augment.from_problem(current)
+            sub_problems = aug.break_problem(sub_block_size=self.max_size, dump=dump and not self.levels, strategy=self.strategy)
+            results = self.scheduler.solve(sub_problems, run_time=run_time, backend=backend, options=self.options)
+            placements, chips = zip(*[self.local_placement(sub_problem, result) for sub_problem, result in zip(sub_problems, results)])
+            self.levels.append({'groups': aug.groups, 'problems': sub_problems, 'results': results,
+                                'placements': list(placements), 'chips': list(chips), 'stats': self.scheduler.stats})
+            current = aug.combine(chips)
+
+        self.top_problem = current
+        solver = SolveILP(current, **self.options)
+        if backend == 'cvxpy':
+            solver.create_constraints()
+        self.top_result = solver.solve(run_time=run_time, backend=backend, threads=self.scheduler.threads_per_solve * self.scheduler.workers)
+        self.top_stats = solver.solve_stats()
+        placement, self.chip = self.local_placement(current, self.top_result)
+
+        for level in reversed(self.levels):
+            placement = self.unroll(placement, level)
+
+        return self.chip, placement
+
+    def superblock_stats(self):
+        """
+            The SolveILP.solve_stats of every superblock, level by level, with its level and index.
+        """
+        return [dict(stats, level=depth, superblock=index) for depth, level in enumerate(self.levels)
+                for index, stats in enumerate(level['stats'])]
+
+    def solve_stats(self):
+        """
+            The worst status and the largest MIP gap over every solve, the best bound of the top-level
+            solve, and the build time, node count and seconds per phase summed over every solve. The
+            status is 'optimal' only when every solve is; otherwise it is that of the non-optimal solve
+            with the largest gap.
+        """
+        solves = [stats for level in self.levels for stats in level['stats']] + [self.top_stats]
+        worst = max(solves, key=lambda stats: (stats['status'] != 'optimal', stats['mip_gap'] if stats['mip_gap'] is not None else 0))
+        gaps = [stats['mip_gap'] for stats in solves if stats['mip_gap'] is not None]
+        nodes = [stats['nodes'] for stats in solves if stats['nodes'] is not None]
+        timer = PhaseTimer()
+        for stats in solves:
+            timer.merge(stats['phases'])
+
+        return {'status': worst['status'], 'mip_gap': max(gaps) if gaps else None, 'best_bound': self.top_stats['best_bound'],
+                'nodes': sum(nodes) if nodes else None, 'build_time': sum(stats['build_time'] for stats in solves),
+                'phases': timer.as_dict(), 'solves': len(solves)}
+
+    def unroll(self, placement, level):
+        """
+            Places the modules of a level's superblocks at the absolute position of their superblock.
+        """
+        X, Y, widths, heights, rotated = placement
+        num_modules = sum(len(group) for group in level['groups'])
+        x, y = np.zeros(num_modules), np.zeros(num_modules)
+        width, height = np.zeros(num_modules), np.zeros(num_modules)
+        flipped = np.zeros(num_modules, dtype=bool)
+        for k, (group, local) in enumerate(zip(level['groups'], level['placements'])):
+            lx, ly, lw, lh, lrot = local
+            if rotated[k]:  # The superblock is transposed
+                lx, ly, lw, lh, lrot = ly, lx, lh, lw, ~lrot
+            x[group], y[group] = X[k] + lx, Y[k] + ly
+            width[group], height[group] = lw, lh
+            flipped[group] = lrot
+
+        return x, y, width, height, flipped
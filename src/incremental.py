@@ -0,0 +1,221 @@
+import json
+import numpy as np
+from src.generate import GenerateProblem, pair_index
+from src.heuristic import placement_relations
+from src.compaction import compact
+from src.solve import SolveILP
+
+
+class ModuleDiff:
+    """
+    The changes to the modules of a design since it was placed: modules removed, resized and added.
+    Modules are numbered from 1 in the order of the specification (hard modules first), as in a Placement.
+    """
+
+    def __init__(self, removed=(), resized=None, added_hard=(), added_soft=()):
+        """
+        args:
+            removed - ids of the modules that are gone
+            resized - {id: (width, height)} of hard modules and {id: (area, min_aspect, max_aspect)} of soft modules
+            added_hard - (width, height) of every new hard module
+            added_soft - (area, min_aspect, max_aspect) of every new soft module
+        """
+        self.removed = sorted(int(i) for i in removed)
+        self.resized = {int(i): tuple(float(value) for value in values) for i, values in (resized or {}).items()}
+        self.added_hard = [tuple(float(value) for value in values) for values in added_hard]
+        self.added_soft = [tuple(float(value) for value in values) for values in added_soft]
+
+    @classmethod
+    def from_json(cls, path):
+        """
+        Reads {"removed": [ids], "resized": {"id": [...]}, "added": {"hard": [[w, h], ...], "soft": [[area, min_aspect, max_aspect], ...]}}.
+        Every key is optional.
+        """
+        with open(path) as f:
+            data = json.load(f)
+        added = data.get('added', {})
+
+        return cls(removed=data.get('removed', ()), resized=data.get('resized'), added_hard=added.get('hard', ()), added_soft=added.get('soft', ()))
+
+    def apply(self, problem):
+        """
+        The problem after the changes. Kept modules keep their order; added hard modules follow the kept hard
+        modules and added soft modules the kept soft ones.
+        returns:
+            The new GenerateProblem, and for each of its modules the index of the same module in problem (-1 if added)
+        """
+        nh, n = problem.num_hard_modules, problem.num_total_modules
+        for i in self.removed + list(self.resized):
+            if not 1 <= i <= n:
+                raise ValueError(f'Module {i} does not exist. Modules are numbered 1 to {n}.')
+        if set(self.removed) & set(self.resized):
+            raise ValueError(f'Modules {sorted(set(self.removed) & set(self.resized))} are both removed and resized.')
+        for i, values in self.resized.items():
+            if len(values) != (2 if i <= nh else 3):
+                raise ValueError(f'Module {i} is {"hard" if i <= nh else "soft"} and takes {"(width, height)" if i <= nh else "(area, min_aspect, max_aspect)"}.')
+
+        kept = np.setdiff1d(np.arange(n), np.array(self.removed, dtype=int) - 1)
+        hard, soft = kept[kept < nh], kept[kept >= nh]
+        hard_modules = [self.resized.get(i + 1, (problem.hard_module_width[i], problem.hard_module_height[i])) for i in hard] + self.added_hard
+        soft_modules = [self.resized.get(i + 1, (problem.area[i - nh], problem.min_aspect[i - nh], problem.max_aspect[i - nh])) for i in soft] + self.added_soft
+        hard_modules, soft_modules = np.array(hard_modules).reshape(-1, 2), np.array(soft_modules).reshape(-1, 3)
+        changed = GenerateProblem.from_modules(problem.num_blocks, hard_modules[:, 0], hard_modules[:, 1], soft_modules[:, 0], soft_modules[:, 1],
+                                               soft_modules[:, 2], underestimation=problem.underestimation, segments=problem.segments)
+        origin = np.concatenate((hard, np.full(len(self.added_hard), -1), soft, np.full(len(self.added_soft), -1))).astype(int)
+
+        return changed, origin
+
+    def resized_modules(self, origin):
+        """
+        Mask of the modules of the changed problem that were resized, given the origin returned by apply.
+        """
+        return np.isin(origin, np.array(list(self.resized), dtype=int) - 1) & (origin >= 0)
+
+
+def lowest_spot(x, y, widths, heights, width, height, shape='square', tol=1e-6):
+    """
+    Where a module of the given size lands with the smallest chip when dropped onto a placement: its left
+    edge at 0 or at the right edge of a module, on top of every module it shares a stretch of x with.
+    """
+    chip_width, chip_height = np.max(x + widths, initial=0), np.max(y + heights, initial=0)
+    candidates = np.concatenate(([0], x + widths))
+    below = (x[np.newaxis, :] < candidates[:, np.newaxis] + width - tol) & (x + widths > candidates[:, np.newaxis] + tol)
+    landing = np.max(np.where(below, y + heights, 0), axis=1, initial=0)
+    new_width, new_height = np.maximum(chip_width, candidates + width), np.maximum(chip_height, landing + height)
+    cost = new_width + new_height if shape == 'rectangle' else np.maximum(new_width, new_height)
+    k = np.lexsort((candidates, landing, cost))[0]
+
+    return candidates[k], landing[k]
+
+
+class PlacementStart:
+    """
+    A legal placement of a changed problem, made from the placement of the previous one. Kept modules
+    start where they were, with their rotation and soft width (clipped to a new width range; a soft module
+    transposed with its superblock is placed upright again); the modules
+    are compacted, which separates the ones that grew, and every added module is dropped into the lowest
+    spot. Soft modules take the larger of their model and exact heights, so the placement stays legal
+    when refinement changes the height model. It has the attributes of a placed ShelfPlacer, so SolveILP
+    warm starts from it and bounds the chip with it.
+    """
+
+    def __init__(self, problem, placement, origin, shape='square'):
+        """
+        args:
+            problem - the changed GenerateProblem
+            placement - the Placement of the previous problem
+            origin - index of every module of problem in the placement (-1 for an added module)
+        """
+        nh, n = problem.num_hard_modules, problem.num_total_modules
+        kept = origin >= 0
+        rotated = np.zeros(n, dtype=bool)
+        rotated[kept] = placement.rotated[origin[kept]]
+        rotated[nh:] = False
+        self.z = rotated[:nh].astype(float) if problem.hard_exists else 0
+        if problem.soft_exists:
+            w_range = problem.soft_module_width_range
+            soft_origin = origin[nh:]
+            self.w = np.clip(np.sqrt(problem.area), w_range[:, 0], w_range[:, 1])   # Added soft modules take their most square width
+            own_width = np.where(placement.rotated, placement.heights, placement.widths)   # Transposed soft modules have their width along y
+            self.w[soft_origin >= 0] = np.clip(own_width[soft_origin[soft_origin >= 0]], w_range[soft_origin >= 0, 0], w_range[soft_origin >= 0, 1])
+        else:
+            self.w = 0
+        self.widths, self.heights = np.zeros(n), np.zeros(n)
+        if problem.hard_exists:
+            self.widths[:nh] = np.where(rotated[:nh], problem.hard_module_height, problem.hard_module_width)
+            self.heights[:nh] = np.where(rotated[:nh], problem.hard_module_width, problem.hard_module_height)
+        if problem.soft_exists:
+            self.widths[nh:] = self.w
+            self.heights[nh:] = np.maximum(problem.soft_module_height(self.w), problem.actual_soft_height(self.w))
+
+        self.x, self.y = np.zeros(n), np.zeros(n)
+        self.x[kept], self.y[kept] = compact(placement.x[origin[kept]], placement.y[origin[kept]], self.widths[kept], self.heights[kept])
+        placed = kept.copy()
+        for i in np.flatnonzero(~kept):
+            self.x[i], self.y[i] = lowest_spot(self.x[placed], self.y[placed], self.widths[placed], self.heights[placed],
+                                               self.widths[i], self.heights[i], shape=shape)
+            placed[i] = True
+        self.x, self.y = compact(self.x, self.y, self.widths, self.heights)
+        self.chip_width, self.chip_height = np.max(self.x + self.widths), np.max(self.y + self.heights)
+
+    def relations(self, tol=1e-9):
+        """
+        The relative-position binaries (x_ij, y_ij) of the placement (see placement_relations).
+        """
+        return placement_relations(self.x, self.y, self.widths, self.heights, tol=tol)
+
+
+def near(x, y, widths, heights, regions, radius):
+    """
+    Mask of the modules that come within radius of any of the (k, 4) regions (x, y, width, height).
+    """
+    if len(regions) == 0:
+        return np.zeros(len(x), dtype=bool)
+    rx, ry, rw, rh = (regions[:, k, np.newaxis] for k in range(4))
+    close = (x - radius < rx + rw) & (x + widths + radius > rx) & (y - radius < ry + rh) & (y + heights + radius > ry)
+
+    return np.any(close, axis=0)
+
+
+class IncrementalFloorplan:
+    """
+    Re-floorplans a design after a few of its modules changed, from its previous placement. The changed
+    modules and every module within the neighborhood of a change (a resized or added module where it
+    starts, or the spot a removed module left) are free. Every pair with a module outside of them keeps
+    the relation (x_ij, y_ij) it has in the PlacementStart, fixed through the bounds of its binaries, so
+    the solver presolves those pairs away and only branches on the pairs among the free modules. Positions,
+    rotations and soft widths stay variables everywhere, so the rest of the floorplan still moves up
+    against the changes.
+
+    Symmetry breaking is off, as it could contradict the fixed relations. The result cache is off too: the
+    result is optimal for the restricted model only, and must not be stored as the optimum of the problem.
+    """
+
+    def __init__(self, previous, placement, diff, neighborhood=0.5, options=None):
+        """
+        args:
+            previous - the GenerateProblem the placement was solved for
+            placement - its Placement
+            diff - a ModuleDiff
+            neighborhood - distance from a change within which modules are freed, in median module sides
+                           (the square root of the median module area; 0 frees only the changed modules)
+            options - the SolveILP options (shape, target_gap, compact, ...)
+        """
+        if len(placement.x) != previous.num_total_modules:
+            raise ValueError(f'The placement has {len(placement.x)} modules, the problem it should belong to {previous.num_total_modules}.')
+        options = dict(options or {}, symmetry=False, cache=None, warm_start=True)
+        self.problem, self.origin = diff.apply(previous)
+        shape, aspect_limit = options.get('shape', 'square'), options.get('aspect_limit')
+        self.start = PlacementStart(self.problem, placement, self.origin, shape=shape)
+        start = self.start
+        if shape == 'rectangle' and aspect_limit is not None and \
+                max(start.chip_width, start.chip_height) > aspect_limit * min(start.chip_width, start.chip_height):
+            raise ValueError('The start placement breaks the aspect limit. Solve the changed problem from scratch instead.')
+
+        changed = (self.origin < 0) | diff.resized_modules(self.origin)
+        removed = np.array(diff.removed, dtype=int) - 1
+        regions = np.concatenate((np.column_stack((start.x, start.y, start.widths, start.heights))[changed],
+                                  np.column_stack((placement.x, placement.y, placement.widths, placement.heights))[removed]))
+        radius = neighborhood * np.sqrt(np.median(start.widths * start.heights))
+        self.free = changed | near(start.x, start.y, start.widths, start.heights, regions, radius)
+
+        I, J = pair_index(self.problem.num_total_modules)
+        fixed = ~(self.free[I] & self.free[J])
+        x_ij, y_ij = start.relations(tol=1e-6)
+        self.fixed_pairs = np.flatnonzero(fixed)
+        self.solver = SolveILP(self.problem, placer=start, fixed_relations=(self.fixed_pairs, x_ij[fixed], y_ij[fixed]), **options)
+
+    def solve(self, run_time, **kwargs):
+        """
+        Solves the restricted model; takes the arguments of SolveILP.solve and returns its result.
+        """
+        return self.solver.solve(run_time, **kwargs)
+
+    def stats(self):
+        """
+        Number of modules and pairs, and how many of them are free.
+        """
+        n = self.problem.num_total_modules
+        pairs = n * (n - 1) // 2
+
+        return {'modules': n, 'free_modules': int(np.sum(self.free)), 'pairs': pairs, 'free_pairs': pairs - len(self.fixed_pairs)}
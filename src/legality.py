@@ -0,0 +1,69 @@
+from bisect import bisect_left, insort
+import numpy as np
+
+
+def overlapping_modules(x, y, widths, heights, tol=1e-6):
+    """
+    Every pair of modules that overlap by more than tol in both directions, by a sweep line over x.
+    Modules enter an active list ordered by their lower edge when the sweep reaches their left edge
+    and leave it at their right edge; an entering module is only compared with the active modules
+    whose lower edge lies within the tallest module height below its upper edge. Each module costs a
+    binary search, a list insertion and removal (linear in the active modules, but a memory move) and a
+    scan over the active modules within that band, so the work stays far below the n(n-1)/2 pair checks
+    when the modules are of similar heights; a few very tall modules widen the band for all others.
+    returns:
+        The (k, 2) array of overlapping pairs i < j
+    """
+    x, y, widths, heights = (np.asarray(a, dtype=float) for a in (x, y, widths, heights))
+    modules = np.flatnonzero((widths > tol) & (heights > tol))   # Thinner modules cannot overlap by more than tol
+    x, y, widths, heights = x[modules], y[modules], widths[modules], heights[modules]
+    n = len(x)
+    if n < 2:
+        return np.zeros((0, 2), dtype=int)
+    tallest = np.max(heights)
+    # Right edges leave before left edges enter at the same coordinate, so that touching modules are not compared
+    coordinates = np.concatenate((x + widths - tol, x))
+    kinds = np.concatenate((np.zeros(n, dtype=int), np.ones(n, dtype=int)))
+    events = np.lexsort((kinds, coordinates))
+    bottom, top = y.tolist(), (y + heights).tolist()
+    active = []   # (bottom, module) of the modules the sweep line crosses
+    pairs = []
+    for event in events.tolist():
+        i = event % n
+        if event < n:
+            active.pop(bisect_left(active, (bottom[i], i)))
+            continue
+        # Active modules with a lower edge in (bottom - tallest, top - tol) can reach into module i
+        k = bisect_left(active, (top[i] - tol, -1))
+        while k > 0:
+            k -= 1
+            low, j = active[k]
+            if low <= bottom[i] - tallest:
+                break
+            if top[j] - tol > bottom[i]:
+                pairs.append((min(i, j), max(i, j)))
+        insort(active, (bottom[i], i))
+
+    return modules[np.array(sorted(pairs), dtype=int).reshape(-1, 2)]
+
+
+def out_of_bounds(x, y, widths, heights, chip_width, chip_height, tol=1e-6):
+    """
+    The modules that reach outside the chip [0, chip_width] x [0, chip_height] by more than tol.
+    """
+    x, y = np.asarray(x), np.asarray(y)
+
+    return np.flatnonzero((x < -tol) | (y < -tol) | (x + widths > chip_width + tol) | (y + heights > chip_height + tol))
+
+
+def check_placement(x, y, widths, heights, chip_width, chip_height, tol=1e-6):
+    """
+    Checks a placement under the given (true) module dimensions.
+    returns:
+        A dict of legal (bool), overlaps (the (k, 2) array of overlapping pairs) and out_of_bounds
+        (the indices of modules outside the chip)
+    """
+    overlaps = overlapping_modules(x, y, widths, heights, tol=tol)
+    outside = out_of_bounds(x, y, widths, heights, chip_width, chip_height, tol=tol)
+
+    return {'legal': len(overlaps) == 0 and len(outside) == 0, 'overlaps': overlaps, 'out_of_bounds': outside}
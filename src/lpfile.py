@@ -0,0 +1,194 @@
+import os
+import re
+from functools import lru_cache
+import numpy as np
+import scipy.sparse as sp
+from src.generate import pair_index, lp_solve_files_dir
+
+
+file_formats = {'lp_solve': '.lp', 'cplex': '_cplex.lp', 'mps': '.mps'}
+
+
+class ModelWriter:
+    """
+    Writes a Formulation to a file in one pass over a single buffered handle, in the LP format
+    of lp_solve, the CPLEX LP format or (free) MPS, so that any local solver can read the model.
+
+    Module numbers are 1-based and every index is separated by an underscore, so the names stay
+    unambiguous for any number of modules: x_1, y_1, w_3, h_3, z_1, the chip X and Y, and the
+    pair binaries x_1_12 and y_1_12 (modules 1 and 12, never 11 and 2). Rows are named after
+    their constraint family, e.g. hard_soft_4.
+    """
+
+    def __init__(self, formulation):
+        """
+        args:
+            formulation: The model to write (Formulation)
+        """
+        self.formulation = formulation
+        self.names = self.column_names()
+        self.families = formulation.constraint_families()
+        self.lb, self.ub = formulation.bounds()
+        self.integrality = formulation.integrality()
+        self.c = formulation.objective()
+
+    def column_names(self):
+        formulation = self.formulation
+        n, nh = formulation.num_total_modules, formulation.num_hard_modules
+        modules = np.arange(1, n + 1)
+        I, J = pair_index(n)
+        names = {'x': [f'x_{i}' for i in modules], 'y': [f'y_{i}' for i in modules],
+                 'w': [f'w_{i}' for i in modules[nh:]], 'h': [f'h_{i}' for i in modules[nh:]],
+                 'X': ['X'], 'Y': ['Y'],
+                 'x_ij': [f'x_{i + 1}_{j + 1}' for i, j in zip(I, J)], 'y_ij': [f'y_{i + 1}_{j + 1}' for i, j in zip(I, J)],
+                 'z': [f'z_{i}' for i in modules[:nh]]}
+        columns = []
+        for name, block in formulation.values(np.zeros(formulation.num_variables)).items():
+            columns += names[name][:len(block)]
+
+        return columns
+
+    def rows(self):
+        """
+        Yields (row name, family name, column indices, coefficients, right hand side) of every row A @ v <= b.
+        """
+        for family, A, b in self.families:
+            prefix = re.sub('[^A-Za-z0-9]+', '_', family)
+            indptr, indices, data, b = A.indptr.tolist(), A.indices.tolist(), A.data.tolist(), b.tolist()
+            for r in range(A.shape[0]):
+                start, end = indptr[r], indptr[r + 1]
+                yield f'{prefix}_{r + 1}', family, indices[start:end], data[start:end], b[r]
+
+    def expression(self, cols, coefs):
+        names = self.names
+        terms = [f'{term(coef)}{names[col]}' for col, coef in zip(cols, coefs)]
+
+        return ' '.join(terms) if terms else '0'
+
+    def write(self, path=None, file_format='lp_solve'):
+        """
+        args:
+            path: The output file (lp_solve_files/<n>_blocks_constraints with the extension of the format when None)
+            file_format: 'lp_solve', 'cplex' or 'mps'
+        returns:
+            The path that was written
+        """
+        if file_format not in file_formats:
+            raise ValueError(f'Unknown file format {file_format}. Expected one of {", ".join(file_formats)}.')
+        if path is None:
+            path = os.path.join(lp_solve_files_dir, f'{self.formulation.num_total_modules}_blocks_constraints{file_formats[file_format]}')
+        with open(path, 'w', buffering=1 << 20) as f:
+            getattr(self, f'write_{file_format}')(f)
+
+        return path
+
+    def write_lp_solve(self, f):
+        objective = np.flatnonzero(self.c)
+        f.write(f'/* Objective function */\nmin: {self.expression(objective, self.c[objective])};\n')
+        family = None
+        for name, row_family, cols, coefs, rhs in self.rows():
+            if row_family != family:
+                family = row_family
+                f.write(f'\n/* {family} */\n')
+            f.write(f'{name}: {self.expression(cols, coefs)} <= {number(rhs)};\n')
+
+        # lp_solve starts every column at [0, inf) and reads -1e30 as -inf
+        f.write('\n/* Bounds */\n')
+        for name, lb, ub in zip(self.names, self.lb, self.ub):
+            if lb != 0:
+                f.write(f'{name} >= {number(lb) if np.isfinite(lb) else "-1e30"};\n')
+            if np.isfinite(ub):
+                f.write(f'{name} <= {number(ub)};\n')
+        integers = [self.names[k] for k in np.flatnonzero(self.integrality)]
+        if integers:
+            f.write('\nint ' + ',\n    '.join(', '.join(integers[k:k + 10]) for k in range(0, len(integers), 10)) + ';\n')
+
+    def write_cplex(self, f):
+        objective = np.flatnonzero(self.c)
+        f.write(f'\\ Floorplan of {self.formulation.num_total_modules} modules\nMinimize\n obj: {self.expression(objective, self.c[objective])}\nSubject To\n')
+        family = None
+        for name, row_family, cols, coefs, rhs in self.rows():
+            if row_family != family:
+                family = row_family
+                f.write(f'\\ {family}\n')
+            f.write(f' {name}: {self.expression(cols, coefs)} <= {number(rhs)}\n')
+
+        # Columns start at [0, +inf)
+        f.write('Bounds\n')
+        for name, lb, ub in zip(self.names, self.lb, self.ub):
+            if lb == -np.inf and ub == np.inf:
+                f.write(f' {name} free\n')
+            elif lb != 0 or ub != np.inf:
+                f.write(f' {number(lb) if np.isfinite(lb) else "-inf"} <= {name} <= {number(ub) if np.isfinite(ub) else "+inf"}\n')
+        integers = np.flatnonzero(self.integrality)
+        if len(integers):
+            f.write('General\n')
+            for k in integers:
+                f.write(f' {self.names[k]}\n')
+        f.write('End\n')
+
+    def write_mps(self, f):
+        rows = list(self.rows())
+        f.write(f'NAME floorplan_{self.formulation.num_total_modules}\nROWS\n N obj\n')
+        for name, _, _, _, _ in rows:
+            f.write(f' L {name}\n')
+
+        # COLUMNS is column-major, with the integer columns between markers
+        A = sp.vstack([A for _, A, _ in self.families], format='csc')
+        row_names = [name for name, _, _, _, _ in rows]
+        f.write('COLUMNS\n')
+        integer = False
+        indptr, indices, data, c = A.indptr.tolist(), A.indices.tolist(), A.data.tolist(), self.c.tolist()
+        for k, name in enumerate(self.names):
+            if bool(self.integrality[k]) != integer:
+                integer = bool(self.integrality[k])
+                f.write(f" MARKER 'MARKER' '{'INTORG' if integer else 'INTEND'}'\n")
+            start, end = indptr[k], indptr[k + 1]
+            if c[k] != 0 or start == end:
+                f.write(f' {name} obj {number(c[k])}\n')
+            for r, coef in zip(indices[start:end], data[start:end]):
+                f.write(f' {name} {row_names[r]} {number(coef)}\n')
+        if integer:
+            f.write(" MARKER 'MARKER' 'INTEND'\n")
+
+        f.write('RHS\n')
+        for name, _, _, _, rhs in rows:
+            if rhs != 0:
+                f.write(f' RHS {name} {number(rhs)}\n')
+
+        # Columns start at [0, +inf), integer ones are bounded explicitly
+        f.write('BOUNDS\n')
+        for name, lb, ub, integer in zip(self.names, self.lb, self.ub, self.integrality):
+            if lb == -np.inf and ub == np.inf:
+                f.write(f' FR BND {name}\n')
+                continue
+            if lb == ub:
+                f.write(f' FX BND {name} {number(lb)}\n')
+                continue
+            if lb == -np.inf:
+                f.write(f' MI BND {name}\n')
+            elif lb != 0 or integer:
+                f.write(f' LO BND {name} {number(lb)}\n')
+            if np.isfinite(ub):
+                f.write(f' UP BND {name} {number(ub)}\n')
+        f.write('ENDATA\n')
+
+
+@lru_cache(maxsize=None)
+def term(coef):
+    """
+    The signed coefficient in front of a column name: '+', '-2.5 ' etc.
+    """
+    sign = '+' if coef >= 0 else '-'
+
+    return sign if abs(coef) == 1 else f'{sign}{number(abs(coef))} '
+
+
+@lru_cache(maxsize=None)
+def number(value):
+    """
+    The shortest text that reads back as the same float.
+    """
+    value = float(value)
+
+    return str(int(value)) if value.is_integer() and abs(value) < 1e15 else repr(value)
@@ -0,0 +1,161 @@
+import time
+import numpy as np
+from scipy.optimize import milp, Bounds, LinearConstraint
+import scipy.sparse as sp
+
+try:
+    import highspy
+except ImportError: # Only needed to warm start HiGHS or stream its incumbents, which scipy.optimize.milp cannot do
+    highspy = None
+
+
+milp_status = {0: 'optimal', 1: 'time_limit', 2: 'infeasible', 3: 'unbounded', 4: 'other'}   # OptimizeResult.status of milp
+
+
+class SparseMILP:
+    """
+    Solves a Formulation directly with scipy.optimize.milp (HiGHS), skipping cvxpy's
+    reduction chain. No license is needed. When a warm start, an incumbent callback or a
+    stall time is given and highspy is installed, the same model is passed to HiGHS through
+    highspy instead, with the warm start as its first incumbent.
+    """
+
+    def __init__(self, formulation):
+        """
+        args:
+            formulation: The sparse model to be solved (Formulation)
+        """
+        self.formulation = formulation
+        self.status, self.mip_gap = None, None   # Of the last solve
+        self.dual_bound, self.nodes = None, None
+
+    def assemble(self):
+        """
+        Returns c, A (CSR), b, lb, ub and the integrality vector with A @ v <= b.
+        """
+        families = self.formulation.constraint_families()
+        A = sp.vstack([A for _, A, _ in families], format='csr')
+        b = np.concatenate([b for _, _, b in families])
+        lb, ub = self.formulation.bounds()
+
+        return self.formulation.objective(), A, b, lb, ub, self.formulation.integrality()
+
+    def solve(self, run_time, verbose=False, x0=None, on_incumbent=None, target_gap=None, stall_time=None):
+        """
+        args:
+            run_time: Time limit of the solver in seconds
+            verbose: Whether or not HiGHS prints its log (bool)
+            x0: A feasible solution vector to start from (None for a cold start)
+            on_incumbent: Called with an incumbent dict (objective, bound, gap, elapsed, solution) every
+                          time HiGHS finds a better solution (None for no callback)
+            target_gap: Stop as soon as the relative MIP gap is at most this (None for the HiGHS default)
+            stall_time: Stop when the incumbent has not improved for this many seconds (None for never)
+        returns:
+            The objective value and the solution vector in the column layout of the formulation
+        """
+        c, A, b, lb, ub, integrality = self.assemble()
+        anytime = on_incumbent is not None or stall_time is not None
+        if (x0 is not None or anytime) and highspy is not None:
+            return self.solve_highspy(c, A, b, lb, ub, integrality, run_time, verbose, x0, on_incumbent, target_gap, stall_time)
+
+        options = {'time_limit': run_time, 'disp': verbose}
+        if target_gap is not None:
+            options['mip_rel_gap'] = target_gap
+        start = time.perf_counter()
+        result = milp(c, constraints=LinearConstraint(A, -np.inf, b), integrality=integrality,
+                      bounds=Bounds(lb, ub), options=options)
+        self.status, self.mip_gap = milp_status.get(result.status, 'other'), getattr(result, 'mip_gap', None)
+        self.dual_bound, self.nodes = getattr(result, 'mip_dual_bound', None), getattr(result, 'mip_node_count', None)
+        if result.x is None:
+            raise RuntimeError(f'HiGHS found no feasible floorplan: {result.message}')
+        self.result = result
+        if on_incumbent is not None:   # Without highspy only the final solution is seen
+            on_incumbent({'objective': result.fun, 'bound': self.dual_bound, 'gap': self.mip_gap,
+                          'elapsed': time.perf_counter() - start, 'solution': result.x})
+
+        return result.fun, result.x
+
+    def polish(self, v, run_time=10):
+        """
+        Solves the LP that is left when every integer column is fixed to its value in v, e.g. to turn
+        the solution of an earlier model into a feasible start for a refined one.
+        returns:
+            The objective value and the solution vector, or None if the fixed relations admit no floorplan
+        """
+        c, A, b, lb, ub, integrality = self.assemble()
+        fixed = integrality == 1
+        lb[fixed] = ub[fixed] = np.round(v[fixed])
+        result = milp(c, constraints=LinearConstraint(A, -np.inf, b), integrality=np.zeros_like(integrality),
+                      bounds=Bounds(lb, ub), options={'time_limit': run_time})
+        if result.x is None:
+            return None
+
+        return result.fun, result.x
+
+    def solve_highspy(self, c, A, b, lb, ub, integrality, run_time, verbose, x0, on_incumbent=None, target_gap=None, stall_time=None):
+        lp = highspy.HighsLp()
+        lp.num_col_, lp.num_row_ = A.shape[1], A.shape[0]
+        lp.col_cost_ = c
+        lp.col_lower_, lp.col_upper_ = np.where(np.isinf(lb), -highspy.kHighsInf, lb), np.where(np.isinf(ub), highspy.kHighsInf, ub)
+        lp.row_lower_, lp.row_upper_ = np.full(A.shape[0], -highspy.kHighsInf), b
+        lp.a_matrix_.format_ = highspy.MatrixFormat.kRowwise
+        lp.a_matrix_.start_, lp.a_matrix_.index_, lp.a_matrix_.value_ = A.indptr, A.indices, A.data
+        lp.integrality_ = [highspy.HighsVarType.kInteger if k else highspy.HighsVarType.kContinuous for k in integrality]
+
+        h = highspy.Highs()
+        h.setOptionValue('output_flag', verbose)
+        h.setOptionValue('time_limit', float(run_time))
+        if target_gap is not None:
+            h.setOptionValue('mip_rel_gap', float(target_gap))
+        h.passModel(lp)
+        if x0 is not None:
+            start = highspy.HighsSolution()
+            start.col_value = list(x0)
+            h.setSolution(start)
+        if on_incumbent is not None or stall_time is not None:
+            self.subscribe(h, on_incumbent, stall_time)
+        h.run()
+        info = h.getInfo()
+        self.status, self.mip_gap = highs_status(h), info.mip_gap
+        self.dual_bound, self.nodes = info.mip_dual_bound, info.mip_node_count
+        solution = h.getSolution()
+        if not solution.value_valid:
+            raise RuntimeError(f'HiGHS found no feasible floorplan: {h.modelStatusToString(h.getModelStatus())}')
+        self.result = h
+
+        return info.objective_function_value, np.array(solution.col_value)
+
+    @staticmethod
+    def subscribe(h, on_incumbent, stall_time):
+        """
+        Reports every improving solution of a highspy.Highs run to on_incumbent, and interrupts the run
+        once the incumbent has not improved for stall_time seconds.
+        """
+        last_improvement = [None]   # HiGHS running time of the latest incumbent
+
+        def improving(event):
+            out = event.data_out
+            last_improvement[0] = out.running_time
+            if on_incumbent is not None:
+                on_incumbent({'objective': out.objective_function_value, 'bound': out.mip_dual_bound, 'gap': out.mip_gap,
+                              'elapsed': out.running_time, 'solution': np.array(out.mip_solution)})
+
+        def interrupt(event):
+            if last_improvement[0] is not None and event.data_out.running_time - last_improvement[0] >= stall_time:
+                event.interrupt()
+
+        h.cbMipImprovingSolution.subscribe(improving)
+        if stall_time is not None:
+            h.cbMipInterrupt.subscribe(interrupt)
+
+
+def highs_status(h):
+    """
+    The model status of a highspy.Highs run in the words of milp_status.
+    """
+    status = h.getModelStatus()
+    names = {highspy.HighsModelStatus.kOptimal: 'optimal', highspy.HighsModelStatus.kTimeLimit: 'time_limit',
+             highspy.HighsModelStatus.kInfeasible: 'infeasible', highspy.HighsModelStatus.kUnbounded: 'unbounded',
+             highspy.HighsModelStatus.kInterrupt: 'stalled'}   # Only interrupted by the stall_time callback
+
+    return names.get(status, h.modelStatusToString(status).lower())
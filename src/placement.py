@@ -0,0 +1,118 @@
+import csv
+import json
+import os
+import numpy as np
+
+
+columns = ['id', 'type', 'x', 'y', 'width', 'height', 'rotated']
+
+
+class Placement:
+    """
+    The absolute placement of every module of a design, with the metadata of the solve that produced it.
+    Modules are numbered from 1 in the order of the specification (hard modules first), as in the plots.
+    Saved as a columnar *.npz, with a *.json or *.csv view of the same table for other tools.
+    """
+
+    def __init__(self, x, y, widths, heights, rotated, types, chip_width, chip_height, metadata=None):
+        """
+        args:
+            x, y - lower-left corner of every module
+            widths, heights - placed dimensions of every module (rotation applied)
+            rotated - whether every module is placed rotated. A soft module is rotated only inside a superblock
+                      that successive augmentation rotated; its own width is then its placed height
+            types - 'hard' or 'soft' per module
+            chip_width, chip_height - the chip
+            metadata - JSON values about the run (solver status, MIP gap, options, ...)
+        """
+        self.x, self.y = np.asarray(x, dtype=float), np.asarray(y, dtype=float)
+        self.widths, self.heights = np.asarray(widths, dtype=float), np.asarray(heights, dtype=float)
+        self.rotated = np.asarray(rotated, dtype=bool)
+        self.types = np.asarray(types, dtype=str)
+        self.ids = np.arange(1, len(self.x) + 1)
+        self.chip_width, self.chip_height = float(chip_width), float(chip_height)
+        self.metadata = metadata or {}
+
+    @classmethod
+    def from_solution(cls, problem, X, Y, widths, heights, rotated, chip, metadata=None):
+        """
+        args:
+            problem - the GenerateProblem of the modules
+            chip - the chip bound, or (width, height) for a rectangular chip
+        """
+        width, height = chip if np.ndim(chip) else (chip, chip)
+        types = ['hard'] * problem.num_hard_modules + ['soft'] * problem.num_soft_modules
+
+        return cls(X, Y, widths, heights, rotated, types, width, height, metadata=metadata)
+
+    def utilization(self):
+        return float(np.sum(self.widths * self.heights) / (self.chip_width * self.chip_height))
+
+    def records(self):
+        """
+        One dict per module, with the keys of columns.
+        """
+        return [{'id': int(i), 'type': str(kind), 'x': float(x), 'y': float(y), 'width': float(w), 'height': float(h), 'rotated': bool(r)}
+                for i, kind, x, y, w, h, r in zip(self.ids, self.types, self.x, self.y, self.widths, self.heights, self.rotated)]
+
+    def save(self, path, view='json'):
+        """
+        Writes <path>.npz and the view <path>.json or <path>.csv (None for none).
+        returns:
+            The paths that were written
+        """
+        path = os.path.splitext(path)[0] if path.endswith('.npz') else path
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        np.savez(f'{path}.npz', id=self.ids, type=self.types, x=self.x, y=self.y, width=self.widths, height=self.heights,
+                 rotated=self.rotated, chip=np.array([self.chip_width, self.chip_height]), metadata=json.dumps(self.metadata))
+        paths = [f'{path}.npz']
+        if view == 'json':
+            with open(f'{path}.json', 'w') as f:
+                json.dump({'chip_width': self.chip_width, 'chip_height': self.chip_height, 'metadata': self.metadata,
+                           'modules': self.records()}, f, indent=1)
+            paths.append(f'{path}.json')
+        elif view == 'csv':
+            with open(f'{path}.csv', 'w', newline='') as f:
+                f.write(f'# chip_width={self.chip_width} chip_height={self.chip_height} metadata={json.dumps(self.metadata)}\n')
+                writer = csv.DictWriter(f, fieldnames=columns)
+                writer.writeheader()
+                writer.writerows(self.records())
+            paths.append(f'{path}.csv')
+        elif view is not None:
+            raise ValueError(f'Unknown placement view {view}. Expected \'json\', \'csv\' or None.')
+
+        return paths
+
+    @classmethod
+    def load(cls, path):
+        """
+        Reads a placement written by save, from its *.npz, *.json or *.csv file.
+        """
+        extension = os.path.splitext(path)[1]
+        if extension == '.npz':
+            with np.load(path) as data:
+                chip_width, chip_height = data['chip']
+                return cls(data['x'], data['y'], data['width'], data['height'], data['rotated'], data['type'],
+                           chip_width, chip_height, metadata=json.loads(str(data['metadata'])))
+        if extension == '.json':
+            with open(path) as f:
+                data = json.load(f)
+            chip_width, chip_height, metadata, modules = data['chip_width'], data['chip_height'], data['metadata'], data['modules']
+        elif extension == '.csv':
+            with open(path, newline='') as f:
+                header = f.readline()
+                if not header.startswith('# chip_width='):
+                    raise ValueError(f'{path}: not a placement written by Placement.save.')
+                sizes, metadata = header[2:].split(' metadata=', 1)
+                chip_width, chip_height = (float(field.split('=')[1]) for field in sizes.split())
+                metadata = json.loads(metadata)
+                modules = list(csv.DictReader(f))
+            for module in modules:
+                module['rotated'] = module['rotated'] == 'True'
+        else:
+            raise ValueError(f'{path}: expected a *.npz, *.json or *.csv placement.')
+        modules.sort(key=lambda module: int(module['id']))
+        table = {name: [module[name] for module in modules] for name in columns}
+
+        return cls(np.array(table['x'], dtype=float), np.array(table['y'], dtype=float), np.array(table['width'], dtype=float),
+                   np.array(table['height'], dtype=float), table['rotated'], table['type'], chip_width, chip_height, metadata=metadata)
@@ -0,0 +1,93 @@
+import os
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+import numpy as np
+from matplotlib.figure import Figure
+from matplotlib.collections import PolyCollection
+
+
+module_colors = {'hard': 'green', 'rotated': 'red', 'soft': 'yellow'}
+max_labels = 200   # Floorplans with more modules are drawn without module numbers
+
+
+def rectangles(X, Y, widths, heights):
+    """
+    The (N, 4, 2) corners of N axis-aligned rectangles, as PolyCollection takes them.
+    """
+    X, Y, widths, heights = (np.asarray(a, dtype=float) for a in (X, Y, widths, heights))
+
+    return np.stack([np.column_stack((X, Y)), np.column_stack((X + widths, Y)),
+                     np.column_stack((X + widths, Y + heights)), np.column_stack((X, Y + heights))], axis=1)
+
+
+def draw_floorplan(ax, X, Y, widths, heights, kinds, chip_width, chip_height, title=None, labels=None):
+    """
+    Draws every module in a single PolyCollection.
+    args:
+        ax - the matplotlib Axes
+        widths, heights - placed module dimensions (rotation already applied)
+        kinds - 'hard', 'rotated' or 'soft' per module (see module_colors)
+        labels - number the modules from 1 (None to do so up to max_labels modules)
+    """
+    colors = [module_colors[kind] for kind in kinds]
+    ax.add_collection(PolyCollection(rectangles(X, Y, widths, heights), facecolors=colors, edgecolors='black', linewidths=0.5))
+    if labels is None:
+        labels = len(kinds) <= max_labels
+    if labels:
+        for i, (x, y) in enumerate(zip(np.asarray(X) + np.asarray(widths) / 2, np.asarray(Y) + np.asarray(heights) / 2), start=1):
+            ax.text(x, y, str(i), fontsize=8, ha='center', va='center')
+    ax.set_xlim(0, chip_width)
+    ax.set_ylim(0, chip_height)
+    if title is not None:
+        ax.set_title(title, fontsize=9)
+
+
+def write_floorplan(paths, X, Y, widths, heights, kinds, chip_width, chip_height, title=None, labels=None):
+    """
+    Renders a floorplan on its own Figure (no pyplot, so it is safe off the main thread and on a headless
+    machine) and writes it to every path, in the format of its extension (png, svg, pdf, ...).
+    """
+    fig = Figure()
+    draw_floorplan(fig.add_subplot(), X, Y, widths, heights, kinds, chip_width, chip_height, title=title, labels=labels)
+    for path in paths:
+        fig.savefig(path)
+
+    return paths
+
+
+class FloorplanRenderer:
+    """
+    Writes floorplan images in the background, so that the solves are not held up by plotting.
+    """
+
+    def __init__(self, output_dir, formats=('png',), processes=False):
+        """
+        args:
+            output_dir - directory of the images, created if missing
+            formats - file extensions written for every floorplan
+            processes - render in a separate process instead of a thread, which keeps the GIL free
+                        for the solver at the cost of pickling the placement
+        """
+        os.makedirs(output_dir, exist_ok=True)
+        self.output_dir = output_dir
+        self.formats = formats
+        self.executor = ProcessPoolExecutor(max_workers=1) if processes else ThreadPoolExecutor(max_workers=1)
+        self.futures = []
+
+    def submit(self, name, X, Y, widths, heights, kinds, chip_width, chip_height, title=None, labels=None):
+        """
+        Queues the images <output_dir>/<name>.<format> and returns the Future of their paths.
+        """
+        paths = [os.path.join(self.output_dir, f'{name}.{extension}') for extension in self.formats]
+        future = self.executor.submit(write_floorplan, paths, np.asarray(X), np.asarray(Y), np.asarray(widths), np.asarray(heights),
+                                      list(kinds), chip_width, chip_height, title=title, labels=labels)
+        self.futures.append(future)
+
+        return future
+
+    def close(self):
+        """
+        Waits for every queued image and returns their paths. Raises the first rendering error.
+        """
+        self.executor.shutdown(wait=True)
+
+        return [path for future in self.futures for path in future.result()]
@@ -0,0 +1,142 @@
+import hashlib
+import json
+import os
+import numpy as np
+
+
+cwd = os.getcwd()
+result_cache_dir = os.path.join(cwd, 'results', 'cache') # Solved problems, one *.npz per fingerprint
+
+decimals = 9   # Module dimensions are compared after rounding, as superblock sizes come out of a solver
+default_gap = 1e-4   # Relative gap of the HiGHS and MOSEK defaults, at which a cached result counts as optimal
+
+
+def canonical_order(problem):
+    """
+    An order of the modules of a problem that only depends on the module multiset: hard modules by
+    their (short, long) side, then soft modules by (area, min_aspect, max_aspect). Identical modules
+    keep their relative order.
+    returns:
+        The module indices in canonical order and the rounded (short, long) and (area, min, max) rows
+    """
+    hard = np.zeros((0, 2))
+    soft = np.zeros((0, 3))
+    if problem.hard_exists:
+        sides = np.column_stack((problem.hard_module_width, problem.hard_module_height))
+        hard = np.round(np.sort(sides, axis=1), decimals)
+    if problem.soft_exists:
+        soft = np.round(np.column_stack((problem.area, problem.min_aspect, problem.max_aspect)), decimals)
+    hard_order = np.lexsort(hard.T[::-1]) if len(hard) else np.zeros(0, dtype=int)
+    soft_order = np.lexsort(soft.T[::-1]) if len(soft) else np.zeros(0, dtype=int)
+
+    return np.concatenate((hard_order, problem.num_hard_modules + soft_order)).astype(int), hard[hard_order], soft[soft_order]
+
+
+class ResultCache:
+    """
+    A persistent cache of solved floorplans, shared by every run that uses the same directory. An entry
+    is keyed by a fingerprint of the module multiset (independent of the module order), the
+    underestimation flag and the options that change the model, and holds the best placement found for
+    it with the solver status and MIP gap. Entries are stored in canonical module order and mapped back
+    to the order of the problem that asks. Beyond max_entries, the least recently used entries are removed.
+    """
+
+    def __init__(self, directory=None, max_entries=1024):
+        """
+        args:
+            directory - where the *.npz entries are kept (results/cache when None)
+            max_entries - largest number of entries kept
+        """
+        self.directory = result_cache_dir if directory is None else directory
+        self.max_entries = max_entries
+
+    def key(self, problem, options):
+        """
+        The fingerprint of a problem and the model options (a dict of JSON values, e.g. shape).
+        """
+        _, hard, soft = canonical_order(problem)
+        digest = hashlib.sha1()
+        digest.update(hard.tobytes())
+        digest.update(b'|')
+        digest.update(soft.tobytes())
+        digest.update(json.dumps(dict(options, underestimation=bool(problem.underestimation)), sort_keys=True).encode())
+
+        return digest.hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.directory, f'{key}.npz')
+
+    def get(self, problem, options):
+        """
+        The cached result of a problem, in the module order of the problem, or None.
+        returns:
+            A dict of objective, chip_width, chip_height, status, mip_gap and the x, y, widths and heights
+            of every module as placed
+        """
+        path = self.path(self.key(problem, options))
+        try:
+            with np.load(path) as data:
+                entry = {key: data[key] for key in data.files}
+            os.utime(path)   # Marks the entry as recently used
+        except (OSError, ValueError):   # Missing, or removed or replaced by another run meanwhile
+            return None
+        order, _, _ = canonical_order(problem)
+        result = {'objective': float(entry['objective']), 'chip_width': float(entry['chip_width']), 'chip_height': float(entry['chip_height']),
+                  'status': str(entry['status']), 'mip_gap': None if np.isnan(entry['mip_gap']) else float(entry['mip_gap'])}
+        for name in ('x', 'y', 'widths', 'heights'):
+            result[name] = np.empty(problem.num_total_modules)
+            result[name][order] = entry[name]
+
+        return result
+
+    def put(self, problem, options, objective, x, y, widths, heights, chip_width, chip_height, status, mip_gap):
+        """
+        Stores a result unless the cache already holds one at least as good: a proven optimum, or an
+        objective that is not larger.
+        returns:
+            Whether or not the result was stored
+        """
+        cached = self.get(problem, options)
+        if cached is not None and (is_optimal(cached) or cached['objective'] <= objective):
+            return False
+        key = self.key(problem, options)
+        order, _, _ = canonical_order(problem)
+        os.makedirs(self.directory, exist_ok=True)
+        temporary = f'{self.path(key)}.{os.getpid()}.tmp'   # Parallel runs may write the same entry
+        with open(temporary, 'wb') as f:
+            np.savez(f, objective=objective, chip_width=chip_width, chip_height=chip_height, status=str(status),
+                     mip_gap=np.nan if mip_gap is None else mip_gap, x=np.asarray(x)[order], y=np.asarray(y)[order],
+                     widths=np.asarray(widths)[order], heights=np.asarray(heights)[order])
+        os.replace(temporary, self.path(key))
+        self.evict()
+
+        return True
+
+    def evict(self):
+        """
+        Removes the least recently used entries beyond max_entries.
+        """
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.endswith('.npz'):
+                try:
+                    entries.append((os.path.getmtime(os.path.join(self.directory, name)), name))
+                except OSError:
+                    pass
+        entries.sort()
+        for _, name in entries[:max(0, len(entries) - self.max_entries)]:
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except OSError:
+                pass
+
+
+def is_optimal(entry, target_gap=None):
+    """
+    Whether a cached result is proven within target_gap (the solver default when None) of the optimum.
+    """
+    gap = default_gap if target_gap is None else max(target_gap, default_gap)
+    if entry['mip_gap'] is not None:
+        return entry['status'] in ('optimal', 'time_limit', 'stalled') and entry['mip_gap'] <= gap
+
+    return entry['status'] == 'optimal'
@@ -0,0 +1,107 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from src.solve import SolveILP
+
+
+def solve_superblock(task):
+    """
+        Solves one superblock. Runs inside a worker process, so it only takes and returns picklable data.
+        args:
+            task - (problem, options, run_time, backend, threads) where problem is a GenerateProblem
+                   and options are keyword arguments of SolveILP
+        returns:
+            The (bound, X, Y, Z, W, H) tuple and the SolveILP.solve_stats of the superblock, with its time limit
+    """
+    problem, options, run_time, backend, threads = task
+    problem = SolveILP(problem, **options)
+    if backend == 'cvxpy':
+        problem.create_constraints()
+    result = problem.solve(run_time=run_time, backend=backend, threads=threads)
+
+    return result, dict(problem.solve_stats(), time_limit=run_time)
+
+
+class SuperblockScheduler:
+    """
+        Solves independent superblocks on a process pool and splits the solver thread budget between them.
+    """
+
+    def __init__(self, workers=1, threads=None, share_time=False):
+        """
+            args:
+                workers - number of superblocks solved at the same time
+                threads - total solver threads shared by the workers (defaults to the number of CPUs)
+                share_time - pool the time limits of a level's superblocks, so that the time an easy
+                             superblock leaves unused (solved to optimality, target_gap or stall_time)
+                             goes to the superblocks solved after it
+        """
+        if workers < 1:
+            raise ValueError('At least one worker is needed.')
+        self.workers = workers
+        total_threads = threads if threads is not None else os.cpu_count() or 1
+        self.threads_per_solve = max(1, total_threads // workers)
+        self.share_time = share_time
+        self.stats = []   # SolveILP.solve_stats of every superblock of the last solve
+
+    def solve(self, problems, run_time=10, backend='cvxpy', options=None):
+        """
+            args:
+                problems - the superblocks (GenerateProblem)
+                options - keyword arguments for every SolveILP (e.g. shape)
+            returns:
+                The (bound, X, Y, Z, W, H) tuple of every superblock, in the order of problems
+        """
+        options = options or {}
+        tasks = [(problem, options, run_time, backend, self.threads_per_solve) for problem in problems]
+        if self.share_time:
+            solved = self.solve_shared(tasks, run_time)
+        elif self.workers == 1 or len(tasks) <= 1:
+            solved = [solve_superblock(task) for task in tasks]
+        else:
+            with ProcessPoolExecutor(max_workers=min(self.workers, len(tasks))) as executor:
+                solved = list(executor.map(solve_superblock, tasks))
+        self.stats = [stats for _, stats in solved]
+
+        return [result for result, _ in solved]
+
+    def solve_shared(self, tasks, run_time):
+        """
+            Solves the tasks from the smallest superblock up, each with an equal share of the time left in the
+            pool of run_time per superblock. The time of running superblocks is held back until they finish.
+            Only the time a superblock leaves unused goes back to the pool; a solve that overruns its share
+            is not charged to the superblocks after it, so every share is at least run_time.
+        """
+        pending = sorted(range(len(tasks)), key=lambda i: (tasks[i][0].num_total_modules, tasks[i][0].num_soft_modules))
+        left = run_time * len(tasks)   # Seconds neither used nor held by a running superblock
+        solved = [None] * len(tasks)
+
+        def next_task():
+            nonlocal left
+            i = pending.pop(0)
+            share = left / (len(pending) + 1)
+            left -= share
+            problem, options, _, backend, threads = tasks[i]
+            return i, share, (problem, options, share, backend, threads)
+
+        if self.workers == 1 or len(tasks) <= 1:
+            while pending:
+                i, share, task = next_task()
+                start = time.perf_counter()
+                solved[i] = solve_superblock(task)
+                left += max(share - (time.perf_counter() - start), 0)
+            return solved
+
+        with ProcessPoolExecutor(max_workers=min(self.workers, len(tasks))) as executor:
+            running = {}
+            while pending or running:
+                while pending and len(running) < self.workers:
+                    i, share, task = next_task()
+                    running[executor.submit(solve_superblock, task)] = (i, share, time.perf_counter())
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    i, share, start = running.pop(future)
+                    solved[i] = future.result()
+                    left += max(share - (time.perf_counter() - start), 0)
+
+        return solved
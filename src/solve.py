@@ -1,11 +1,22 @@
 import numpy as np
 import cvxpy as cp
 import matplotlib.pyplot as plt
-from matplotlib.patches import Rectangle
-import mosek
 import os
+import time
 from typing import List
-from src.generate import GenerateProblem
+from src.generate import GenerateProblem, pair_position
+from src.formulation import Formulation
+from src.milp import SparseMILP
+from src.heuristic import ShelfPlacer, placement_relations
+from src.tighten import BoundTightening
+from src.symmetry import SymmetryBreaking
+from src.compiled import compile_formulation, solver_options
+from src.lpfile import ModelWriter
+from src.timing import PhaseTimer
+from src.render import draw_floorplan
+from src.result_cache import is_optimal
+from src.placement import Placement
+from src.compaction import compact
 
 
 cwd = os.getcwd()
@@ -18,8 +29,45 @@ os.makedirs(sa_files_dir, exist_ok=True)
 
 class SolveILP:
 
-    def __init__(self, file, num_blocks, underestimation=True):
-        self.problem = GenerateProblem(file, num_blocks, underestimation=underestimation)
+    def __init__(self, file, num_blocks=None, underestimation=True, shape='square', aspect_limit=None, warm_start=False, tighten=True, symmetry=True,
+                 segments=None, adaptive_segments=0, refine_tolerance=None, refine_budget=None, target_gap=None, stall_time=None, cache=None,
+                 compact=False, placer=None, fixed_relations=None):
+        """
+            args:
+                file - the *.ilp file, or an already built GenerateProblem (then num_blocks, underestimation and segments are unused)
+                num_blocks - number of blocks to be optimized
+                underestimation - whether or not we are considering underestimation
+                segments - number of lines of the piecewise-linear soft module heights (None for a single line)
+                adaptive_segments - number of re-solves that each make the height model exact at the
+                                    soft module widths of the previous solution (refines the problem in place)
+                refine_tolerance - largest relative error of the soft module heights against area / w; solve()
+                                   adds cuts and re-solves until it is met (None to accept the model heights)
+                refine_budget - wall-clock seconds for all refinement solves together (None for no limit)
+                target_gap - stop a solve as soon as its relative MIP gap is at most this (None for the solver default)
+                stall_time - stop a solve when its incumbent has not improved for this many seconds
+                             (None for never; scipy backend with highspy only)
+                shape - 'square' minimizes one bound Y on both chip sides, 'rectangle' minimizes the
+                        half perimeter of a chip_width x Y chip
+                aspect_limit - for a rectangle, the largest allowed ratio between its sides (None for any)
+                warm_start - start the solver from a shelf-packing placement
+                tighten - derive the chip bounds, which are the big-M of the non-overlap rows, from a shelf-packing placement and the
+                          module dimensions, instead of the global GenerateProblem.upper_bound
+                symmetry - order identical modules and keep the largest unique module in the lower-left
+                           quadrant, which removes equivalent placements from the search
+                cache - a ResultCache. solve() returns a cached result that is proven within target_gap right
+                        away, starts from a cached incumbent otherwise, and stores what it finds
+                compact - return every solution with exact soft module heights and compacted (see compact_result)
+                placer - a placement of the problem to use instead of the shelf packing for warm_start and tighten:
+                         a ShelfPlacer after place(), or anything with its x, y, z, w, chip_width, chip_height
+                         and relations() (such as incremental.PlacementStart)
+                fixed_relations - (pairs, x_ij, y_ij), pairs whose relation binaries are fixed (see Formulation)
+        """
+        self.timer = PhaseTimer()   # Seconds per phase, over all refinement rounds
+        if isinstance(file, GenerateProblem):
+            self.problem = file
+        else:
+            with self.timer.phase('parse'):
+                self.problem = GenerateProblem(file, num_blocks, underestimation=underestimation, segments=segments)
         self.num_hard_modules, self.num_soft_modules = self.problem.num_hard_modules, self.problem.num_soft_modules
         self.num_total_modules = self.problem.num_total_modules
         self.hard_module_width, self.hard_module_height = self.problem.hard_module_width, self.problem.hard_module_height
@@ -35,20 +83,165 @@ class SolveILP:
             self.z = cp.Variable(self.num_hard_modules, integer=True)
         else:
             self.z = 0
-        self.x_ij = cp.Variable((self.num_total_modules, self.num_total_modules), integer=True)
-        self.y_ij = cp.Variable((self.num_total_modules, self.num_total_modules), integer=True)
+        num_pairs = self.num_total_modules * (self.num_total_modules - 1) // 2
+        if num_pairs > 0:   # One binary per pair i < j, positioned by pair_position
+            self.x_ij = cp.Variable(num_pairs, integer=True)
+            self.y_ij = cp.Variable(num_pairs, integer=True)
+        else:
+            self.x_ij, self.y_ij = 0, 0
 
         if self.problem.soft_exists:
             self.w = cp.Variable(self.num_soft_modules)     # Soft module widths
+            self.soft_height = cp.Variable(self.num_soft_modules)   # Only a column of piecewise height models
             self.h = np.zeros(self.num_soft_modules)
         else:
             self.w, self.h = 0, 0
         self.Y = cp.Variable()
 
-        self.objective = cp.Minimize(self.Y)
+        self.shape = shape
+        if shape == 'rectangle':
+            self.chip_width = cp.Variable()
+            self.objective = cp.Minimize(self.chip_width + self.Y)
+        else:
+            self.objective = cp.Minimize(self.Y)
         self.constraints = []
 
+        self.aspect_limit = aspect_limit
+        self.warm_start, self.tighten, self.symmetry = warm_start, tighten, symmetry
+        self.adaptive_segments = adaptive_segments
+        self.refine_tolerance, self.refine_budget = refine_tolerance, refine_budget
+        self.target_gap, self.stall_time = target_gap, stall_time
+        self.compact = compact
+        self.placer, self.fixed_relations = placer, fixed_relations
+        self.cache, self.cache_hit = cache, None   # cache_hit: None, 'optimal' or 'warm_start'
+        self.cache_options = {'shape': shape, 'aspect_limit': aspect_limit, 'segments': self.problem.segments,
+                              'adaptive_segments': adaptive_segments, 'refine_tolerance': refine_tolerance}   # What changes the model
+        self.refinement = None
+        self.status, self.mip_gap = None, None   # Of the last solve: 'optimal', 'time_limit', ... or 'heuristic'
+        self.best_bound, self.nodes = None, None   # Best dual bound and branch-and-bound nodes, where the backend reports them
+        self._formulation = None
+        self.initial_solution, self.heuristic_solution = None, None   # Set with the formulation
+
+    @property
+    def formulation(self):
+        """
+            The sparse model, built on first use, so that a SolveILP that only draws or saves a result
+            costs no heuristic placement, bound tightening or pair relations.
+        """
+        if self._formulation is None:
+            with self.timer.phase('formulation'):
+                self.build_formulation()
+
+        return self._formulation
+
+    def build_formulation(self):
+        """
+            Builds self.formulation from the current problem, with the heuristic placement, bound
+            tightening and symmetry breaking that were asked for.
+        """
+        shape, aspect_limit = self.shape, self.aspect_limit
+        self.initial_solution = None
+        placer = self.placer
+        if placer is None and (self.warm_start or self.tighten):
+            placer = ShelfPlacer(self.problem, shape=shape, aspect_limit=aspect_limit)
+            if not placer.place():
+                placer = None
+        tightening = BoundTightening(self.problem, shape=shape, aspect_limit=aspect_limit, placer=placer) if self.tighten else None
+        symmetry_breaking = SymmetryBreaking(self.problem) if self.symmetry else None
+        self._formulation = Formulation(self.problem, shape=shape, aspect_limit=aspect_limit, tightening=tightening, symmetry=symmetry_breaking,
+                                       fixed=self.fixed_relations)
+        self.heuristic_solution = None   # Returned when the solver finds nothing within its time limit
+        if placer is not None:
+            if symmetry_breaking is not None:
+                if shape == 'rectangle':
+                    chip_width, chip_height = placer.chip_width, placer.chip_height
+                else:
+                    chip_width = chip_height = max(placer.chip_width, placer.chip_height)
+                placer.x, placer.y = symmetry_breaking.canonicalize(placer.x, placer.y, placer.widths, placer.heights, chip_width, chip_height)
+            x_ij, y_ij = placer.relations()
+            self.heuristic_solution = self.formulation.solution_vector(placer.x, placer.y, placer.w, placer.z, x_ij, y_ij,
+                                                                       placer.chip_width, placer.chip_height)
+        if self.warm_start:
+            self.initial_solution = self.heuristic_solution
+
+    def stack_variables(self):
+        """
+            Stacks the model variables into one vector in the column layout of self.formulation.
+        """
+        blocks = [self.x, self.y]
+        if self.problem.soft_exists:
+            blocks.append(self.w)
+        if self.formulation.piecewise:
+            blocks.append(self.soft_height)
+        if self.shape == 'rectangle':
+            blocks.append(cp.reshape(self.chip_width, (1,), order='F'))
+        blocks.append(cp.reshape(self.Y, (1,), order='F'))
+        if self.formulation.num_pairs > 0:
+            blocks += [self.x_ij, self.y_ij]
+        if self.problem.hard_exists:
+            blocks.append(self.z)
+
+        return cp.hstack(blocks)
+
+    def set_values(self, v):
+        """
+            Assigns a solution vector (column layout of self.formulation) to the cvxpy variables, which
+            cvxpy passes on as a warm start to solvers that accept one.
+        """
+        values = self.formulation.values(v)
+        self.x.value, self.y.value, self.Y.value = values['x'], values['y'], values['Y'][0]
+        if self.problem.soft_exists:
+            self.w.value = values['w']
+        if self.formulation.piecewise:
+            self.soft_height.value = values['h']
+        if self.shape == 'rectangle':
+            self.chip_width.value = values['X'][0]
+        if self.formulation.num_pairs > 0:
+            self.x_ij.value, self.y_ij.value = values['x_ij'], values['y_ij']
+        if self.problem.hard_exists:
+            self.z.value = values['z']
+
+    def variable_values(self):
+        """
+            The values of the cvxpy variables as named blocks, the inverse of set_values.
+        """
+        values = {'x': self.x.value, 'y': self.y.value, 'Y': np.atleast_1d(self.Y.value)}
+        if self.problem.soft_exists:
+            values['w'] = self.w.value
+        if self.formulation.piecewise:
+            values['h'] = self.soft_height.value
+        if self.shape == 'rectangle':
+            values['X'] = np.atleast_1d(self.chip_width.value)
+        if self.formulation.num_pairs > 0:
+            values['x_ij'], values['y_ij'] = self.x_ij.value, self.y_ij.value
+        if self.problem.hard_exists:
+            values['z'] = self.z.value
+
+        return values
+
     def create_constraints(self):
+        """
+            Emits every constraint family (hard-hard, hard-soft, soft-soft, chip width/height, bounds)
+            as one batched affine constraint over the stacked variable vector.
+        """
+        with self.timer.phase('constraints'):
+            v = self.stack_variables()
+            for name, A, b in self.formulation.constraint_families():
+                self.constraints.append(A @ v <= b)
+
+            lb, ub = self.formulation.bounds()
+            lower, upper = np.flatnonzero(np.isfinite(lb)), np.flatnonzero(np.isfinite(ub))
+            self.constraints.append(lb[lower] <= v[lower])
+            self.constraints.append(v[upper] <= ub[upper])
+
+        return self.constraints
+
+    def create_loop_constraints(self):
+        """
+            Reference builder with one scalar constraint per pair and per row. Builds the same model
+            as create_constraints with tighten=False, symmetry=False and the single-line soft height model,
+            and is kept for cross-checking it.
+        """
 
         # Hard-Hard Non-overlap #
 
@@ -56,10 +249,11 @@ class SolveILP:
             for i in range(self.num_hard_modules):
                 for j in range(self.num_hard_modules):
                     if j > i:
-                        self.constraints.append(self.x[i] + self.z[i] * self.hard_module_height[i] + (1-self.z[i]) * self.hard_module_width[i] <= self.x[j] + self.bound * (self.x_ij[i, j] + self.y_ij[i, j]))
-                        self.constraints.append(self.x[i] - self.z[j] * self.hard_module_height[j] - (1-self.z[j]) * self.hard_module_width[j] >= self.x[j] - self.bound * (1 - self.x_ij[i, j] + self.y_ij[i, j]))
-                        self.constraints.append(self.y[i] + self.z[i] * self.hard_module_width[i] + (1-self.z[i]) * self.hard_module_height[i] <= self.y[j] + self.bound * (1 + self.x_ij[i, j] - self.y_ij[i, j]))
-                        self.constraints.append(self.y[i] - self.z[j] * self.hard_module_width[j] - (1-self.z[j]) * self.hard_module_height[j] >= self.y[j] - self.bound * (2 - self.x_ij[i, j] - self.y_ij[i, j]))
+                        p = pair_position(i, j, self.num_total_modules)
+                        self.constraints.append(self.x[i] + self.z[i] * self.hard_module_height[i] + (1-self.z[i]) * self.hard_module_width[i] <= self.x[j] + self.bound * (self.x_ij[p] + self.y_ij[p]))
+                        self.constraints.append(self.x[i] - self.z[j] * self.hard_module_height[j] - (1-self.z[j]) * self.hard_module_width[j] >= self.x[j] - self.bound * (1 - self.x_ij[p] + self.y_ij[p]))
+                        self.constraints.append(self.y[i] + self.z[i] * self.hard_module_width[i] + (1-self.z[i]) * self.hard_module_height[i] <= self.y[j] + self.bound * (1 + self.x_ij[p] - self.y_ij[p]))
+                        self.constraints.append(self.y[i] - self.z[j] * self.hard_module_width[j] - (1-self.z[j]) * self.hard_module_height[j] >= self.y[j] - self.bound * (2 - self.x_ij[p] - self.y_ij[p]))
 
         # Hard-Soft Non-overlap #
 
@@ -67,10 +261,11 @@ class SolveILP:
             for i in range(self.num_hard_modules):
                 for j in range(self.num_hard_modules, self.num_total_modules):
                     if j > i:
-                        self.constraints.append(self.x[i] + self.z[i] * self.hard_module_height[i] + (1-self.z[i]) * self.hard_module_width[i] <= self.x[j] + self.bound * (self.x_ij[i, j] + self.y_ij[i, j]))
-                        self.constraints.append(self.x[i] - self.w[j-self.num_hard_modules] >= self.x[j] - self.bound * (1 - self.x_ij[i, j] + self.y_ij[i, j]))
-                        self.constraints.append(self.y[i] + self.z[i] * self.hard_module_width[i] + (1-self.z[i]) * self.hard_module_height[i] <= self.y[j] + self.bound * (1 + self.x_ij[i, j] - self.y_ij[i, j]))
-                        self.constraints.append(self.y[i] - (self.gradient[j-self.num_hard_modules] * self.w[j-self.num_hard_modules] + self.intercept[j-self.num_hard_modules]) >= self.y[j] - self.bound * (2 - self.x_ij[i, j] - self.y_ij[i, j]))
+                        p = pair_position(i, j, self.num_total_modules)
+                        self.constraints.append(self.x[i] + self.z[i] * self.hard_module_height[i] + (1-self.z[i]) * self.hard_module_width[i] <= self.x[j] + self.bound * (self.x_ij[p] + self.y_ij[p]))
+                        self.constraints.append(self.x[i] - self.w[j-self.num_hard_modules] >= self.x[j] - self.bound * (1 - self.x_ij[p] + self.y_ij[p]))
+                        self.constraints.append(self.y[i] + self.z[i] * self.hard_module_width[i] + (1-self.z[i]) * self.hard_module_height[i] <= self.y[j] + self.bound * (1 + self.x_ij[p] - self.y_ij[p]))
+                        self.constraints.append(self.y[i] - (self.gradient[j-self.num_hard_modules] * self.w[j-self.num_hard_modules] + self.intercept[j-self.num_hard_modules]) >= self.y[j] - self.bound * (2 - self.x_ij[p] - self.y_ij[p]))
 
         # Soft-Soft Non-overlap #
 
@@ -78,10 +273,11 @@ class SolveILP:
             for i in range(self.num_hard_modules, self.num_total_modules):
                 for j in range(self.num_hard_modules, self.num_total_modules):
                     if j > i:
-                        self.constraints.append(self.x[i] + self.w[i-self.num_hard_modules] <= self.x[j] + self.bound * (self.x_ij[i, j] + self.y_ij[i, j]))
-                        self.constraints.append(self.x[i] - self.w[j-self.num_hard_modules] >= self.x[j] - self.bound * (1 - self.x_ij[i, j] + self.y_ij[i, j]))
-                        self.constraints.append(self.y[i] + (self.gradient[i-self.num_hard_modules] * self.w[i-self.num_hard_modules] + self.intercept[i-self.num_hard_modules]) <= self.y[j] + self.bound * (1 + self.x_ij[i, j] - self.y_ij[i, j]))
-                        self.constraints.append(self.y[i] - (self.gradient[j-self.num_hard_modules] * self.w[j-self.num_hard_modules] + self.intercept[j-self.num_hard_modules]) >= self.y[j] - self.bound * (2 - self.x_ij[i, j] - self.y_ij[i, j]))
+                        p = pair_position(i, j, self.num_total_modules)
+                        self.constraints.append(self.x[i] + self.w[i-self.num_hard_modules] <= self.x[j] + self.bound * (self.x_ij[p] + self.y_ij[p]))
+                        self.constraints.append(self.x[i] - self.w[j-self.num_hard_modules] >= self.x[j] - self.bound * (1 - self.x_ij[p] + self.y_ij[p]))
+                        self.constraints.append(self.y[i] + (self.gradient[i-self.num_hard_modules] * self.w[i-self.num_hard_modules] + self.intercept[i-self.num_hard_modules]) <= self.y[j] + self.bound * (1 + self.x_ij[p] - self.y_ij[p]))
+                        self.constraints.append(self.y[i] - (self.gradient[j-self.num_hard_modules] * self.w[j-self.num_hard_modules] + self.intercept[j-self.num_hard_modules]) >= self.y[j] - self.bound * (2 - self.x_ij[p] - self.y_ij[p]))
 
         for x in self.x:
             self.constraints.append(x >= 0)
@@ -98,10 +294,11 @@ class SolveILP:
         for i in range(self.num_total_modules):
             for j in range(self.num_total_modules):
                 if j > i:
-                    self.constraints.append(0 <= self.x_ij[i, j])
-                    self.constraints.append(self.x_ij[i, j] <= 1)
-                    self.constraints.append(0 <= self.y_ij[i, j])
-                    self.constraints.append(self.y_ij[i, j] <= 1)
+                    p = pair_position(i, j, self.num_total_modules)
+                    self.constraints.append(0 <= self.x_ij[p])
+                    self.constraints.append(self.x_ij[p] <= 1)
+                    self.constraints.append(0 <= self.y_ij[p])
+                    self.constraints.append(self.y_ij[p] <= 1)
 
         if self.problem.hard_exists:
             for z in self.z:
@@ -119,25 +316,284 @@ class SolveILP:
 
         return self.constraints
 
-    def solve(self, run_time, solver='MOSEK', verbose=False):
-        model = cp.Problem(self.objective, self.constraints)
-        model.solve(solver=solver, verbose=verbose, mosek_params={mosek.dparam.optimizer_max_time: run_time})
-        if self.problem.hard_exists and self.problem.soft_exists:
-            for i in range(self.num_soft_modules):
-                self.h[i] = self.gradient[i] * self.w.value[i] + self.intercept[i]
+    def solve(self, run_time, solver='MOSEK', verbose=False, backend='cvxpy', threads=None, on_incumbent=None):
+        """
+            args:
+                run_time - time limit of the solver in seconds, for every solve of the refinement loop
+                solver - the cvxpy solver, used when backend is 'cvxpy' or 'compiled': 'MOSEK' or 'SCIPY', the
+                         solvers the time limit and target gap are passed on to
+                backend - 'cvxpy' solves the model built by create_constraints, 'scipy' hands the
+                          sparse formulation straight to scipy.optimize.milp (HiGHS), 'compiled' solves
+                          it with a cvxpy problem compiled once per model structure and reused
+                threads - number of threads MOSEK may use (solver default when None)
+                on_incumbent - called with a dict of objective, bound, gap, elapsed seconds and solution
+                               vector for every incumbent the solver finds. The scipy backend with highspy
+                               reports each one as it is found, the other backends only the final solution.
+        """
+        cached = None
+        if self.cache is not None:
+            with self.timer.phase('cache'):
+                cached = self.cache.get(self.problem, self.cache_options)
+            if cached is not None and not is_optimal(cached, self.target_gap):
+                self.start_from(cached)
+                cached = None
+
+        if cached is not None:
+            result = self.cached_result(cached)
+        elif self.problem.soft_exists and (self.adaptive_segments or self.refine_tolerance is not None):
+            result = self.refine(run_time, solver=solver, verbose=verbose, backend=backend, threads=threads, on_incumbent=on_incumbent)
+        else:
+            result = self.solve_once(run_time, solver=solver, verbose=verbose, backend=backend, threads=threads, on_incumbent=on_incumbent)
 
-            return model.value, self.x.value, self.y.value, self.z.value, self.w.value, self.h
-        elif self.problem.hard_exists and not self.problem.soft_exists:
+        if self.cache is not None and cached is None and self.status != 'heuristic':
+            bound, X, Y, Z, W, H = result
+            widths, heights = self.module_dimensions(Z, W, H)
+            chip_width, chip_height = self.bounding_box(X, Y, Z, W, H)
+            with self.timer.phase('cache'):
+                self.cache.put(self.problem, self.cache_options, float(bound), X, Y, widths, heights, chip_width, chip_height, self.status, self.mip_gap)
+
+        if self.compact:
+            with self.timer.phase('compact'):
+                result = self.compact_result(result)
+
+        return result
+
+    def compact_result(self, result):
+        """
+            Snaps the rotations to 0 or 1, gives the soft modules their exact heights area / w and compacts
+            the placement (see compaction.compact). The chip, and so the bound, may grow where the model
+            underestimated a soft module height; an aspect_limit is not enforced again.
+        """
+        bound, X, Y, Z, W, H = result
+        if self.problem.hard_exists:
+            Z = np.round(Z)
+        if self.problem.soft_exists:
+            H = self.problem.actual_soft_height(W)
+            self.h = H
+        widths, heights = self.module_dimensions(Z, W, H)
+        X, Y = compact(X, Y, widths, heights)
+        chip_width, chip_height = np.max(X + widths), np.max(Y + heights)
+        bound = chip_width + chip_height if self.shape == 'rectangle' else max(chip_width, chip_height)
 
-            return model.value, self.x.value, self.y.value, self.z.value, self.w, self.h
+        return bound, X, Y, Z, W, H
 
-        elif not self.problem.hard_exists and self.problem.soft_exists:
-            for i in range(self.num_soft_modules):
-                self.h[i] = self.gradient[i] * self.w.value[i] + self.intercept[i]
+    def cached_vector(self, cached):
+        """
+            The Z, W and H of a cached placement, and its solution vector in the column layout of self.formulation.
+        """
+        nh = self.num_hard_modules
+        widths, heights = cached['widths'], cached['heights']
+        Z = (~np.isclose(widths[:nh], self.hard_module_width)).astype(float) if self.problem.hard_exists else self.z
+        W, H = (widths[nh:], heights[nh:]) if self.problem.soft_exists else (self.w, self.h)
+        x_ij, y_ij = placement_relations(cached['x'], cached['y'], widths, heights, tol=1e-5)   # Solver tolerances leave tiny overlaps
+        v = self.formulation.solution_vector(cached['x'], cached['y'], W, Z, x_ij, y_ij, cached['chip_width'], cached['chip_height'])
 
-        return model.value, self.x.value, self.y.value, self.z, self.w.value, self.h    # W and H are soft module widths and heights
+        return Z, W, H, v
+
+    def cached_result(self, cached):
+        """
+            Returns a cached result in the form of solve() without solving.
+        """
+        Z, W, H, self.solution = self.cached_vector(cached)
+        self.status, self.mip_gap, self.best_bound, self.nodes = cached['status'], cached['mip_gap'], None, None
+        self.cache_hit = 'optimal'
+        if self.problem.soft_exists:
+            self.h = H
+
+        return cached['objective'], cached['x'], cached['y'], Z, W, H
+
+    def start_from(self, cached):
+        """
+            Uses a cached placement as the warm start, when it is feasible for the current model and
+            better than the heuristic one.
+        """
+        _, _, _, v = self.cached_vector(cached)
+        objective = self.formulation.objective()
+        if self.formulation.violation(v) > 1e-5:
+            return
+        if self.initial_solution is None or objective @ v < objective @ self.initial_solution:
+            self.initial_solution = v
+            self.cache_hit = 'warm_start'
+
+    def refine(self, run_time, solver='MOSEK', verbose=False, backend='cvxpy', threads=None, on_incumbent=None):
+        """
+            Solve-check-refine loop. Every round compares the modeled soft module heights with area / w,
+            makes the model exact (a tangent cut, or a chord split) at the width of every module whose
+            error exceeds refine_tolerance, and re-solves from the previous relations with repositioned
+            modules. Stops when every error is within the tolerance, after adaptive_segments
+            re-solves (when no tolerance is given), or when refine_budget runs out. The problem is
+            refined in place.
+
+            Sets self.refinement to the number of solves, the final largest error and the number of height rows.
+        """
+        tolerance = 0 if self.refine_tolerance is None else self.refine_tolerance
+        max_solves = self.adaptive_segments + 1 if self.refine_tolerance is None else None
+        start = time.time()
+        result = self.solve_once(run_time, solver=solver, verbose=verbose, backend=backend, threads=threads, on_incumbent=on_incumbent)
+        solves = 1
+        while True:
+            error = self.problem.soft_height_error(result[4])
+            remaining = run_time if self.refine_budget is None else self.refine_budget - (time.time() - start)
+            if np.max(error) <= tolerance or remaining <= 0 or (max_solves is not None and solves >= max_solves):
+                break
+            previous = self.formulation.values(self.solution)
+            self.problem.add_breakpoints(result[4], modules=error > tolerance)
+            with self.timer.phase('formulation'):
+                self.build_formulation()
+            with self.timer.phase('polish'):
+                polished = SparseMILP(self.formulation).polish(self.formulation.vector(previous), run_time=remaining)
+            if polished is not None and (self.heuristic_solution is None or polished[0] <= self.formulation.objective() @ self.heuristic_solution):
+                self.initial_solution = polished[1]
+            else:
+                self.initial_solution = self.heuristic_solution
+            if backend == 'cvxpy':
+                self.constraints = []
+                self.create_constraints()
+            result = self.solve_once(min(run_time, remaining), solver=solver, verbose=verbose, backend=backend, threads=threads, on_incumbent=on_incumbent)
+            solves += 1
+
+        self.refinement = {'solves': solves, 'error': float(np.max(error)),
+                           'height_rows': int(np.sum(self.problem.num_height_lines))}
+
+        return result
+
+    def solve_once(self, run_time, solver='MOSEK', verbose=False, backend='cvxpy', threads=None, on_incumbent=None):
+        start = time.perf_counter()
+        if backend in ('scipy', 'compiled'):
+            try:
+                if backend == 'scipy':
+                    milp = SparseMILP(self.formulation)
+                    try:
+                        with self.timer.phase('solve'):
+                            bound, v = milp.solve(run_time, verbose=verbose, x0=self.initial_solution, on_incumbent=on_incumbent,
+                                                  target_gap=self.target_gap, stall_time=self.stall_time)
+                    finally:
+                        self.status, self.mip_gap = milp.status, milp.mip_gap
+                        self.best_bound, self.nodes = milp.dual_bound, milp.nodes
+                else:
+                    bound, v = self.solve_compiled(run_time, solver=solver, verbose=verbose, threads=threads)
+                    if on_incumbent is not None:
+                        on_incumbent({'objective': bound, 'bound': None, 'gap': None, 'elapsed': time.perf_counter() - start, 'solution': v})
+            except RuntimeError:
+                if self.heuristic_solution is None:
+                    raise
+                v = self.heuristic_solution
+                bound = self.formulation.objective() @ v
+                self.status, self.mip_gap, self.best_bound, self.nodes = 'heuristic', None, None, None
+            self.solution = v
+            values = self.formulation.values(v)
+            X, Y = values['x'], values['y']
+            Z = values['z'] if self.problem.hard_exists else self.z
+            W = values['w'] if self.problem.soft_exists else self.w
+        elif backend == 'cvxpy':
+            model = cp.Problem(self.objective, self.constraints)
+            self.formulation   # Builds the heuristic warm start, which create_loop_constraints does not
+            if self.initial_solution is not None:
+                self.set_values(self.initial_solution)
+            warm_start = self.initial_solution is not None
+            start = time.perf_counter()
+            model.solve(solver=solver, verbose=verbose, **solver_options(solver, run_time, threads=threads, target_gap=self.target_gap,
+                                                                         warm_start=warm_start))
+            self.time_solve(model, time.perf_counter() - start)
+            bound = model.value
+            self.status, self.mip_gap, self.best_bound, self.nodes = model.status, None, None, None
+            if self.x.value is None and self.heuristic_solution is not None:
+                self.set_values(self.heuristic_solution)
+                bound = self.formulation.objective() @ self.heuristic_solution
+                self.status = 'heuristic'
+            self.solution = self.formulation.vector(self.variable_values())
+            if on_incumbent is not None and self.status != 'heuristic':
+                on_incumbent({'objective': bound, 'bound': None, 'gap': None, 'elapsed': time.perf_counter() - start, 'solution': self.solution})
+            X, Y = self.x.value, self.y.value
+            Z = self.z.value if self.problem.hard_exists else self.z
+            W = self.w.value if self.problem.soft_exists else self.w
+        else:
+            raise ValueError(f'Unknown backend {backend}. Expected \'cvxpy\', \'compiled\' or \'scipy\'.')
+
+        if self.problem.soft_exists:
+            self.h = self.problem.soft_module_height(W)
+
+        return bound, X, Y, Z, W, self.h    # W and H are soft module widths and heights
+
+    def time_solve(self, model, seconds):
+        """
+            Splits the seconds of a cvxpy solve into the canonicalization cvxpy reports and the solve itself.
+        """
+        canonicalization = min(model.compilation_time or 0, seconds)
+        self.timer.add('canonicalization', canonicalization)
+        self.timer.add('solve', seconds - canonicalization)
+
+    @property
+    def build_time(self):
+        """
+            Seconds spent building models, over all refinement rounds.
+        """
+        return self.timer.total('formulation', 'constraints', 'compile')
+
+    def solve_stats(self):
+        """
+            Status, MIP gap, best bound and node count of the last solve, the seconds spent in every
+            phase, the size of the model and how the result cache was used.
+        """
+        return {'status': self.status, 'mip_gap': self.mip_gap, 'best_bound': self.best_bound, 'nodes': self.nodes,
+                'build_time': self.build_time, 'phases': self.timer.as_dict(), 'model': self.formulation.size(), 'cache': self.cache_hit}
+
+    def solve_compiled(self, run_time, solver='MOSEK', verbose=False, threads=None):
+        """
+            Solves the formulation with a cached CompiledModel of its structure, which cvxpy does not
+            canonicalize again.
+        """
+        with self.timer.phase('compile'):
+            model = compile_formulation(self.formulation)
+        start = time.perf_counter()
+        bound, v = model.solve(run_time, solver=solver, verbose=verbose, threads=threads, x0=self.initial_solution, target_gap=self.target_gap)
+        self.time_solve(model.problem, time.perf_counter() - start)
+        self.status, self.mip_gap, self.best_bound, self.nodes = model.problem.status, None, None, None
+        if v is None:
+            raise RuntimeError(f'{solver} found no feasible floorplan.')
+
+        return bound, v
+
+    def create_ilp_file(self, file_format='lp_solve', path=None):
+        """
+            Writes the formulation, as it would be solved, for an external solver.
+            args:
+                file_format - 'lp_solve', 'cplex' or 'mps'
+                path - the output file (lp_solve_files/<n>_blocks_constraints.<ext> when None)
+            returns:
+                The path that was written
+        """
+        return ModelWriter(self.formulation).write(path, file_format=file_format)
+
+    def module_dimensions(self, Z, W, H):
+        """
+            Placed width and height of every module (see GenerateProblem.module_dimensions).
+        """
+        return self.problem.module_dimensions(Z, W, H)
+
+    def bounding_box(self, X, Y, Z, W, H):
+        """
+            Width and height of the rectangle actually covered by the placement.
+        """
+        return self.problem.bounding_box(X, Y, Z, W, H)
+
+    def visualize(self, bound, X, Y, Z, W, H, idx=1, glob=False, sa=True, show_layout=True, utilizations=[1], plot='show', renderer=None, name=None): # W and H are soft module widths and heights
+        """
+            Sets self.utilization and draws the floorplan.
+            args:
+                plot - 'show' draws it with pyplot (shown and waited for when show_layout, else discarded),
+                       'file' queues an image on renderer (a FloorplanRenderer) and 'none' only computes
+                       the utilization
+                name - file name of the image without extension, for 'file'
+        """
+        if self.shape == 'rectangle':
+            chip_width, chip_height = self.bounding_box(X, Y, Z, W, H)
+            chip_text = 'Chip = %.4f x %.4f' % (chip_width, chip_height)
+        else:
+            chip_width, chip_height = bound, bound
+            chip_text = 'Chip Height = %.4f' % bound
+        chip_area = chip_width * chip_height
 
-    def visualize(self, bound, X, Y, Z, W, H, idx=1, glob=False, sa=True, show_layout=True, utilizations=[1]): # W and H are soft module widths and heights
         if self.problem.hard_exists and self.problem.soft_exists:
             W = np.concatenate((self.hard_module_width, W))
             H = np.concatenate((self.hard_module_height, H))
@@ -145,56 +601,72 @@ class SolveILP:
             W = self.hard_module_width
             H = self.hard_module_height
 
-        chip_area = bound ** 2
         self.utilization = (np.sum(W * H) / chip_area) * np.prod(utilizations)
+        if plot == 'none' or (plot == 'show' and not show_layout):
+            return W, H
 
-        label = np.arange(self.num_total_modules) + 1
-        plt.ion()
-        fig, ax = plt.subplots()
-        for i, txt in enumerate(label):
-            if i < self.num_hard_modules:
-                if Z[i] >= 0.9: # Sometimes get 1.01/0.99
-                    ax.add_patch(Rectangle((X[i], Y[i]), H[i], W[i], color='red'))
-                    ax.add_patch(Rectangle((X[i], Y[i]), H[i], W[i], color='black', fill=False))
-                    ax.annotate(text=txt, xy=(X[i], Y[i]), xytext=(X[i]+H[i]/2, Y[i]+W[i]/2))
-                else:
-                    ax.add_patch(Rectangle((X[i], Y[i]), W[i], H[i], color='green'))
-                    ax.add_patch(Rectangle((X[i], Y[i]), W[i], H[i], color='black', fill=False))
-                    ax.annotate(text=txt, xy=(X[i], Y[i]), xytext=(X[i]+W[i]/2, Y[i]+H[i]/2))
-            else:
-                ax.add_patch(Rectangle((X[i], Y[i]), W[i], H[i], color='yellow'))
-                ax.add_patch(Rectangle((X[i], Y[i]), W[i], H[i], color='black', fill=False))
-                ax.annotate(text=txt, xy=(X[i], Y[i]), xytext=(X[i]+W[i]/2, Y[i]+H[i]/2))
-            if sa==True:
-                if glob==False:
-                        plt.title('Local floorplan for %d-th sub-block: Chip Height = %.4f, Chip Area = %d\nUtilization = %.2f percent' % (idx, bound, chip_area, self.utilization * 100))
-                else:
-                        plt.title('Global floorplan for including all sub-blocks: Chip Height = %.4f, Chip Area = %d\nUtilization = %.2f percent' % (bound, chip_area, self.utilization * 100))
-            else:
-                plt.title('Direct floorplan: Chip Height = %.4f, Chip Area = %d\nUtilization = %.2f percent' % (bound, chip_area, self.utilization * 100))
-
-        ax.set_xlim(0, bound)
-        ax.set_ylim(0, bound)
-        if show_layout:
+        if sa and not glob:
+            title = 'Local floorplan for %d-th sub-block: %s, Chip Area = %d\nUtilization = %.2f percent' % (idx, chip_text, chip_area, self.utilization * 100)
+        elif sa:
+            title = 'Global floorplan for including all sub-blocks: %s, Chip Area = %d\nUtilization = %.2f percent' % (chip_text, chip_area, self.utilization * 100)
+        else:
+            title = 'Direct floorplan: %s, Chip Area = %d\nUtilization = %.2f percent' % (chip_text, chip_area, self.utilization * 100)
+        rotated = np.zeros(self.num_total_modules, dtype=bool)
+        if self.problem.hard_exists:
+            rotated[:self.num_hard_modules] = np.round(Z) >= 1 # As in module_dimensions; solvers return e.g. 0.99 or 1.01
+        widths, heights = np.where(rotated, H, W), np.where(rotated, W, H)
+        kinds = ['rotated' if rotated[i] else 'hard' if i < self.num_hard_modules else 'soft' for i in range(self.num_total_modules)]
+
+        if plot == 'file':
+            renderer.submit(name or f'floorplan_{idx}', X, Y, widths, heights, kinds, chip_width, chip_height, title=title)
+        elif plot == 'show':
+            plt.ion()
+            fig, ax = plt.subplots()
+            draw_floorplan(ax, X, Y, widths, heights, kinds, chip_width, chip_height, title=title)
             plt.show(block=True)
         else:
-            plt.close()
+            raise ValueError(f'Unknown plot mode {plot}. Expected \'show\', \'file\' or \'none\'.')
         return W, H
 
     def save_augmented_dimensions(self, num_blocks:int, bounds):
         """
             args:
-                bounds - the list of bounds for every superblock
+                bounds - the list of bounds for every superblock, or of (width, height) for rectangular superblocks
         """
         f = open(os.path.join(sa_files_dir, f'{num_blocks}', f'{num_blocks}_blocks_sa.ilp'), 'w')
         f.write(f'hard - {len(bounds)}\n')
         for bound in bounds:
-            f.write(f'{bound},{bound}\n')
+            width, height = bound if np.ndim(bound) else (bound, bound)
+            f.write(f'{width},{height}\n')
         f.close()
 
-    def save_final_dimensions(self, bound, num_blocks, sa=True):
-        res_file_name = f'{num_blocks}_sa_{sa}_dimensions.txt'
+    def save_final_dimensions(self, bound, num_blocks, sa=True, name=None):
+        """
+            args:
+                bound - the chip bound, or (width, height) for a rectangular chip
+                name - the file name before _dimensions.txt (<n>_sa_<sa> when None)
+        """
+        width, height = bound if np.ndim(bound) else (bound, bound)
+        res_file_name = f'{num_blocks}_sa_{sa}_dimensions.txt' if name is None else f'{name}_dimensions.txt'
         res_file_path = os.path.join(results_dir, res_file_name)
         f = open(res_file_path, 'w')
-        f.write(f'{bound},{bound}\n')
-        f.close()
\ No newline at end of file
+        f.write(f'{width},{height}\n')
+        f.close()
+
+    def save_final_placement(self, X, Y, widths, heights, rotated, chip, num_blocks, sa=True, metadata=None, view='json', name=None):
+        """
+            Writes the absolute placement to results/<n>_sa_<sa>_placement.npz and its .json or .csv view.
+            args:
+                rotated - whether every module is placed rotated
+                chip - the chip bound, or (width, height) for a rectangular chip
+                metadata - JSON values about the run, stored with the placement
+                view - 'json', 'csv' or None
+                name - the file name before _placement (<n>_sa_<sa> when None)
+            returns:
+                The Placement
+        """
+        placement = Placement.from_solution(self.problem, X, Y, widths, heights, rotated, chip, metadata=metadata)
+        name = f'{num_blocks}_sa_{sa}' if name is None else name
+        placement.save(os.path.join(results_dir, f'{name}_placement'), view=view)
+
+        return placement
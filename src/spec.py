@@ -0,0 +1,113 @@
+import hashlib
+import os
+import re
+import numpy as np
+
+
+cwd = os.getcwd()
+spec_cache_dir = os.path.join(cwd, 'spec_files', 'cache') # Parsed specifications, one *.npz per spec file
+
+header = re.compile(r'^(hard|soft)\s*-\s*(\d+)\s*$')
+num_fields = {'hard': 2, 'soft': 3}   # width,height and area,min_aspect,max_aspect
+
+
+def parse_spec(text, source='<spec>'):
+    """
+    Parses the text of a *.ilp specification in a single pass.
+
+    A section starts with a 'hard - N' or 'soft - N' line and holds N comma separated rows,
+    width,height for hard modules and area,min_aspect,max_aspect for soft ones. Blank lines are
+    ignored. Every section may appear at most once. Errors name the line of the file they are on.
+    args:
+        text: The contents of the file (str)
+        source: Name of the file, for error messages
+    returns:
+        The hard modules as an (N, 2) array and the soft modules as an (N, 3) array (float64, N may be 0)
+    """
+    rows = {'hard': [], 'soft': []}
+    numbers = {'hard': [], 'soft': []}   # File line of every row, for error messages
+    counts, starts = {}, {}
+    section = None
+    for number, line in enumerate(text.splitlines(), start=1):
+        line = line.strip()
+        if not line:
+            continue
+        match = header.match(line)
+        if match:
+            section = match.group(1)
+            if section in counts:
+                raise ValueError(f'{source}:{number}: the {section} section appears twice.')
+            counts[section], starts[section] = int(match.group(2)), number
+        elif section is None:
+            raise ValueError(f'{source}:{number}: expected a \'hard - N\' or \'soft - N\' line, found {line!r}.')
+        else:
+            fields = line.split(',')
+            if len(fields) != num_fields[section]:
+                raise ValueError(f'{source}:{number}: a {section} module needs {num_fields[section]} comma separated values, found {len(fields)}.')
+            if len(rows[section]) == counts[section]:
+                raise ValueError(f'{source}:{number}: the {section} section declares {counts[section]} modules but lists more.')
+            rows[section].append(fields)
+            numbers[section].append(number)
+    if not counts:
+        raise ValueError(f'{source}: the specification has no modules.')
+
+    modules = {}
+    for section, fields in rows.items():
+        if len(fields) != counts.get(section, 0):
+            raise ValueError(f'{source}:{starts[section]}: the {section} section declares {counts[section]} modules but lists {len(fields)}.')
+        try:
+            modules[section] = np.array(fields, dtype=float).reshape(len(fields), num_fields[section])
+        except ValueError:
+            for number, row in zip(numbers[section], fields):   # Only to find the row that failed
+                try:
+                    np.array(row, dtype=float)
+                except ValueError:
+                    raise ValueError(f'{source}:{number}: {",".join(row)!r} is not a list of numbers.') from None
+            raise
+
+    return modules['hard'], modules['soft']
+
+
+def read_spec(path, cache=False, cache_dir=None):
+    """
+    Reads a *.ilp specification with parse_spec.
+
+    With cache, the parsed arrays are kept in cache_dir as an *.npz named after the path. The cache
+    is used when the file has the same modification time and size, or else the same content hash,
+    as when it was written, so batch runs over many generated specs parse every file only once.
+    args:
+        path: The *.ilp file
+        cache: Whether or not to use the *.npz cache (bool)
+        cache_dir: Directory of the cache (spec_files/cache when None)
+    returns:
+        The hard (N, 2) and soft (N, 3) module arrays
+    """
+    if not cache:
+        with open(path) as f:
+            return parse_spec(f.read(), source=path)
+
+    cache_dir = spec_cache_dir if cache_dir is None else cache_dir
+    path = os.path.abspath(path)
+    cache_file = os.path.join(cache_dir, hashlib.sha1(path.encode()).hexdigest()[:20] + '.npz')
+    stat = os.stat(path)
+    cached = None
+    if os.path.exists(cache_file):
+        with np.load(cache_file) as data:
+            cached = {key: data[key] for key in data.files}
+        if cached['mtime_ns'] == stat.st_mtime_ns and cached['size'] == stat.st_size:
+            return cached['hard'], cached['soft']
+
+    with open(path, 'rb') as f:
+        content = f.read()
+    digest = hashlib.sha1(content).hexdigest()
+    if cached is not None and str(cached['digest']) == digest:
+        hard, soft = cached['hard'], cached['soft']
+    else:
+        hard, soft = parse_spec(content.decode(), source=path)
+    os.makedirs(cache_dir, exist_ok=True)
+    temporary = f'{cache_file}.{os.getpid()}.tmp'   # Parallel runs may write the same entry
+    with open(temporary, 'wb') as f:
+        np.savez(f, hard=hard, soft=soft, digest=digest, mtime_ns=stat.st_mtime_ns, size=stat.st_size)
+    os.replace(temporary, cache_file)
+
+    return hard, soft
@@ -0,0 +1,181 @@
+import csv
+import itertools
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+from src.generate import GenerateProblem
+from src.spec import read_spec
+from src.schedule import SuperblockScheduler
+from src.hierarchy import HierarchicalFloorplan
+
+
+settings = {'partition': 'sequential', 'shape': 'square', 'aspect_limit': None, 'tighten': True, 'symmetry': True,
+            'target_gap': None, 'stall_time': None, 'share_time': False}   # Sweep-wide settings and their defaults, recorded with every cell
+fields = ['spec', 'num_blocks', 'sub_block_size', 'runtime', 'underestimation', 'backend', *settings, 'chip_width', 'chip_height',
+          'utilization', 'wall_time', 'build_time', 'status', 'mip_gap', 'best_bound', 'nodes', 'solves', 'error']
+
+
+def setting_value(value):
+    """
+    A setting as written by Python or read back from a CSV file ('' and 'None' for None, 'True' and 'False'
+    for booleans), in one form for comparing: None, a bool, a float or a string.
+    """
+    if value is None or value in ('', 'None'):
+        return None
+    if isinstance(value, bool) or value in ('True', 'False', 'true', 'false'):
+        return value in (True, 'True', 'true')
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return str(value)
+
+
+def cell_key(cell):
+    """
+    What identifies a cell of the grid with its backend and sweep settings, from a record read back from a
+    CSV/JSON-lines file or a cell with its backend and settings. A record without a setting (from an older
+    sweep) matches no cell, so the cell runs again.
+    """
+    underestimation = cell['underestimation'] in (True, 'True', 'true')
+    missing = object()
+
+    return (str(cell['spec']), int(cell['sub_block_size']), float(cell['runtime']), underestimation, cell['backend'],
+            *(setting_value(cell[name]) if name in cell else missing for name in settings))
+
+
+def run_cell(task):
+    """
+    Floorplans one cell of the grid without plotting. Runs inside a worker process, so it only takes
+    and returns picklable data.
+    args:
+        task - (cell, backend, strategy, options, threads, share_time) where cell holds spec, sub_block_size,
+               runtime, underestimation and the sweep settings, and options are keyword arguments of SolveILP
+    returns:
+        The record of the cell (see fields). A failing cell records its error instead of raising.
+    """
+    cell, backend, strategy, options, threads, share_time = task
+    record = dict(cell, backend=backend, error='')
+    start = time.time()
+    try:
+        hard, soft = read_spec(cell['spec'], cache=True)
+        problem = GenerateProblem.from_modules(len(hard) + len(soft), hard[:, 0], hard[:, 1], soft[:, 0], soft[:, 1], soft[:, 2],
+                                               underestimation=cell['underestimation'])
+        hierarchy = HierarchicalFloorplan(problem, max_size=cell['sub_block_size'], strategy=strategy, options=options,
+                                          scheduler=SuperblockScheduler(threads=threads, share_time=share_time))
+        chip, (X, Y, widths, heights, rotated) = hierarchy.solve(run_time=cell['runtime'], backend=backend)
+        chip_width, chip_height = chip if np.ndim(chip) else (chip, chip)
+        record.update(hierarchy.solve_stats(), num_blocks=problem.num_total_modules, chip_width=float(chip_width), chip_height=float(chip_height),
+                      utilization=float(np.sum(widths * heights) / (chip_width * chip_height)))
+    except Exception as error:   # One infeasible or broken cell must not end the sweep
+        record['error'] = f'{type(error).__name__}: {str(error).strip()}'
+    record['wall_time'] = time.time() - start
+
+    return record
+
+
+class BatchSweep:
+    """
+    Runs a grid of spec files x sub_block_size x runtime x underestimation on a process pool and
+    appends one record per cell to a CSV or JSON-lines file (by its extension) as soon as the cell
+    finishes. Every record holds the backend and the settings (partition strategy, shape, ...), and
+    cells that already have a record with the same ones are skipped, so an interrupted sweep resumes
+    where it stopped while a sweep with other settings into the same file runs again.
+    """
+
+    def __init__(self, output, backend='cvxpy', workers=1, threads=None, strategy='sequential', options=None, share_time=False):
+        """
+        args:
+            output - the *.csv or *.jsonl results file, created if missing
+            backend - backend of SolveILP.solve
+            workers - number of cells solved at the same time
+            threads - total solver threads shared by the workers (defaults to the number of CPUs)
+            strategy - partitioning strategy of the superblocks
+            options - keyword arguments for every SolveILP (e.g. shape)
+            share_time - pass unused superblock time on to later superblocks (see SuperblockScheduler)
+        """
+        if workers < 1:
+            raise ValueError('At least one worker is needed.')
+        self.output = output
+        self.json_lines = os.path.splitext(output)[1] in ('.jsonl', '.json')
+        self.backend = backend
+        self.workers = workers
+        total_threads = threads if threads is not None else os.cpu_count() or 1
+        self.threads_per_cell = max(1, total_threads // workers)
+        self.strategy = strategy
+        self.options = options or {}
+        self.share_time = share_time
+        self.settings = dict(settings, partition=strategy, share_time=share_time,
+                             **{name: self.options[name] for name in settings if name in self.options})
+
+    @staticmethod
+    def grid(specs, sub_block_sizes, runtimes, underestimations):
+        return [{'spec': spec, 'sub_block_size': size, 'runtime': runtime, 'underestimation': underestimation}
+                for spec, size, runtime, underestimation in itertools.product(specs, sub_block_sizes, runtimes, underestimations)]
+
+    def finished(self):
+        """
+        The keys of the cells that already have a record in the output file.
+        """
+        if not os.path.exists(self.output):
+            return set()
+        with open(self.output, newline='') as f:
+            if self.json_lines:
+                records = [json.loads(line) for line in f if line.strip()]
+            else:
+                records = list(csv.DictReader(f))
+
+        return {cell_key(record) for record in records}
+
+    def run(self, cells, progress=print):
+        """
+        args:
+            cells - dicts of spec, sub_block_size, runtime and underestimation, as from grid
+            progress - called with a line of text per finished cell (None for silence)
+        returns:
+            The records of the cells that were run
+        """
+        finished = self.finished()
+        pending = [cell for cell in cells if cell_key(dict(cell, backend=self.backend, **self.settings)) not in finished]
+        tasks = [(dict(cell, **self.settings), self.backend, self.strategy, self.options, self.threads_per_cell, self.share_time) for cell in pending]
+        if progress is not None and len(pending) < len(cells):
+            progress(f'Skipping {len(cells) - len(pending)} finished cells of {len(cells)}.')
+
+        records = []
+        new_file = not os.path.exists(self.output) or os.path.getsize(self.output) == 0
+        if not new_file and not self.json_lines:
+            with open(self.output, newline='') as f:
+                header = next(csv.reader(f), [])
+            if header != fields:
+                raise ValueError(f'{self.output} has other columns than this sweep writes. Write to a new file.')
+        with open(self.output, 'a', newline='') as f:
+            writer = None if self.json_lines else csv.DictWriter(f, fieldnames=fields, extrasaction='ignore')
+            if writer is not None and new_file:
+                writer.writeheader()
+            for record in self.solved(tasks):
+                if writer is None:
+                    f.write(json.dumps(record) + '\n')
+                else:
+                    writer.writerow(record)
+                f.flush()
+                records.append(record)
+                if progress is not None:
+                    outcome = record['error'] or f"utilization {record['utilization'] * 100:.2f} percent, {record['status']}"
+                    progress(f"[{len(records)}/{len(tasks)}] {record['spec']} size {record['sub_block_size']} runtime {record['runtime']} "
+                             f"u {record['underestimation']}: {outcome} in {record['wall_time']:.1f} s")
+
+        return records
+
+    def solved(self, tasks):
+        """
+        Yields the record of every task as soon as it is done.
+        """
+        if self.workers == 1 or len(tasks) <= 1:
+            for task in tasks:
+                yield run_cell(task)
+            return
+        with ProcessPoolExecutor(max_workers=min(self.workers, len(tasks))) as executor:
+            futures = [executor.submit(run_cell, task) for task in tasks]
+            for future in as_completed(futures):
+                yield future.result()
@@ -0,0 +1,110 @@
+import numpy as np
+from src.generate import pair_index
+
+
+class SymmetryBreaking:
+    """
+        Groups identical modules and picks an anchor module, so that the model can forbid
+        placements that only differ by a permutation of identical modules or by a mirroring of the chip.
+
+        Identical modules can swap places (and orientations), so the solver only needs the
+        placements where they are ordered by x. Within a group, x_i <= x_j for i < j, which also
+        rules out "i right of j" (x_ij = 1, y_ij = 0). Mirroring the chip left-right or top-bottom
+        keeps a placement legal, so the anchor, the largest module without a duplicate, has its
+        center in the lower-left quadrant. The anchor is not moved by the reordering, so both hold at once.
+    """
+
+    def __init__(self, problem, decimals=6):
+        """
+            args:
+                problem - the specification (GenerateProblem)
+                decimals - modules whose dimensions agree to this many decimals are identical
+        """
+        self.problem = problem
+        self.decimals = decimals
+        self.groups = self.identical_groups()
+        self.anchor = self.anchor_module()
+
+    def module_keys(self):
+        """
+            A hashable description of every module: a hard module by its sides (either orientation),
+            a soft module by its area and aspect range.
+        """
+        problem = self.problem
+        keys = []
+        if problem.hard_exists:
+            short_side = np.round(np.minimum(problem.hard_module_width, problem.hard_module_height), self.decimals)
+            long_side = np.round(np.maximum(problem.hard_module_width, problem.hard_module_height), self.decimals)
+            keys += [('hard', a, b) for a, b in zip(short_side, long_side)]
+        if problem.soft_exists:
+            area = np.round(problem.area, self.decimals)
+            min_aspect = np.round(problem.min_aspect, self.decimals)
+            max_aspect = np.round(problem.max_aspect, self.decimals)
+            keys += [('soft', a, lo, hi) for a, lo, hi in zip(area, min_aspect, max_aspect)]
+
+        return keys
+
+    def identical_groups(self):
+        """
+            The index arrays (ascending) of every set of at least two identical modules.
+        """
+        members = {}
+        for k, key in enumerate(self.module_keys()):
+            members.setdefault(key, []).append(k)
+
+        return [np.array(group) for group in members.values() if len(group) > 1]
+
+    def anchor_module(self):
+        """
+            The largest module by area that has no duplicate (None if every module has one).
+        """
+        problem = self.problem
+        areas = []
+        if problem.hard_exists:
+            areas.append(problem.hard_module_width * problem.hard_module_height)
+        if problem.soft_exists:
+            areas.append(problem.area)
+        areas = np.concatenate(areas)
+        if self.groups:
+            areas[np.concatenate(self.groups)] = -np.inf
+        if np.all(np.isinf(areas)):
+            return None
+
+        return int(np.argmax(areas))
+
+    def ordered_pairs(self):
+        """
+            Consecutive members (I, J) of every group, which are ordered by x, and all pairs
+            (P, Q), P < Q, of every group, whose relation may not be "P right of Q".
+        """
+        if not self.groups:
+            empty = np.zeros(0, dtype=int)
+            return (empty, empty), (empty, empty)
+        I = np.concatenate([group[:-1] for group in self.groups])
+        J = np.concatenate([group[1:] for group in self.groups])
+        P, Q = [], []
+        for group in self.groups:
+            a, b = pair_index(len(group))
+            P.append(group[a])
+            Q.append(group[b])
+
+        return (I, J), (np.concatenate(P), np.concatenate(Q))
+
+    def canonicalize(self, x, y, widths, heights, chip_width, chip_height):
+        """
+            Mirrors and reorders a placement so that it satisfies the symmetry-breaking constraints,
+            e.g. a heuristic placement used as a warm start. Identical modules must have the same
+            placed dimensions. Returns the new x and y.
+        """
+        x, y = np.array(x, dtype=float), np.array(y, dtype=float)
+        if self.anchor is not None:
+            k = self.anchor
+            if 2 * x[k] + widths[k] > chip_width:
+                x = chip_width - x - widths
+            if 2 * y[k] + heights[k] > chip_height:
+                y = chip_height - y - heights
+        for group in self.groups:
+            order = group[np.lexsort((y[group], x[group]))]
+            x[group], y[group] = x[order], y[order]
+
+        return x, y
@@ -0,0 +1,50 @@
+import numpy as np
+from src.generate import GenerateProblem
+
+
+aspect_limits = np.array([2, 2.5, 3, 4, 5])   # The soft aspect ranges [1 / r, r] of the bundled specs
+distributions = ('uniform', 'lognormal', 'bimodal')
+
+
+def synthetic_modules(num_modules, soft_fraction=0.2, distribution='uniform', seed=0):
+    """
+    Seeded random modules that look like the bundled specs: integer hard module sides and soft
+    module areas, and soft aspect ranges [1 / r, r].
+    args:
+        num_modules: Number of modules (int)
+        soft_fraction: Share of soft modules, rounded to a whole number of modules
+        distribution: 'uniform' draws hard sides from 1..5 and soft areas from 3..24 as in the bundled
+                      specs, 'lognormal' draws both with a long tail of large modules, and 'bimodal'
+                      makes one module in ten a macro four times as large (in every side) as the rest
+        seed: Seed of the random generator
+    returns:
+        The hard (N, 2) and soft (N, 3) module arrays, as from read_spec
+    """
+    if distribution not in distributions:
+        raise ValueError(f'Unknown area distribution {distribution}. Expected one of {", ".join(distributions)}.')
+    rng = np.random.default_rng(seed)
+    num_soft = int(round(num_modules * soft_fraction))
+    num_hard = num_modules - num_soft
+    if distribution == 'lognormal':
+        sides = np.maximum(1, np.round(rng.lognormal(np.log(2.5), 0.5, size=(num_hard, 2))))
+        area = np.maximum(3, np.round(rng.lognormal(np.log(10), 0.6, size=num_soft)))
+    else:
+        sides = rng.integers(1, 6, size=(num_hard, 2)).astype(float)
+        area = rng.integers(3, 25, size=num_soft).astype(float)
+        if distribution == 'bimodal':
+            sides[rng.random(num_hard) < 0.1] *= 4
+            area[rng.random(num_soft) < 0.1] *= 16
+    r = rng.choice(aspect_limits, size=num_soft)
+    soft = np.column_stack((area, np.round(1 / r, 2), r))
+
+    return sides, soft
+
+
+def synthetic_problem(num_modules, soft_fraction=0.2, distribution='uniform', seed=0, underestimation=True, segments=None):
+    """
+    A GenerateProblem of synthetic_modules.
+    """
+    hard, soft = synthetic_modules(num_modules, soft_fraction=soft_fraction, distribution=distribution, seed=seed)
+
+    return GenerateProblem.from_modules(num_modules, hard[:, 0], hard[:, 1], soft[:, 0], soft[:, 1], soft[:, 2],
+                                        underestimation=underestimation, segments=segments)
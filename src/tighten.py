@@ -0,0 +1,133 @@
+import numpy as np
+
+
+class BoundTightening:
+    """
+        Chip bounds derived from a heuristic placement and the module dimensions, and the big-M
+        constants and fixed relations that follow from them.
+
+        The upper bounds come from a heuristic placement (an optimal chip is never worse than it),
+        the lower bounds from the total module area and the largest module. For a pair that is
+        not in its relation, a non-overlap row such as x_i + w_i - x_j <= M is slack by at most the
+        chip bound of its direction, since x_i + w_i reaches the bound when x_j = 0. So the width rows
+        take the chip width bound as their M and the height rows the chip height bound: one M per
+        direction, which no pair's dimensions can lower. A pair that cannot fit side by side within the width bound is stacked (y_ij = 1),
+        and a pair that cannot be stacked within the height bound sits side by side (y_ij = 0).
+    """
+
+    def __init__(self, problem, shape='square', aspect_limit=None, placer=None):
+        """
+            args:
+                problem - the specification (GenerateProblem)
+                shape - 'square' or 'rectangle'
+                aspect_limit - for a rectangle, the largest allowed ratio between its sides (None for any)
+                placer - a ShelfPlacer whose place() succeeded, None to keep GenerateProblem.upper_bound
+        """
+        self.problem = problem
+        self.shape = shape
+        self.aspect_limit = aspect_limit
+        self.min_width, self.min_height = self.module_extents()
+        self.area = self.module_area()
+        self.width_lower, self.height_lower = self.chip_lower_bounds()
+        self.width_upper, self.height_upper = self.chip_upper_bounds(placer)
+
+    def module_extents(self):
+        """
+            The smallest width and height every module can take (hard modules may rotate).
+        """
+        problem = self.problem
+        min_width, min_height = [], []
+        if problem.hard_exists:
+            short_side = np.minimum(problem.hard_module_width, problem.hard_module_height)
+            min_width.append(short_side)
+            min_height.append(short_side)
+        if problem.soft_exists:
+            w_range = problem.soft_module_width_range
+            min_width.append(w_range[:, 0])
+            min_height.append(np.minimum(problem.soft_module_height(w_range[:, 0]), problem.soft_module_height(w_range[:, 1])))
+
+        return np.concatenate(min_width), np.concatenate(min_height)
+
+    def module_area(self):
+        """
+            A lower bound on the total area of the modules as modeled. Chords of area / w lie above it,
+            so soft modules keep their area. Under tangents, w * (gradient * w + intercept) is concave in
+            w, so each line is smallest at one end of the width range, and the modeled height is at
+            least every line.
+        """
+        problem = self.problem
+        area = 0
+        if problem.hard_exists:
+            area += np.sum(problem.hard_module_width * problem.hard_module_height)
+        if problem.soft_exists and not problem.underestimation:
+            area += np.sum(problem.area)
+        elif problem.soft_exists:
+            w_min, w_max = problem.soft_module_width_range[:, [0]], problem.soft_module_width_range[:, [1]]
+            gradients, intercepts = problem.height_gradients, problem.height_intercepts
+            line_area = np.minimum(w_min * (gradients * w_min + intercepts), w_max * (gradients * w_max + intercepts))
+            area += np.sum(np.max(line_area, axis=1))
+
+        return area
+
+    def chip_lower_bounds(self):
+        """
+            Every module must fit in the chip. A square chip must also hold the total module area.
+        """
+        width_lower, height_lower = np.max(self.min_width), np.max(self.min_height)
+        if self.shape == 'rectangle':
+            return width_lower, height_lower
+
+        problem = self.problem
+        side = max(np.sqrt(self.area), width_lower, height_lower)
+        if problem.hard_exists:
+            side = max(side, np.max(np.maximum(problem.hard_module_width, problem.hard_module_height)))
+        if problem.soft_exists:
+            # The most square shape of a soft module, where its falling height meets its width. The
+            # maximum of the height lines meets it where the last of them does.
+            w_range = problem.soft_module_width_range
+            crossing = np.max(problem.height_intercepts / (1 - problem.height_gradients), axis=1)
+            w = np.clip(crossing, w_range[:, 0], w_range[:, 1])
+            side = max(side, np.max(np.maximum(w, problem.soft_module_height(w))))
+
+        return side, side
+
+    def chip_upper_bounds(self, placer):
+        """
+            A square chip is at most the heuristic one. A rectangle has at most the heuristic half
+            perimeter P, so each side is at most P minus the lower bound of the other side, and at most
+            the larger root of s * (P - s) = area.
+        """
+        bound = self.problem.bound
+        if placer is None:
+            return bound, bound
+        if self.shape != 'rectangle':
+            side = min(bound, max(placer.chip_width, placer.chip_height))
+            return side, side
+
+        perimeter = placer.chip_width + placer.chip_height
+        root = (perimeter + np.sqrt(max(perimeter ** 2 - 4 * self.area, 0))) / 2
+        width_upper = min(bound, perimeter - self.height_lower, root)
+        height_upper = min(bound, perimeter - self.width_lower, root)
+        if self.aspect_limit is not None:
+            side = self.aspect_limit * perimeter / (1 + self.aspect_limit)
+            width_upper, height_upper = min(width_upper, side), min(height_upper, side)
+
+        return width_upper, height_upper
+
+    def big_m(self, I, J):
+        """
+            The M of the width rows and of the height rows of every pair (I[k], J[k]): the chip bounds,
+            the same for every pair (see the class docstring).
+        """
+        p = len(I)
+
+        return np.full(p, self.width_upper), np.full(p, self.height_upper)
+
+    def fixed_relations(self, I, J):
+        """
+            Masks of the pairs (I[k], J[k]) that must be stacked (y_ij = 1) and that must sit side by side (y_ij = 0).
+        """
+        stacked = self.min_width[I] + self.min_width[J] > self.width_upper
+        side_by_side = self.min_height[I] + self.min_height[J] > self.height_upper
+
+        return stacked & ~side_by_side, side_by_side & ~stacked
@@ -0,0 +1,36 @@
+import time
+from contextlib import contextmanager
+
+
+class PhaseTimer:
+    """
+    Wall-clock seconds per named phase of a run (parse, formulation, constraints, compile,
+    canonicalization, solve, polish, plot), summed over every time a phase is entered.
+    """
+
+    def __init__(self):
+        self.phases = {}
+
+    @contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start)
+
+    def add(self, name, seconds):
+        self.phases[name] = self.phases.get(name, 0) + seconds
+
+    def merge(self, phases):
+        """
+        Adds the phases of another run (a dict as from as_dict).
+        """
+        for name, seconds in phases.items():
+            self.add(name, seconds)
+
+    def total(self, *names):
+        return sum(self.phases.get(name, 0) for name in names)
+
+    def as_dict(self):
+        return dict(self.phases)
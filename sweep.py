@@ -0,0 +1,46 @@
+import argparse
+import glob
+import os
+from src.sweep import BatchSweep
+from src.result_cache import ResultCache
+
+
+def boolean_string(s):
+    if s not in {'False', 'True'}:
+        raise ValueError('Not a valid boolean string')
+
+    return s == 'True'
+
+
+parser = argparse.ArgumentParser(description='Floorplan a grid of spec files and settings without plotting, and collect the results in one file.')
+parser.add_argument('--specs', type=str, nargs='+', default=None, help='The *.ilp files (all of spec_files by default).')
+parser.add_argument('--sizes', type=int, nargs='+', default=[10], help='Superblock sizes. A spec that fits one superblock is solved directly.')
+parser.add_argument('--runtimes', type=float, nargs='+', default=[10], help='Time limits of every solve.')
+parser.add_argument('--underestimation', type=boolean_string, nargs='+', default=[True])
+parser.add_argument('--backend', type=str, default='cvxpy', choices=['cvxpy', 'compiled', 'scipy'])
+parser.add_argument('--workers', type=int, default=1, help='Number of cells solved in parallel.')
+parser.add_argument('--threads', type=int, default=None, help='Total solver threads shared by the parallel cells.')
+parser.add_argument('--partition', type=str, default='sequential', choices=['sequential', 'area', 'aspect'])
+parser.add_argument('--shape', type=str, default='square', choices=['square', 'rectangle'])
+parser.add_argument('--aspect_limit', type=float, default=None)
+parser.add_argument('--tighten', type=boolean_string, default=True)
+parser.add_argument('--symmetry', type=boolean_string, default=True)
+parser.add_argument('--target_gap', type=float, default=None)
+parser.add_argument('--stall_time', type=float, default=None)
+parser.add_argument('--share_time', type=boolean_string, default=False)
+parser.add_argument('--cache', type=boolean_string, default=False, help='Share solved superblocks between cells and sweeps through results/cache.')
+parser.add_argument('--cache_size', type=int, default=1024)
+parser.add_argument('--output', type=str, default=os.path.join('results', 'sweep.csv'), help='A *.csv or *.jsonl file. Cells already in it are skipped.')
+
+
+def main(args):
+    specs = args.specs or sorted(glob.glob(os.path.join('spec_files', '*.ilp')))
+    options = {'shape': args.shape, 'aspect_limit': args.aspect_limit, 'tighten': args.tighten, 'symmetry': args.symmetry,
+               'target_gap': args.target_gap, 'stall_time': args.stall_time, 'cache': ResultCache(max_entries=args.cache_size) if args.cache else None}
+    sweep = BatchSweep(args.output, backend=args.backend, workers=args.workers, threads=args.threads, strategy=args.partition, options=options,
+                       share_time=args.share_time)
+    sweep.run(BatchSweep.grid(specs, args.sizes, args.runtimes, args.underestimation))
+
+
+if __name__ == '__main__':
+    main(parser.parse_args())
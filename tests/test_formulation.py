@@ -0,0 +1,51 @@
+import os
+import pytest
+from src.solve import SolveILP
+from src.heuristic import ShelfPlacer
+
+
+def spec(num_blocks):
+    return os.path.join('spec_files', f'{num_blocks}_block.ilp')
+
+
+def solve_both(num_blocks, run_time, fixed=None):
+    """
+    The optimal Y of the batched builder and of the loop builder, both solved by cvxpy with SCIPY (HiGHS),
+    optionally with the relation binaries and rotations of fixed (a solution vector) imposed.
+    """
+    objectives = []
+    for build in ('create_constraints', 'create_loop_constraints'):
+        # The loop builder knows neither bound tightening nor symmetry breaking
+        solver = SolveILP(spec(num_blocks), num_blocks, tighten=False, symmetry=False)
+        getattr(solver, build)()
+        if fixed is not None:
+            values = solver.formulation.values(fixed)
+            solver.constraints += [solver.x_ij == values['x_ij'], solver.y_ij == values['y_ij']]
+            if solver.problem.hard_exists:
+                solver.constraints.append(solver.z == values['z'])
+        bound, *_ = solver.solve(run_time, solver='SCIPY')
+        assert solver.status == 'optimal'
+        objectives.append(bound)
+
+    return objectives
+
+
+def test_batched_builder_matches_loop_builder():
+    batched, loop = solve_both(5, 60)
+    assert batched == pytest.approx(loop, rel=1e-6)
+    assert batched == pytest.approx(6.1046, abs=1e-4)
+
+
+def test_batched_builder_matches_loop_builder_for_fixed_relations():
+    """
+    The 10-block model takes about a minute to prove optimal through either builder, so both are solved
+    with the relations and rotations of the shelf placement fixed, under a time limit.
+    """
+    solver = SolveILP(spec(10), 10, tighten=False, symmetry=False)
+    placer = ShelfPlacer(solver.problem)
+    assert placer.place()
+    x_ij, y_ij = placer.relations()
+    fixed = solver.formulation.solution_vector(placer.x, placer.y, placer.w, placer.z, x_ij, y_ij, placer.chip_width, placer.chip_height)
+    batched, loop = solve_both(10, 30, fixed=fixed)
+    assert batched == pytest.approx(loop, rel=1e-6)
+    assert batched <= max(placer.chip_width, placer.chip_height) + 1e-6
@@ -0,0 +1,23 @@
+import numpy as np
+from src.generate import GenerateProblem
+from src.hierarchy import HierarchicalFloorplan
+from src.legality import check_placement
+
+
+def test_rotated_superblock_keeps_the_actual_soft_dimensions():
+    """
+    A soft module of area 4 and width 1, modeled 3 high, next to a 2 x 1 hard module, in a superblock
+    that the top level places rotated: the soft module comes back transposed, 1 high along its own width.
+    """
+    problem = GenerateProblem.from_modules(2, [2.0], [1.0], [4.0], [0.25], [4.0])
+    local = (np.array([0.0, 2.0]), np.array([0.0, 0.0]), np.array([2.0, 1.0]), np.array([1.0, 3.0]), np.array([False, False]))
+    level = {'groups': [np.array([0, 1])], 'placements': [local]}
+    top = (np.array([0.0]), np.array([0.0]), np.array([3.0]), np.array([3.0]), np.array([True]))
+    x, y, widths, heights, rotated = HierarchicalFloorplan(problem).unroll(top, level)
+    assert np.array_equal(rotated, [True, True])
+    assert np.array_equal(heights, [2.0, 1.0])
+
+    actual_widths, actual_heights = problem.actual_dimensions(widths, heights, rotated)
+    assert np.allclose(actual_widths, [1.0, 4.0])
+    assert np.allclose(actual_heights, [2.0, 1.0])
+    assert check_placement(x, y, actual_widths, actual_heights, 3.5, 3.5)['out_of_bounds'].tolist() == [1]
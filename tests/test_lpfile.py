@@ -0,0 +1,73 @@
+import os
+import numpy as np
+import pytest
+from src.generate import GenerateProblem
+from src.formulation import Formulation
+from src.heuristic import ShelfPlacer
+from src.milp import SparseMILP
+from src.lpfile import ModelWriter, file_formats
+
+highspy = pytest.importorskip('highspy')
+
+
+def write_all(formulation, directory):
+    writer = ModelWriter(formulation)
+    paths = {file_format: writer.write(str(directory / f'model{extension}'), file_format=file_format)
+             for file_format, extension in file_formats.items()}
+    assert os.path.getsize(paths['lp_solve']) > 0   # highspy has no reader for the lp_solve format
+
+    return paths
+
+
+def highs_optimum(path, fixed=None):
+    """
+    The optimum of a model file, optionally with the columns of the dict fixed to its values.
+    """
+    h = highspy.Highs()
+    h.setOptionValue('output_flag', False)
+    h.setOptionValue('time_limit', 60.0)
+    h.readModel(path)
+    if fixed is not None:
+        for col, value in fixed.items():
+            h.changeColBounds(col, value, value)
+    h.run()
+    assert h.getModelStatus() == highspy.HighsModelStatus.kOptimal
+
+    return h.getInfo().objective_function_value
+
+
+def test_written_model_has_the_same_optimum(tmp_path):
+    problem = GenerateProblem(os.path.join('spec_files', '5_block.ilp'), 5)
+    formulation = Formulation(problem)
+    milp = SparseMILP(formulation)
+    objective, _ = milp.solve(60)
+    assert milp.status == 'optimal'
+
+    paths = write_all(formulation, tmp_path)
+    for file_format in ('cplex', 'mps'):
+        assert highs_optimum(paths[file_format]) == pytest.approx(objective, rel=1e-6)
+
+
+def test_written_model_has_the_same_optimum_for_fixed_relations(tmp_path):
+    """
+    The 10-block model takes about a minute to prove optimal, so its relations and rotations are fixed to
+    those of the shelf placement and the LPs that are left are compared.
+    """
+    problem = GenerateProblem(os.path.join('spec_files', '10_block.ilp'), 10)
+    formulation = Formulation(problem)
+    placer = ShelfPlacer(problem)
+    assert placer.place()
+    x_ij, y_ij = placer.relations()
+    v = formulation.solution_vector(placer.x, placer.y, placer.w, placer.z, x_ij, y_ij, placer.chip_width, placer.chip_height)
+    objective, _ = SparseMILP(formulation).polish(v)
+
+    integers = np.flatnonzero(formulation.integrality())
+    names = ModelWriter(formulation).names
+    paths = write_all(formulation, tmp_path)
+    for file_format in ('cplex', 'mps'):
+        h = highspy.Highs()
+        h.setOptionValue('output_flag', False)
+        h.readModel(paths[file_format])
+        column = {h.getColName(col)[1]: col for col in range(h.getNumCol())}   # A reader may order the columns differently
+        fixed = {column[names[k]]: float(np.round(v[k])) for k in integers}
+        assert highs_optimum(paths[file_format], fixed) == pytest.approx(objective, rel=1e-6)
@@ -0,0 +1,26 @@
+import os
+import numpy as np
+import pytest
+from src.spec import parse_spec, read_spec
+
+
+def test_parses_both_sections():
+    hard, soft = parse_spec('hard - 2\n1, 2\n3,4\n\nsoft - 1\n5,0.5,2\n')
+    assert np.array_equal(hard, [[1, 2], [3, 4]])
+    assert np.array_equal(soft, [[5, 0.5, 2]])
+
+
+def test_matches_the_spec_files():
+    hard, soft = read_spec(os.path.join('spec_files', '10_block.ilp'))
+    assert len(hard) + len(soft) == 10
+
+
+@pytest.mark.parametrize('text, message', [
+    ('hard - 2\n1,2,3\n4\n', '<spec>:2: a hard module needs 2'),      # Would fill two rows when flattened
+    ('hard - 1\n1,2\nsoft - 1\n5,x,2\n', '<spec>:4: \'5,x,2\' is not'),
+    ('hard - 1\n1,2\n3,4\n', '<spec>:3: the hard section declares 1 modules but lists more'),
+    ('soft - 2\n5,0.5,2\n', '<spec>:1: the soft section declares 2 modules but lists 1'),
+])
+def test_errors_name_the_line(text, message):
+    with pytest.raises(ValueError, match=message):
+        parse_spec(text)